@@ -9,11 +9,34 @@ import os
 
 from Lib.io_common import load_main_conf, ustr
 from Lib.store import load_store, save_store, build_index
-from Lib.oem_flow import oem_get_host_and_port
+from Lib.oem_flow import oem_get_host_and_port, oem_get_target_profiles
 
 # IMPORTS APRÈS DÉCOUPAGE (OBLIGATOIRES)
-from Lib.analyse_builder_v3 import normalize_row, set_debug
+from Lib.analyse_builder_v3 import normalize_row, set_debug, set_resolver, show_progress
+from Lib.analyse_builder_v3 import build_raw_source
+from Lib.analyse_builder_v3 import set_progress_aggregate, progress_row_done, set_progress_quiet
+from Lib.analyse_runner import run_threads, run_processes, parse_workers, parse_int_option
+from Lib.analyse_runner import ChildStats
+from Lib.analyse_plan import build_plan, oem_hosts_by_id, locality_order, cname_cluster_of
 from Lib.object_builder_v3 import build_object_v3
+from Lib.resolver_run import RunResolver
+from Lib.identity_cache import open_identity_cache
+from Lib.jdbc_flow_v2 import set_identity_cache, set_zone_snapshot, set_scan_sources
+from Lib.cluster_inventory import open_cluster_inventory, open_oem_scan_source
+from Lib.zone_snapshot import open_zone_snapshot
+from Lib.dns_backend import configure_dns, dns_summary_lines
+from Lib import dns_wire
+from Lib.cmd_runner import LATENCY, set_adaptive_timeouts
+from Lib.adaptive_timeout import open_adaptive_timeouts
+from Lib.ssh_pool import open_ssh_pool, set_ssh_pool
+from Lib.cluster_facts import get_cluster_facts
+from Lib.circuit_breaker import configure_circuit, get_circuit_breaker
+from Lib.retry_queue import TRANSIENT_ERRORS, is_transient, run_retry_queue
+from Lib.retry_queue import retry_options, retry_summary_lines
+from Lib.prefetch import Prefetcher, prefetch_options
+from Lib.oem_session import open_oem_session
+from Lib.oem_snapshot import open_oem_snapshot
+from Lib.oem_flow import set_oem_snapshot
 
 DEBUG = False
 # ------------------------------------------------
@@ -29,6 +52,13 @@ Usage:
 Options:
  -debug
  -force / -update / -upgrade   (recalcule et remplace les ids cibles)
+ -workers=N                    (N threads de construction, defaut 1)
+ -processes=N                  (N processus de construction, prioritaire sur -workers)
+ -chunk=N                      (lignes par paquet en mode -processes, defaut 50)
+ -order=id|locality            (locality : lignes groupees par host/cluster cible, store en ordre des ids)
+ -prefetch=N                   (N lignes d'avance en arriere-plan au lieu de la phase 1 complete)
+ -oem-snapshot=FICHIER         (snapshot OEM local, prioritaire sur OEM_SNAPSHOT_FILE)
+ -zone=FICHIER                 (export de zone DNS, prioritaire sur ZONE_SNAPSHOT_FILE)
  -h | --help | -help
 """
 
@@ -98,6 +128,9 @@ if __name__ == "__main__":
     force = ("-force" in args) or ("-update" in args) or ("-upgrade" in args)
     DEBUG = ("-debug" in args)
     set_debug(DEBUG)
+    workers = parse_workers(args)
+    processes = parse_int_option(args, "-processes", 1)
+    chunk = parse_int_option(args, "-chunk", 50)
 
     conf, ce, cd = load_main_conf()
     if ce:
@@ -115,6 +148,60 @@ if __name__ == "__main__":
 
     oem_conn = read_oem_conn(OEM_CONF)
 
+    # snapshot OEM : reponses OEM hors ligne (chemin : casse d'origine)
+    snap_file = None
+    for a in sys.argv[2:]:
+        if a.lower().startswith("-oem-snapshot="):
+            snap_file = a.split("=", 1)[1]
+    oem_snapshot, sne, snd = open_oem_snapshot(conf, snap_file)
+    if sne:
+        print "OEM snapshot warning:", sne, snd
+    set_oem_snapshot(oem_snapshot)
+    run_start = int(time.time())
+    retry = retry_options(conf)
+    prefetch = prefetch_options(conf, args)
+    order = (conf.get("RUN_ORDER") or "id").strip().lower()
+    for a in args:
+        if a.startswith("-order="):
+            order = a.split("=", 1)[1].strip().lower()
+
+    id_cache, ice, icd = open_identity_cache(conf)
+    if ice:
+        print "Identity cache warning:", ice, icd
+    set_identity_cache(id_cache)
+
+    ok_b, be, bd = configure_dns(conf)
+    if not ok_b:
+        print "DNS backend warning:", be, bd
+
+    # chemin de l'export : casse d'origine (args est en minuscules)
+    zone_files = [a.split("=", 1)[1] for a in sys.argv[2:]
+                  if a.lower().startswith("-zone=")]
+    if not zone_files and conf.get("ZONE_SNAPSHOT_FILE"):
+        zone_files = conf.get("ZONE_SNAPSHOT_FILE").split(",")
+    zone, zse, zsd = open_zone_snapshot([z.strip() for z in zone_files])
+    if zse:
+        print "Zone snapshot warning:", zse, zsd
+    set_zone_snapshot(zone)
+
+    inventory, ive, ivd = open_cluster_inventory(conf)
+    if ive:
+        print "Cluster inventory warning:", ive, ivd
+
+    ok_c, cbe, cbd = configure_circuit(conf)
+    if not ok_c:
+        print "Circuit breaker warning:", cbe, cbd
+
+    adaptive, ate, atd = open_adaptive_timeouts(conf)
+    if ate:
+        print "Latency profile warning:", ate, atd
+    set_adaptive_timeouts(adaptive)
+
+    ssh_pool, spe, spd = open_ssh_pool(conf)
+    if spe:
+        print "SSH pool warning:", spe, spd
+    set_ssh_pool(ssh_pool)
+
     # CSV en binaire (python 2.6 exige bytes)
     reader = csv.DictReader(open(fichier, "rb"), delimiter=';')
     rows = [normalize_row(r) for r in reader]
@@ -179,33 +266,227 @@ if __name__ == "__main__":
     else:
         keep = store.get("objects", [])[:]
 
+    # OEM : sqlplus persistant pour toutes les requetes du run
+    oem_session, sse, ssd = open_oem_session(conf, oem_conn)
+    if sse:
+        print "OEM session warning:", sse, ssd
+
+    # OEM : une seule requete host -> cluster -> SCAN pour tout le run (avant la phase 1)
+    oem_scans, ose, osd = open_oem_scan_source(conf, oem_conn, oem_session)
+    if ose:
+        print "OEM SCAN source warning:", ose, osd
+    set_scan_sources([inventory, oem_scans])
+
+    # OEM : profils de toutes les bases du run, une seule session sqlplus
+    # (cache du run : build_object_v3 n'interroge plus le referentiel)
+    oem_map = None
+    if oem_conn or oem_snapshot:
+        dbs = [build_raw_source(rows[oid - 1]).get("Databases") for oid in ids_to_process]
+        oem_map, obe, obd = oem_get_target_profiles(oem_conn, dbs, session=oem_session)
+        if obe:
+            print "OEM bulk warning:", obe, obd, "(per-row queries)"
+        else:
+            print "OEM: %d target(s) loaded (%s)" % (
+                len(oem_map), oem_snapshot and "snapshot" or "one session")
+
+    resolver = RunResolver()
+    set_resolver(resolver)
+    facts = get_cluster_facts()
+    circuit = get_circuit_breaker()
+
+    # =========================
+    # PHASE 1 : PLAN + RESOLUTION EN MASSE (I/O)
+    # =========================
+    # hosts OEM deja connus (profils) : resolus en masse avec les hosts JDBC
+    plan = build_plan(rows, ids_to_process,
+                      oem_hosts_by_id(rows, ids_to_process, oem_map))
+    print "Plan: rows=%d | host refs=%d | unique hosts=%d" % (
+        len(ids_to_process), plan["refs"], len(plan["hosts"]))
+
+    # resolution avant l'ordre d'execution : locality s'appuie sur les CNAME
+    use_prefetch = prefetch["window"] and processes <= 1
+    if not use_prefetch:
+        resolver.prime(plan["hosts"], progress=show_progress, workers=workers)
+        sys.stdout.write("\n")
+    elif order == "locality":
+        # CNAME seulement : les SCAN restent au prefetch
+        resolver.prime_cnames(plan["hosts"])
+
+    # ordre d'execution (le store reste ecrit dans l'ordre des ids)
+    run_ids = ids_to_process
+    if order == "locality":
+        cluster_of = cname_cluster_of(resolver, [inventory, oem_scans])
+        run_ids, groups = locality_order(ids_to_process, plan["by_id"], cluster_of)
+        print "Order: locality | groups=%d" % groups
+    elif order != "id":
+        print "Unknown order %s (using id)" % order
+    # prefetch : fenetre glissante pendant la phase 2 (threads uniquement)
+    prefetcher = None
+    if use_prefetch:
+        prefetcher = Prefetcher(resolver, plan["by_id"], run_ids,
+                                window=prefetch["window"],
+                                workers=prefetch["workers"])
+        prefetcher.start()
+
+    # =========================
+    # PHASE 2 : CONSTRUCTION DES OBJETS (CPU)
+    # =========================
     objs = []
     total = len(ids_to_process)
-    pos = 0
+    positions = dict((oid, i + 1) for i, oid in enumerate(run_ids))
 
     BATCH_SIZE = 10
 
-    for oid in ids_to_process:
-        pos += 1
-        row = rows[oid - 1]
-    
-        obj = build_object_v3(row, oid, oem_conn, pos, total, force)
+    parallel = (workers > 1) or (processes > 1)
+    if parallel:
+        set_progress_aggregate(total)
+
+    def build_one(oid):
+        return build_object_v3(rows[oid - 1], oid, oem_conn,
+                               positions[oid], total, force, oem_session)
+
+    def build_row(oid):
+        # phase 2 uniquement : les reprises (phase 3) ne comptent pas dans
+        # le taux de hit du prefetch
+        if prefetcher:
+            prefetcher.row_started(oid)
+        return build_one(oid)
+
+    def in_id_order(lst):
+        if run_ids is ids_to_process:
+            return lst
+        return sorted(lst, key=lambda o: o["id"])
+
+    def merge_one(oid, obj):
+        # thread principal uniquement, ordre d'execution (run_ids) garanti
         objs.append(obj)
-    
+        if parallel:
+            progress_row_done()
+
         # =========================
         # FLUSH PAR BATCH DE 10
         # =========================
-        if pos % BATCH_SIZE == 0:
-            store["objects"] = keep + objs
+        if len(objs) % BATCH_SIZE == 0:
+            store["objects"] = keep + in_id_order(objs)
             save_store(STORE_FILE, store)
+            if id_cache:
+                id_cache.save()
+
+    if processes > 1:
+        # fork : les fils heritent du resolver deja amorce (phase 1) ;
+        # le parent reste seul ecrivain du store et du cache
+        stats = ChildStats()
+        for name, obj in (("resolver", resolver), ("ssh", ssh_pool),
+                          ("facts", facts), ("zone", zone),
+                          ("inventory", inventory), ("oem_scans", oem_scans),
+                          ("oem_session", oem_session),
+                          ("oem_snapshot", oem_snapshot)):
+            stats.add_stats(name, obj)
+        stats.add("latency", LATENCY.reset, LATENCY.snapshot, LATENCY.merge)
+        stats.add("circuit", circuit.reset_stats, circuit.snapshot, circuit.merge_stats)
+        stats.add("dns_wire", dns_wire.reset_stats, lambda: dict(dns_wire.STATS),
+                  dns_wire.merge_stats)
+        if adaptive:
+            stats.add("latency_samples", adaptive.clear_new, adaptive.new_samples,
+                      adaptive.merge)
+        if id_cache:
+            # entrees CNAME / SCAN ecrites par les fils (hosts OEM compris)
+            stats.add("identity_cache", id_cache.clear_new, id_cache.new_entries,
+                      id_cache.merge)
+
+        def child_init():
+            set_progress_quiet(True)
+            stats.reset()
+
+        run_processes(run_ids, build_row, processes, merge_one,
+                      chunk_size=chunk,
+                      init=child_init,
+                      child_stats=stats.snapshot,
+                      on_stats=stats.merge,
+                      fini=ssh_pool and ssh_pool.close_all or None)
+    else:
+        run_threads(run_ids, build_row, workers, merge_one)
     sys.stdout.write("\n")
+    if prefetcher:
+        prefetcher.stop()
+
+    # =========================
+    # PHASE 3 : FILE DE REESSAI (erreurs transitoires)
+    # =========================
+    objs = in_id_order(objs)
+    retry_ids = [o["id"] for o in objs if is_transient(o)]
+    retry_stats = None
+    if retry_ids and retry["max_attempts"]:
+        print "Retry queue: %d row(s) in transient error" % len(retry_ids)
+        index = dict((o["id"], i) for i, o in enumerate(objs))
+        set_progress_quiet(True)
+
+        def before_retry(n):
+            # les echecs memorises de ce run ne doivent pas repondre a la place
+            resolver.forget_errors(TRANSIENT_ERRORS)
+            facts.forget_errors(TRANSIENT_ERRORS)
+            if id_cache:
+                id_cache.expire_errors(TRANSIENT_ERRORS, run_start)
+
+        def replace_one(oid, obj):
+            objs[index[oid]] = obj
+
+        retry_stats = run_retry_queue(retry_ids, build_one, replace_one,
+                                      workers=retry["workers"],
+                                      max_attempts=retry["max_attempts"],
+                                      backoff_sec=retry["backoff_sec"],
+                                      before_attempt=before_retry)
 
     store["objects"] = keep + objs
     if DEBUG:
         print("DEBUG FINAL OBJECT =", objs[-1]["Network"]["New"]["DR"])
     save_store(STORE_FILE, store)
+    if id_cache:
+        id_cache.save()
+    if adaptive:
+        adaptive.save()
 
     print "\nAnalyseV3 terminé."
     print "  objets générés :", len(objs)
     print "  skipped(existing) :", skipped
     print "  total store :", len(store.get("objects", []))
+    for l in resolver.summary_lines():
+        print l
+    if prefetcher:
+        for l in prefetcher.summary_lines():
+            print l
+    for l in LATENCY.summary_lines():
+        print l
+    if adaptive:
+        for l in adaptive.summary_lines():
+            print l
+    if zone:
+        for l in zone.summary_lines():
+            print l
+    for l in dns_summary_lines():
+        print l
+    if inventory:
+        for l in inventory.summary_lines():
+            print l
+    if oem_scans:
+        for l in oem_scans.summary_lines():
+            print l
+    if oem_session:
+        for l in oem_session.summary_lines():
+            print l
+    if oem_snapshot:
+        for l in oem_snapshot.summary_lines():
+            print l
+    if ssh_pool:
+        for l in ssh_pool.summary_lines():
+            print l
+    for l in facts.summary_lines():
+        print l
+    for l in circuit.summary_lines():
+        print l
+    if retry_stats:
+        for l in retry_summary_lines(retry_stats):
+            print l
+    if id_cache:
+        for l in id_cache.summary_lines():
+            print l
@@ -15,9 +15,12 @@ print("### JdbcCheck VERSION ORACLE PATCH 2026-02-04 ###")
 import sys
 import os
 import socket
-import subprocess
 import re
 
+from Lib.cmd_runner import run_cmd, RC_TIMEOUT, RC_SPAWN_ERROR
+from Lib.ssh_pool import SshPool, set_ssh_pool
+from Lib.cluster_facts import ClusterFacts, set_cluster_facts, get_cluster_facts
+
 
 # ============================================================
 # OUTPUT – FIX COULEURS (STYLE REPORTV3)
@@ -173,16 +176,14 @@ def validate_sqlnet_with_tnsping(jdbc, alias="JDBCCHECK"):
     env["TNS_ADMIN"] = tmpdir
 
     cmd = ["tnsping", alias, "1"]
-    try:
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-        outp, errp = p.communicate()
-    except OSError as e:
-        ko(tag, "tnsping not available (%s)" % str(e))
-    except Exception as e:
-        ko(tag, "tnsping execution failed (%s)" % str(e))
+    rc, outp, errp = run_cmd(cmd, 30, env=env, kind="tnsping", target=alias)
+    if rc == RC_SPAWN_ERROR:
+        ko(tag, "tnsping not available (%s)" % errp)
+    if rc == RC_TIMEOUT:
+        ko(tag, "tnsping execution failed (timeout)")
 
     output = (outp or "") + "\n" + (errp or "")
-    if p.returncode != 0:
+    if rc != 0:
         # On remonte le message Oracle Net, tronqué pour rester lisible
         msg = "tnsping failed (Oracle Net parse/connect). Extract:\n" + "\n".join(output.splitlines()[-12:])
         ko(tag, msg)
@@ -228,14 +229,9 @@ def validate_sqlnet_with_tnsping(jdbc, alias="JDBCCHECK"):
 
     cmd = ["tnsping", alias, "1"]
 
-    try:
-        p = subprocess.Popen(cmd,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             env=env)
-        outp, errp = p.communicate()
-    except Exception as e:
-        ko(tag, "tnsping execution failed (%s)" % e)
+    rc, outp, errp = run_cmd(cmd, 30, env=env, kind="tnsping", target=alias)
+    if rc in (RC_SPAWN_ERROR, RC_TIMEOUT):
+        ko(tag, "tnsping execution failed (%s)" % (errp or "timeout"))
 
     output = ((outp or "") + "\n" + (errp or "")).upper()
 
@@ -509,7 +505,6 @@ def check_tcp(addresses, timeout=3):
 #   DR      : WARNING si SSH indisponible
 # ============================================================
 
-import subprocess
 def u(s):
     if isinstance(s, unicode):
         return s
@@ -521,34 +516,21 @@ def u(s):
 def normalize(s):
     return s.upper().replace("_", "").replace("-", "")
 
-def extract_services(listener_output):
-    services = []
-    for line in listener_output.splitlines():
-        line = line.strip()
-        if line.startswith("Service \""):
-            svc = line.split("\"")[1]
-            services.append(svc)
-    return services
-
-def srvctl_service_exists(host, dbname, service, ssh_user="oracle", timeout=10):
-    cmd = [
-        "ssh",
-        "-o", "BatchMode=yes",
-        "-o", "ConnectTimeout=%d" % timeout,
-        "%s@%s" % (ssh_user, host),
-        "bash -lc 'srvctl config service -db %s 2>/dev/null'"
-        % dbname
-    ]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    outp, errp = p.communicate()
-
-    if p.returncode != 0:
+def srvctl_service_exists(host, dbname, service, ssh_user="oracle"):
+    # faits du noeud deja collectes par check_oracle_service_ssh ;
+    # base absente du cluster -> False (srvctl -db echouait)
+    names, e, d = get_cluster_facts().services(host, dbname, user=ssh_user)
+    if e:
         return False
 
-    return service in outp
+    # meme test que sur la sortie srvctl : sous-chaine, sensible a la casse
+    for n in names:
+        if service in n:
+            return True
+    return False
 
 
-def check_oracle_service_ssh(addresses, jdbc_service, ssh_user="oracle", timeout=10):
+def check_oracle_service_ssh(addresses, jdbc_service, ssh_user="oracle"):
     jdbc_norm = normalize(jdbc_service)
 
     for a in addresses:
@@ -556,30 +538,16 @@ def check_oracle_service_ssh(addresses, jdbc_service, ssh_user="oracle", timeout
         host = a["host"]
         tag = "ORACLE][%s" % role
 
-        cmd = [
-            "ssh",
-            "-o", "BatchMode=yes",
-            "-o", "ConnectTimeout=%d" % timeout,
-            "-o", "CheckHostIP=no",
-            "-o", "StrictHostKeyChecking=no",
-            "%s@%s" % (ssh_user, host),
-            "bash -lc 'lsnrctl services'"
-        ]
-
-        try:
-            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            outp, errp = p.communicate()
-        except Exception as e:
-            warn(tag, "SSH execution failed (%s) – listener check skipped" % e)
+        # un seul aller-retour SSH : scan + services srvctl + lsnrctl
+        services, e, d = get_cluster_facts().listener_services(host, user=ssh_user)
+        if e == "SRVCTL_TIMEOUT":
+            warn(tag, "SSH execution failed (timeout) – listener check skipped")
             continue
 
-        if p.returncode != 0:
-            warn(tag, "SSH/lsnrctl failed (%s) – listener check skipped" % (errp or "").strip())
+        if e:
+            warn(tag, "SSH/lsnrctl failed (%s) – listener check skipped" % (d or "").strip())
             continue
 
-        txt = outp.decode("utf-8", "ignore")
-        services = extract_services(txt)
-
         # correspondances proches
         close = []
         for s in services:
@@ -634,6 +602,18 @@ def main():
     # ---- ORACLE (sans user/pass) ----
     #check_oracle_service(addresses, service)
     # ---- ORACLE (via SSH on DB servers) ----
-    check_oracle_service_ssh(addresses, service)
+    # lsnrctl + srvctl sur le meme host : une seule connexion SSH
+    pool = SshPool()
+    set_ssh_pool(pool)
+    set_cluster_facts(ClusterFacts(opts=[
+        "BatchMode=yes",
+        "ConnectTimeout=10",
+        "CheckHostIP=no",
+        "StrictHostKeyChecking=no",
+    ]))
+    try:
+        check_oracle_service_ssh(addresses, service)
+    finally:
+        pool.close_all()
 if __name__ == "__main__":
     main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Lib/adaptive_timeout.py
+#
+# Timeouts adaptatifs appris sur les latences observees
+#   - echantillons par type de commande (ssh, dns, sqlplus...) et par cible
+#   - timeout = p99 x k, borne entre un plancher et un plafond
+#   - cible avec assez d'echantillons -> p99 de la cible ; cible froide
+#     -> valeur statique (a priori), elargie seulement si le p99 du type
+#     est plus haut (jamais plus court que l'a priori : le type melange
+#     des cibles de tailles differentes)
+#   - un timeout compte comme echantillon (= timeout applique) : le p99
+#     remonte et le timeout s'elargit pour les cibles lentes
+#   - echantillons persistes (JSON) entre deux runs
+#
+# Python 2.6 compatible
+
+import os
+import json
+import math
+import time
+import threading
+
+DEFAULT_K = 3.0
+DEFAULT_FLOOR = 1.0
+DEFAULT_CEILING = 60.0
+MIN_SAMPLES = 5
+WINDOW = 200            # echantillons gardes en memoire par cle
+PERSIST_WINDOW = 50     # echantillons sauvegardes par cle
+
+# ------------------------------------------------
+def percentile(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    i = int(math.ceil(p * len(s))) - 1
+    return s[max(0, min(i, len(s) - 1))]
+
+def _float(v, default):
+    try:
+        return float(str(v).strip())
+    except:
+        return default
+
+# ------------------------------------------------
+class AdaptiveTimeouts(object):
+
+    def __init__(self, path=None, k=DEFAULT_K, floor=DEFAULT_FLOOR,
+                 ceiling=DEFAULT_CEILING, min_samples=MIN_SAMPLES):
+        self.path = path
+        self.k = k
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self.kinds = {}         # kind -> [elapsed]
+        self.targets = {}       # kind -> {target: [elapsed]}
+        self.new = []           # (kind, target, elapsed) depuis clear_new()
+
+    # --------------------------------------------
+    def load(self):
+        """
+        Retourne (ok, err_type, err_detail) ; fichier absent -> a priori statiques
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return True, None, None
+        try:
+            data = json.loads(open(self.path, "rb").read().decode("utf-8"))
+        except Exception as e:
+            return False, "LATENCY_PROFILE_ERROR", "%s | %s" % (self.path, e)
+        self.kinds = data.get("kinds") or {}
+        self.targets = data.get("targets") or {}
+        return True, None, None
+
+    def save(self):
+        if not self.path:
+            return
+        self._lock.acquire()
+        try:
+            data = {
+                "SavedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "kinds": dict((k, v[-PERSIST_WINDOW:])
+                              for k, v in self.kinds.items()),
+                "targets": dict((k, dict((t, v[-PERSIST_WINDOW:])
+                                         for t, v in tg.items()))
+                                for k, tg in self.targets.items()),
+            }
+        finally:
+            self._lock.release()
+        tmp = "%s.tmp" % self.path
+        open(tmp, "wb").write(json.dumps(data, indent=1).encode("utf-8"))
+        os.rename(tmp, self.path)
+
+    # --------------------------------------------
+    def observe(self, kind, target, elapsed):
+        self._lock.acquire()
+        try:
+            self._observe(kind, target, elapsed)
+            self.new.append((kind, target, elapsed))
+        finally:
+            self._lock.release()
+
+    def _observe(self, kind, target, elapsed):
+        k = self.kinds.setdefault(kind, [])
+        k.append(round(elapsed, 3))
+        del k[:-WINDOW]
+        if target:
+            t = self.targets.setdefault(kind, {}).setdefault(target, [])
+            t.append(round(elapsed, 3))
+            del t[:-WINDOW]
+
+    def timeout(self, kind, target, default):
+        """
+        Timeout a appliquer pour (kind, target) ; default = a priori statique
+        """
+        self._lock.acquire()
+        try:
+            cold = False
+            samples = self.targets.get(kind, {}).get(target) or []
+            if len(samples) < self.min_samples:
+                cold = target is not None
+                samples = self.kinds.get(kind) or []
+            if len(samples) < self.min_samples:
+                return default
+            v = percentile(samples, 0.99) * self.k
+        finally:
+            self._lock.release()
+        v = max(self.floor, min(self.ceiling, v))
+        if cold and default is not None:
+            return max(default, v)
+        return v
+
+    # --------------------------------------------
+    def clear_new(self):
+        self._lock.acquire()
+        try:
+            self.new = []
+        finally:
+            self._lock.release()
+
+    def new_samples(self):
+        self._lock.acquire()
+        try:
+            return list(self.new)
+        finally:
+            self._lock.release()
+
+    def merge(self, samples):
+        """
+        Echantillons observes par un autre processus (new_samples())
+        """
+        self._lock.acquire()
+        try:
+            for kind, target, elapsed in (samples or []):
+                self._observe(kind, target, elapsed)
+        finally:
+            self._lock.release()
+
+    def summary_lines(self):
+        out = []
+        for kind in sorted(self.kinds.keys()):
+            n = len(self.kinds[kind])
+            v = self.timeout(kind, None, None)
+            out.append("  timeout %-9s: %s (p99 x %.1f, n=%d)" % (
+                kind, v is None and "statique" or ("%.1fs" % v), self.k, n))
+        return out
+
+# ------------------------------------------------
+def open_adaptive_timeouts(conf):
+    """
+    Data/config.conf :
+      ADAPTIVE_TIMEOUT=1
+      ADAPTIVE_TIMEOUT_FILE=Data/latency_profile.json
+      ADAPTIVE_TIMEOUT_K=3
+      ADAPTIVE_TIMEOUT_FLOOR=1
+      ADAPTIVE_TIMEOUT_CEILING=60
+    Retourne (adaptive|None, err_type, err_detail)
+    """
+    conf = conf or {}
+    if str(conf.get("ADAPTIVE_TIMEOUT", "1")).strip().lower() in ("0", "no", "false", "off"):
+        return None, None, None
+
+    a = AdaptiveTimeouts(
+        conf.get("ADAPTIVE_TIMEOUT_FILE") or None,
+        _float(conf.get("ADAPTIVE_TIMEOUT_K"), DEFAULT_K),
+        _float(conf.get("ADAPTIVE_TIMEOUT_FLOOR"), DEFAULT_FLOOR),
+        _float(conf.get("ADAPTIVE_TIMEOUT_CEILING"), DEFAULT_CEILING),
+    )
+    ok, e, d = a.load()
+    if not ok:
+        return a, e, d
+    return a, None, None
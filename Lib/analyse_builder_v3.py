@@ -4,7 +4,8 @@
 
 import time
 import sys
-from Lib.jdbc_flow_v2 import interpret, compare, resolve_cname, resolve_scan
+import threading
+from Lib.jdbc_flow_v2 import interpret, compare, resolve_cname, resolve_scan, scan_source
 from Lib.io_common import ustr
 from Lib.oem_flow import oem_get_host_and_port
 from Lib.compare_primary import compare_primary
@@ -17,27 +18,100 @@ RAW_COLUMNS = [
     "Cnames", "Services", "Acces", "Cnames DR"
 ]
 DEBUG = False
+RESOLVER = None
 
 def set_debug(flag):
     global DEBUG
     DEBUG = bool(flag)
+
+def set_resolver(resolver):
+    """
+    Resolver memoise du run (Lib/resolver_run.RunResolver) ou None
+    """
+    global RESOLVER
+    RESOLVER = resolver
+
+def _resolve_cname(host):
+    if RESOLVER is not None:
+        return RESOLVER.resolve_cname(host)
+    return resolve_cname(host)
+
+def _resolve_scan(host):
+    if RESOLVER is not None:
+        return RESOLVER.resolve_scan(host)
+    return resolve_scan(host)
+
+def _scan_source(host):
+    if RESOLVER is not None:
+        return RESOLVER.scan_source(host)
+    return scan_source(host)
 # ------------------------------------------------
+# PROGRESSION (thread-safe)
+#   mode simple   : pos/total de la ligne courante (historique)
+#   mode agrege   : lignes terminees / total, tous workers confondus
+# ------------------------------------------------
+_PROGRESS_LOCK = threading.Lock()
+_PROGRESS = {"aggregate": False, "quiet": False, "done": 0, "total": 0, "steps": {}}
+
+def set_progress_quiet(flag):
+    """
+    Processus fils (-processes) : aucun affichage, le parent agrege
+    """
+    _PROGRESS["quiet"] = bool(flag)
+
+def set_progress_aggregate(total):
+    _PROGRESS_LOCK.acquire()
+    try:
+        _PROGRESS["aggregate"] = True
+        _PROGRESS["done"] = 0
+        _PROGRESS["total"] = total
+        _PROGRESS["steps"] = {}
+    finally:
+        _PROGRESS_LOCK.release()
+
+def progress_row_done():
+    _PROGRESS_LOCK.acquire()
+    try:
+        _PROGRESS["done"] += 1
+    finally:
+        _PROGRESS_LOCK.release()
+    show_progress(0, 0, None)
+
 def show_progress(pos, total, step):
+    if _PROGRESS["quiet"]:
+        return
+    _PROGRESS_LOCK.acquire()
     try:
-        percent = int((float(pos) / float(total)) * 100) if total else 100
-    except:
-        percent = 100
+        if _PROGRESS["aggregate"]:
+            me = threading.currentThread().getName()
+            if step:
+                _PROGRESS["steps"][me] = step
+            else:
+                step = _PROGRESS["steps"].get(me)
+            pos = _PROGRESS["done"]
+            total = _PROGRESS["total"]
+            label = "Done:%3d/%-3d W%-2d| %-11s" % (
+                pos, total, len(_PROGRESS["steps"]), (step or "")[:11])
+        else:
+            label = "Pos:%3d/%-3d | %-14s" % (pos, total, (step or "")[:14])
 
-    percent = max(0, min(100, percent))
-    bar = "." * int(percent / 2)
+        try:
+            percent = int((float(pos) / float(total)) * 100) if total else 100
+        except:
+            percent = 100
 
-    label = "Pos:%3d/%-3d | %-14s" % (pos, total, (step or "")[:14])
-    label = "[%-30s]" % label
+        percent = max(0, min(100, percent))
+        bar = "." * int(percent / 2)
+
+        label = "[%-30s]" % label
+
+        sys.stdout.write(
+            "\rProgress: %s %-50s %3d%%\033[K" % (label, bar, percent)
+        )
+        sys.stdout.flush()
+    finally:
+        _PROGRESS_LOCK.release()
 
-    sys.stdout.write(
-        "\rProgress: %s %-50s %3d%%\033[K" % (label, bar, percent)
-    )
-    sys.stdout.flush()
 # ------------------------------------------------
 def ustr_csv(v):
     if v is None:
@@ -114,7 +188,11 @@ def build_status(valid, scan, scan_dr, dirty, dirty_reason,
     return st
 
 # ------------------------------------------------
-def compute_net_side(block, step_prefix, pos, total):
+def compute_net_side(block, step_prefix, pos, total, causes=None):
+    """
+    causes : liste optionnelle, recoit le type d'erreur brut
+             (NSLOOKUP_TIMEOUT, SRVCTL_TIMEOUT...) en cas d'echec
+    """
     host = block.get("host")
     if not host:
         return block, None, None
@@ -123,8 +201,10 @@ def compute_net_side(block, step_prefix, pos, total):
         raise Exception("INVARIANT VIOLATION: host=%r" % host)
 
     show_progress(pos, total, "%s_CNAME" % step_prefix)
-    cname, e1, d1 = resolve_cname(host)
+    cname, e1, d1 = _resolve_cname(host)
     if e1:
+        if causes is not None:
+            causes.append(e1)
         return block, "CNAME_ERROR", "%s: cname resolution failed for %s | %s" % (
             step_prefix, host, d1
         )
@@ -132,13 +212,16 @@ def compute_net_side(block, step_prefix, pos, total):
     block["cname"] = cname
 
     show_progress(pos, total, "%s_SCAN" % step_prefix)
-    scan, e2, d2 = resolve_scan(cname)
+    scan, e2, d2 = _resolve_scan(cname)
     if e2:
+        if causes is not None:
+            causes.append(e2)
         return block, "SCAN_ERROR", "%s: scan resolution failed for %s | %s" % (
             step_prefix, cname, d2
         )
 
     block["scan"] = scan
+    block["scan_source"] = _scan_source(cname)
     return block, None, None
 
 # ------------------------------------------------
@@ -156,13 +239,13 @@ def compute_network_block(host, step, pos, total):
         return net, "HOST_NONE", "%s: host empty" % step
 
     show_progress(pos, total, "%s_CNAME" % step)
-    cname, e1, d1 = resolve_cname(host)
+    cname, e1, d1 = _resolve_cname(host)
     if (not e1) and cname:
         net["cname"] = cname
 
     scan_input = net["cname"] or host
     show_progress(pos, total, "%s_SCAN" % step)
-    scan, e2, d2 = resolve_scan(scan_input)
+    scan, e2, d2 = _resolve_scan(scan_input)
     if e2:
         net["scan"] = scan
         return net, e2, "%s: scan resolution failed for %s | %s" % (
@@ -172,6 +255,38 @@ def compute_network_block(host, step, pos, total):
     net["scan"] = scan
     return net, None, None
 
+# ------------------------------------------------
+def inject_dr_host(new_o, raw):
+    """
+    Complete New.DR.host si absent du JDBC New
+      priorité 1 : JDBC DR explicite
+      priorité 2 : CNAME DR
+    """
+    if not getattr(new_o, "addresses", None):
+        return
+
+    dr_addr = new_o.addresses.get("DR")
+    if not dr_addr or dr_addr.get("host"):
+        return
+
+    # priorité 1 : JDBC DR explicite
+    dr_jdbc = (
+        raw.get("New connection string avec DR")
+        or raw.get("New connection string  avec DR")
+    )
+    if dr_jdbc:
+        dr_o, e_dr, d_dr = interpret(dr_jdbc)
+        if dr_o and getattr(dr_o, "addresses", None):
+            dr_host = dr_o.addresses.get("Primaire", {}).get("host")
+            if dr_host:
+                new_o.addresses["DR"]["host"] = dr_host
+
+    # priorité 2 : CNAME DR
+    if not new_o.addresses["DR"].get("host"):
+        cname_dr = raw.get("Cnames DR")
+        if cname_dr:
+            new_o.addresses["DR"]["host"] = cname_dr
+
 # ------------------------------------------------
 def fill_net_from_addresses(o, net_side):
     if not o or not getattr(o, "addresses", None):
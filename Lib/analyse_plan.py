@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Lib/analyse_plan.py
+#
+# Phase de planification AnalyseV3 (aucun appel reseau)
+#   1) interpret() de chaque ligne selectionnee
+#   2) collecte des hosts Current / New / DR (+ OEM si connu)
+#   3) ensemble unique de hosts -> resolution en masse (RunResolver.prime)
+#   4) optionnel : ordre d'execution groupe par cible (-order=locality)
+#
+# Python 2.6 compatible
+
+from Lib.jdbc_flow_v2 import interpret
+from Lib.analyse_builder_v3 import build_raw_source, inject_dr_host
+from Lib.resolver_run import normalize_key
+
+# ------------------------------------------------
+def row_hosts(row):
+    """
+    Hosts qui seront resolus par build_object_v3 pour cette ligne
+    (meme interpretation JDBC + injection DR)
+    """
+    raw = build_raw_source(row)
+
+    cur_o, ecur, dcur = interpret(raw.get("Current connection string"))
+    new_o, enew, dnew = interpret(raw.get("New connection string"))
+    inject_dr_host(new_o, raw)
+
+    # syntaxe invalide : build_object_v3 ne fait aucune resolution
+    if not (cur_o.valide and new_o.valide):
+        return []
+
+    hosts = []
+    for o in (cur_o, new_o):
+        for role in ("Primaire", "DR"):
+            h = (o.addresses.get(role) or {}).get("host")
+            if h:
+                hosts.append(h)
+    return hosts
+
+def oem_hosts_by_id(rows, ids, oem_map):
+    """
+    {id: host OEM} depuis les profils charges en masse
+    (oem_get_target_profiles) : le host que build_object_v3 resoudra
+    """
+    out = {}
+    for oid in ids:
+        target = build_raw_source(rows[oid - 1]).get("Databases")
+        p = target and (oem_map or {}).get(target)
+        if p and p.get("host"):
+            out[oid] = p["host"]
+    return out
+
+# ------------------------------------------------
+def build_plan(rows, ids, oem_hosts=None):
+    """
+    rows      : lignes CSV normalisees
+    ids       : ids (1-based) a traiter
+    oem_hosts : {id: host OEM} optionnel (oem_hosts_by_id)
+    Retourne {"by_id": {id: [hosts]}, "hosts": [hosts uniques], "refs": n}
+    """
+    by_id = {}
+    uniq = []
+    seen = {}
+    refs = 0
+
+    for oid in ids:
+        hosts = row_hosts(rows[oid - 1])
+        if oem_hosts and oem_hosts.get(oid):
+            hosts.append(oem_hosts[oid])
+
+        by_id[oid] = hosts
+        for h in hosts:
+            refs += 1
+            k = normalize_key(h)
+            if k and k not in seen:
+                seen[k] = 1
+                uniq.append(h)
+
+    return {"by_id": by_id, "hosts": uniq, "refs": refs}
+
+# ------------------------------------------------
+def _locality_key(hosts, cluster_of=None):
+    """
+    Cible d'une ligne : cluster connu (inventaire / OEM) du premier host
+    (row_hosts : Current Primaire en tete), sinon ce host
+    """
+    for h in (hosts or []):
+        k = normalize_key(h)
+        if not k:
+            continue
+        if cluster_of:
+            c = cluster_of(k)
+            if c:
+                return "cluster:%s" % c.lower()
+        return k
+    return None
+
+def cname_cluster_of(resolver, sources):
+    """
+    callable(host) -> cluster | None pour locality_order :
+    le host JDBC (alias / VIP) est d'abord ramene a son CNAME memoise
+    (RunResolver, apres prime), cherche ensuite dans les sources
+    (inventaire, OEM) qui connaissent les noeuds, pas les alias
+    """
+    def cluster_of(host):
+        cname, e, d = resolver.resolve_cname(host)
+        for h in (not e and cname or None, host):
+            if not h:
+                continue
+            for src in sources:
+                c = src and src.cluster_of(h)
+                if c:
+                    return c
+        return None
+    return cluster_of
+
+def locality_order(ids, by_id, cluster_of=None):
+    """
+    Ordre d'execution : lignes regroupees par cible, groupes dans l'ordre
+    de premiere apparition, ids croissants dans chaque groupe.
+    cluster_of : callable(host) -> cluster | None (optionnel,
+                 cname_cluster_of : memo du resolver, sans I/O apres prime)
+    Retourne (ids reordonnes, nb de groupes)
+    """
+    groups = {}
+    order = []
+    for oid in ids:
+        k = _locality_key(by_id.get(oid), cluster_of)
+        if k not in groups:
+            groups[k] = []
+            order.append(k)
+        groups[k].append(oid)
+
+    out = []
+    for k in order:
+        out.extend(groups[k])
+    return out, len(order)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# Lib/analyse_runner.py
+#
+# Execution des constructions d'objets AnalyseV3
+#   - sequentiel (historique)
+#   - pool de threads borne (-workers=N)
+#   - pool de processus, items distribues par paquets (-processes=N)
+# Les resultats sont toujours remis dans l'ordre des items, dans le
+# thread principal (seul proprietaire du store).
+#
+# Python 2.6 compatible
+
+import sys
+import threading
+import traceback
+import Queue
+
+# ------------------------------------------------
+def run_sequential(items, fn, on_result):
+    for item in items:
+        on_result(item, fn(item))
+
+# ------------------------------------------------
+def run_threads(items, fn, workers, on_result):
+    """
+    fn(item) execute sur `workers` threads.
+    on_result(item, result) appele dans le thread courant, dans l'ordre
+    de `items`, des que le prefixe contigu est disponible.
+    Une exception d'un worker est relancee ici.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return run_sequential(items, fn, on_result)
+
+    tasks = Queue.Queue()
+    for i, item in enumerate(items):
+        tasks.put((i, item))
+
+    results = {}
+    errors = []
+    cond = threading.Condition()
+
+    def worker():
+        while True:
+            try:
+                i, item = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            if errors:
+                return
+            try:
+                res = fn(item)
+            except Exception:
+                cond.acquire()
+                try:
+                    errors.append(sys.exc_info())
+                    cond.notifyAll()
+                finally:
+                    cond.release()
+                return
+            cond.acquire()
+            try:
+                results[i] = res
+                cond.notifyAll()
+            finally:
+                cond.release()
+
+    threads = []
+    for n in range(min(workers, len(items))):
+        t = threading.Thread(target=worker, name="worker-%d" % (n + 1))
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+
+    for i, item in enumerate(items):
+        cond.acquire()
+        try:
+            while i not in results and not errors:
+                cond.wait(0.5)
+            if errors:
+                break
+            res = results.pop(i)
+        finally:
+            cond.release()
+        on_result(item, res)
+
+    for t in threads:
+        t.join()
+
+    if errors:
+        et, ev, tb = errors[0]
+        raise et, ev, tb
+
+# ------------------------------------------------
+def _chunks(items, size):
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def run_processes(items, fn, processes, on_result, chunk_size=50, init=None,
+                  child_stats=None, on_stats=None, fini=None):
+    """
+    fn(item) execute dans `processes` processus (fork), par paquets.
+    Les processus renvoient leurs objets finis par une queue ; seul le
+    processus courant appelle on_result(item, result), dans l'ordre.
+    init() est appele une fois dans chaque processus fils, fini() juste
+    avant sa sortie (les fils ne passent pas par atexit).
+    child_stats() (fils, en fin de travail) -> on_stats(dict) (parent)
+    """
+    import multiprocessing
+
+    items = list(items)
+    if processes <= 1 or len(items) <= 1:
+        return run_sequential(items, fn, on_result)
+
+    chunks = _chunks(items, chunk_size)
+    nproc = min(processes, len(chunks))
+
+    task_q = multiprocessing.Queue()
+    result_q = multiprocessing.Queue()
+    for i, c in enumerate(chunks):
+        task_q.put((i, c))
+    for n in range(nproc):
+        task_q.put(None)
+
+    def child():
+        if init:
+            init()
+        try:
+            work()
+        finally:
+            if fini:
+                fini()
+
+    def work():
+        while True:
+            t = task_q.get()
+            if t is None:
+                if child_stats:
+                    result_q.put((None, child_stats(), None))
+                return
+            i, chunk = t
+            try:
+                out = [(it, fn(it)) for it in chunk]
+            except Exception:
+                result_q.put((i, None, traceback.format_exc()))
+                return
+            result_q.put((i, out, None))
+
+    procs = []
+    for n in range(nproc):
+        p = multiprocessing.Process(target=child, name="analyse-%d" % (n + 1))
+        p.daemon = True
+        p.start()
+        procs.append(p)
+
+    pending = {}
+    next_i = 0
+    stats_left = child_stats and nproc or 0
+    failed = True
+    try:
+        while next_i < len(chunks) or stats_left:
+            try:
+                i, out, err = result_q.get(True, 1.0)
+            except Queue.Empty:
+                if not [p for p in procs if p.is_alive()]:
+                    raise RuntimeError(
+                        "worker processes exited before finishing (%d/%d chunks)"
+                        % (next_i, len(chunks)))
+                continue
+
+            if err:
+                raise RuntimeError("worker process failed:\n%s" % err)
+
+            if i is None:
+                stats_left -= 1
+                if on_stats:
+                    on_stats(out)
+                continue
+
+            pending[i] = out
+            while next_i in pending:
+                for it, res in pending.pop(next_i):
+                    on_result(it, res)
+                next_i += 1
+        failed = False
+    finally:
+        for p in procs:
+            if failed and p.is_alive():
+                p.terminate()
+            p.join()
+
+# ------------------------------------------------
+class ChildStats(object):
+    """
+    Composants porteurs de stats en mode -processes :
+      reset()    dans chaque fils (init de run_processes)
+      snapshot() dans le fils en fin de travail (child_stats)
+      merge(x)   dans le parent (on_stats)
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def add(self, name, reset, snapshot, merge):
+        self.parts.append((name, reset, snapshot, merge))
+
+    def add_stats(self, name, obj):
+        """
+        obj a la convention reset_stats() / stats / merge_stats() ; None ignore
+        """
+        if obj is None:
+            return
+        self.add(name, obj.reset_stats, lambda: dict(obj.stats), obj.merge_stats)
+
+    def reset(self):
+        for name, reset, snapshot, merge in self.parts:
+            reset()
+
+    def snapshot(self):
+        return dict((name, snapshot()) for name, reset, snapshot, merge in self.parts)
+
+    def merge(self, st):
+        for name, reset, snapshot, merge in self.parts:
+            merge((st or {}).get(name))
+
+# ------------------------------------------------
+def parse_int_option(args, name, default):
+    """
+    Lit name=N dans les arguments (entier >= 1, sinon default)
+    """
+    prefix = name + "="
+    for a in args:
+        if a.startswith(prefix):
+            try:
+                return max(1, int(a.split("=", 1)[1]))
+            except:
+                return default
+    return default
+
+def parse_workers(args, name="-workers"):
+    """
+    Lit -workers=N dans les arguments (defaut 1)
+    """
+    return parse_int_option(args, name, 1)
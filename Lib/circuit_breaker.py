@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Lib/circuit_breaker.py
+#
+# Disjoncteur par cible (noeud SSH, resolveur DNS)
+#   CLOSED    : appels normaux, compteur de timeouts consecutifs
+#   OPEN      : apres N timeouts consecutifs, appels refuses immediatement
+#               (CIRCUIT_OPEN) pendant `cooldown` secondes
+#   HALF_OPEN : apres le cooldown, UN appel d'essai ; succes -> CLOSED,
+#               timeout -> OPEN (nouveau cooldown)
+#               appel d'essai sans record() (exception : release()) ou
+#               perdu depuis plus d'un cooldown -> nouvel essai autorise
+#
+# Cles : "ssh:<noeud>", "dns:<resolveur>"
+#
+# Python 2.6 compatible
+
+import threading
+import time
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_COOLDOWN = 60
+
+# ------------------------------------------------
+class CircuitBreaker(object):
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, cooldown=DEFAULT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.targets = {}
+
+    def _target(self, key):
+        return self.targets.setdefault(key, {
+            "state": CLOSED,
+            "fails": 0,
+            "opened_at": 0,
+            "probing": False,
+            "probe_at": 0,
+            "opens": 0,
+            "rejected": 0,
+        })
+
+    # --------------------------------------------
+    def allow(self, key, now=None):
+        """
+        Retourne (True, None, None) ou (False, "CIRCUIT_OPEN", detail)
+        """
+        self._lock.acquire()
+        try:
+            t = self._target(key)
+            if t["state"] == CLOSED:
+                return True, None, None
+
+            now = now or time.time()
+            if t["state"] == OPEN and now - t["opened_at"] >= self.cooldown:
+                t["state"] = HALF_OPEN
+                t["probing"] = False
+
+            if t["state"] == HALF_OPEN and t["probing"] and \
+                    now - t["probe_at"] >= self.cooldown:
+                # essai jamais conclu
+                t["probing"] = False
+
+            if t["state"] == HALF_OPEN and not t["probing"]:
+                t["probing"] = True
+                t["probe_at"] = now
+                return True, None, None
+
+            t["rejected"] += 1
+            return False, "CIRCUIT_OPEN", "CIRCUIT_OPEN %s (%d consecutive timeouts, retry after %s)" % (
+                key, t["fails"],
+                time.strftime("%H:%M:%S", time.localtime(t["opened_at"] + self.cooldown)))
+        finally:
+            self._lock.release()
+
+    def record(self, key, timed_out, now=None):
+        """
+        Resultat d'un appel autorise : timed_out True/False
+        """
+        self._lock.acquire()
+        try:
+            t = self._target(key)
+            t["probing"] = False
+            if not timed_out:
+                t["state"] = CLOSED
+                t["fails"] = 0
+                return
+            t["fails"] += 1
+            if t["state"] == OPEN:
+                # appel lance avant l'ouverture
+                return
+            if t["state"] == HALF_OPEN or t["fails"] >= self.threshold:
+                t["state"] = OPEN
+                t["opened_at"] = now or time.time()
+                t["opens"] += 1
+        finally:
+            self._lock.release()
+
+    def release(self, key):
+        """
+        Appel autorise termine sans resultat (exception) : l'etat ne change
+        pas, un appel d'essai en cours est libere
+        """
+        self._lock.acquire()
+        try:
+            self._target(key)["probing"] = False
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self._lock.acquire()
+        try:
+            for t in self.targets.values():
+                t["opens"] = 0
+                t["rejected"] = 0
+        finally:
+            self._lock.release()
+
+    def merge_stats(self, other):
+        """
+        Ajoute les compteurs / etats d'un autre processus (snapshot())
+        """
+        self._lock.acquire()
+        try:
+            for key, o in (other or {}).items():
+                t = self._target(key)
+                t["opens"] += o.get("opens", 0)
+                t["rejected"] += o.get("rejected", 0)
+                if o.get("state") != CLOSED:
+                    t["state"] = o.get("state")
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        self._lock.acquire()
+        try:
+            return dict((k, dict(v)) for k, v in self.targets.items())
+        finally:
+            self._lock.release()
+
+    def summary_lines(self):
+        out = []
+        self._lock.acquire()
+        try:
+            for key in sorted(self.targets.keys()):
+                t = self.targets[key]
+                if t["state"] == CLOSED and not t["opens"]:
+                    continue
+                out.append("  circuit %-30s: %-9s opens=%d rejected=%d" % (
+                    key, t["state"], t["opens"], t["rejected"]))
+        finally:
+            self._lock.release()
+        if not out:
+            out.append("  circuit : all CLOSED")
+        return out
+
+# ------------------------------------------------
+CIRCUIT = CircuitBreaker()
+
+def set_circuit_breaker(cb):
+    global CIRCUIT
+    CIRCUIT = cb
+
+def get_circuit_breaker():
+    return CIRCUIT
+
+def configure_circuit(conf):
+    """
+    Data/config.conf :
+      CIRCUIT_THRESHOLD=5   (timeouts consecutifs avant ouverture)
+      CIRCUIT_COOLDOWN=60   (secondes avant appel d'essai)
+    Retourne (ok, err_type, err_detail)
+    """
+    conf = conf or {}
+    try:
+        threshold = int(conf.get("CIRCUIT_THRESHOLD") or DEFAULT_THRESHOLD)
+        cooldown = int(conf.get("CIRCUIT_COOLDOWN") or DEFAULT_COOLDOWN)
+    except Exception as e:
+        return False, "CIRCUIT_CONF_INVALID", str(e)
+    set_circuit_breaker(CircuitBreaker(max(1, threshold), max(0, cooldown)))
+    return True, None, None
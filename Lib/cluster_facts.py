@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+# Lib/cluster_facts.py
+#
+# Faits d'un noeud de cluster Oracle, collectes en UN aller-retour SSH
+#   - un script composite : srvctl config scan / lsnrctl services /
+#     srvctl config service (chaque base du cluster, en dernier : la
+#     partie longue)
+#   - sortie decoupee en sections (@@SCAN, @@LISTENER, @@SERVICES <db>)
+#   - seules les sections demandees sont collectees (SCAN toujours) ; une
+#     section manquante est collectee a la demande (nouvel aller-retour)
+#   - enregistrement memorise pour le run, par (user, noeud)
+#   - les appelants interrogent l'enregistrement (scan, services, listener)
+#   - timeout : la sortie deja recue est conservee ; une section suivie
+#     d'un autre marqueur est complete. Section utile a l'appelant recue
+#     en entier : ni echec pour le disjoncteur, ni echantillon de timeout
+#
+# Erreurs de collecte : SRVCTL_TIMEOUT / SRVCTL_ERROR (contrat historique
+# de srvctl config scan)
+#
+# Python 2.6 compatible
+
+import threading
+import time
+
+from Lib.cmd_runner import run_cmd_u, adaptive_timeout, observe_latency, RC_TIMEOUT
+from Lib.ssh_pool import ssh_argv
+from Lib.circuit_breaker import get_circuit_breaker
+
+DEFAULT_TIMEOUT = 30
+
+DEFAULT_OPTS = [
+    "StrictHostKeyChecking=no",
+    "UserKnownHostsFile=/dev/null",
+]
+
+MARK = u"@@"
+
+# ordre d'emission : sections rapides d'abord, boucle par base en dernier
+SECTIONS = (u"SCAN", u"LISTENER", u"SERVICES")
+
+SECTION_SCRIPTS = {
+    u"SCAN": "echo '@@SCAN' ; srvctl config scan 2>&1 ; ",
+    u"LISTENER": "echo '@@LISTENER' ; lsnrctl services 2>&1 ; ",
+    u"SERVICES": (
+        "for db in `srvctl config database 2>/dev/null` ; do "
+        "echo \"@@SERVICES $db\" ; srvctl config service -db $db 2>&1 ; "
+        "done ; "),
+}
+
+def facts_script(sections=SECTIONS):
+    """
+    Script composite des sections demandees (SCAN toujours : il sert aussi
+    a detecter un ssh en echec)
+    """
+    script = ". ~/.bash_profile >/dev/null 2>&1 ; "
+    for name in SECTIONS:
+        if name == u"SCAN" or name in sections:
+            script += SECTION_SCRIPTS[name]
+    return script + "echo '@@END'"
+
+FACTS_SCRIPT = facts_script()
+
+# ------------------------------------------------
+# PARSING
+# ------------------------------------------------
+def split_sections(text):
+    """
+    Retourne ([(nom, arg, [lignes])], complet)
+    """
+    sections = []
+    cur = None
+    complete = False
+    for line in (text or u"").splitlines():
+        s = line.strip()
+        if s.startswith(MARK):
+            parts = s[len(MARK):].split(None, 1)
+            name = parts and parts[0] or u""
+            if name == u"END":
+                complete = True
+                cur = None
+                continue
+            cur = (name, len(parts) > 1 and parts[1] or None, [])
+            sections.append(cur)
+            continue
+        if cur is not None:
+            cur[2].append(line)
+    return sections, complete
+
+
+def parse_scan(lines, node):
+    """
+    Ligne "SCAN name: xxx, Network: 1" -> (scan, err_type, err_detail)
+    """
+    for l in lines:
+        s = l.strip()
+        if s.lower().startswith("scan name"):
+            v = s.split(":", 1)[1].strip()
+            # 🔧 nettoyage critique
+            if "," in v:
+                v = v.split(",", 1)[0].strip()
+            if v.endswith("."):
+                v = v[:-1]
+            if v:
+                return v, None, None
+    return None, "SCAN_NOT_FOUND", "No SCAN for %s" % node
+
+
+def parse_service_names(lines):
+    out = []
+    for l in lines:
+        s = l.strip()
+        if s.lower().startswith("service name:"):
+            v = s.split(":", 1)[1].strip()
+            if v:
+                out.append(v)
+    return out
+
+
+def parse_listener_services(lines):
+    out = []
+    for l in lines:
+        s = l.strip()
+        if s.startswith("Service \""):
+            out.append(s.split("\"")[1])
+    return out
+
+
+def parse_facts(text, node):
+    """
+    Sortie du script composite -> enregistrement
+      {node, complete, sections: [noms complets], scan: (v, e, d),
+       databases: {db: [services]}, listener_services: [..]}
+    Sortie tronquee (timeout) : la derniere section est ignoree
+    """
+    sections, complete = split_sections(text)
+    if not complete:
+        sections = sections[:-1]
+    rec = {
+        "node": node,
+        "complete": complete,
+        "sections": [name for name, arg, lines in sections],
+        "truncated": None,      # detail du timeout si sortie partielle
+        "scan": (None, "SCAN_NOT_FOUND", "No SCAN for %s" % node),
+        "databases": {},
+        "listener_services": [],
+    }
+    for name, arg, lines in sections:
+        if name == u"SCAN":
+            rec["scan"] = parse_scan(lines, node)
+        elif name == u"SERVICES" and arg:
+            rec["databases"][arg] = parse_service_names(lines)
+        elif name == u"LISTENER":
+            rec["listener_services"] = parse_listener_services(lines)
+    return rec
+
+def has_section(rec, name):
+    """
+    Section recue en entier (SERVICES : boucle par base terminee)
+    """
+    if name == u"SERVICES":
+        return rec["complete"]
+    return name in rec["sections"]
+
+# ------------------------------------------------
+# COLLECTEUR
+# ------------------------------------------------
+class ClusterFacts(object):
+
+    def __init__(self, user="oracle", opts=None, timeout_sec=DEFAULT_TIMEOUT,
+                 sections=SECTIONS):
+        """
+        sections : collectees au premier appel pour un noeud (les autres a
+                   la demande) ; JdbcCheck : toutes, AnalyseV3 : SCAN
+        """
+        self.user = user
+        self.opts = opts if opts is not None else DEFAULT_OPTS
+        self.timeout_sec = timeout_sec
+        self.sections = tuple(sections)
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._records = {}
+
+        self.stats = {"collected": 0, "hits": 0, "errors": 0}
+
+    # --------------------------------------------
+    def _key_lock(self, key):
+        self._lock.acquire()
+        try:
+            return self._key_locks.setdefault(key, threading.Lock())
+        finally:
+            self._lock.release()
+
+    def _collect(self, user, node, sections, need):
+        """
+        sections : a collecter ; need : section attendue par l'appelant
+        """
+        cb = get_circuit_breaker()
+        key = "ssh:%s" % node.lower()
+        ok, e, d = cb.allow(key)
+        if not ok:
+            return None, e, d
+
+        try:
+            cmd = ssh_argv(user, node, facts_script(sections), opts=self.opts)
+            timeout_sec = adaptive_timeout("ssh", node, self.timeout_sec)
+            t0 = time.time()
+            rc, out_u, err_u = run_cmd_u(cmd, timeout_sec, kind="ssh", target=node,
+                                         observe=False)
+        except:
+            cb.release(key)
+            raise
+
+        rec = parse_facts(out_u, node)
+        rec["collected"] = list(sections)
+        # timeout apres la section utile : pas un echec pour l'appelant
+        timed_out = rc == RC_TIMEOUT and not has_section(rec, need)
+        cb.record(key, timed_out)
+        observe_latency("ssh", node, time.time() - t0,
+                        rc == RC_TIMEOUT and not timed_out and 0 or rc)
+        if rc == RC_TIMEOUT:
+            detail = "srvctl timeout for %s (%.1fs)" % (node, timeout_sec)
+            if u"SCAN" not in rec["sections"]:
+                return None, "SRVCTL_TIMEOUT", detail
+            # SCAN recu en entier : enregistrement partiel
+            rec["truncated"] = detail
+            return rec, None, None
+        if MARK + u"SCAN" not in out_u:
+            # ssh KO (auth, host injoignable...) : rien n'a ete execute
+            return None, "SRVCTL_ERROR", (err_u or out_u).strip()
+        return rec, None, None
+
+    # --------------------------------------------
+    def get(self, node, user=None, need=u"SCAN"):
+        """
+        Enregistrement du noeud (collecte au premier appel, nouvelle
+        collecte si la section need n'a pas ete demandee)
+        Retourne (record, err_type, err_detail)
+        """
+        user = user or self.user
+        if not node:
+            return None, "HOST_EMPTY", "Host is empty"
+        key = (user, node.strip().lower().rstrip("."))
+
+        kl = self._key_lock(key)
+        kl.acquire()
+        try:
+            res = self._records.get(key)
+            sections = list(self.sections)
+            if res is not None:
+                if res[1] or need in res[0]["collected"]:
+                    self._count("hits")
+                    return res
+                sections.extend(res[0]["collected"])
+            if need not in sections:
+                sections.append(need)
+            old = res
+            res = self._collect(user, node.strip(), sections, need)
+            if res[1] != "CIRCUIT_OPEN" and (old is None or not res[1]):
+                # refus du disjoncteur : pas memorise, reessai apres cooldown ;
+                # echec d'une collecte a la demande : l'enregistrement
+                # precedent reste valable pour ses sections
+                self._records[key] = res
+            self._count("errors" if res[1] else "collected")
+            return res
+        finally:
+            kl.release()
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def scan(self, node, user=None):
+        """
+        (scan, err_type, err_detail) — contrat de srvctl config scan
+        """
+        rec, e, d = self.get(node, user)
+        if e:
+            return None, e, d
+        return rec["scan"]
+
+    def services(self, node, dbname=None, user=None):
+        """
+        Services declares (srvctl config service) : d'une base (liste vide
+        si la base n'est pas sur ce cluster), ou de toutes les bases si
+        dbname absent
+        """
+        rec, e, d = self.get(node, user, u"SERVICES")
+        if e:
+            return None, e, d
+        dbs = rec["databases"]
+        if dbname:
+            for db in dbs:
+                if db.lower() == dbname.lower():
+                    return dbs[db], None, None
+            if rec["truncated"]:
+                return None, "SRVCTL_TIMEOUT", rec["truncated"]
+            return [], None, None
+        if rec["truncated"]:
+            return None, "SRVCTL_TIMEOUT", rec["truncated"]
+        out = []
+        for db in sorted(dbs.keys()):
+            out.extend(dbs[db])
+        return out, None, None
+
+    def listener_services(self, node, user=None):
+        rec, e, d = self.get(node, user, u"LISTENER")
+        if e:
+            return None, e, d
+        if u"LISTENER" not in rec["sections"] and rec["truncated"]:
+            return None, "SRVCTL_TIMEOUT", rec["truncated"]
+        return rec["listener_services"], None, None
+
+    # --------------------------------------------
+    def forget_errors(self, err_types):
+        """
+        Oublie les collectes en echec de ces types (reessai)
+        """
+        self._lock.acquire()
+        try:
+            for k in list(self._records.keys()):
+                if self._records[k][1] in err_types:
+                    del self._records[k]
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self._lock.acquire()
+        try:
+            for k in self.stats:
+                self.stats[k] = 0
+        finally:
+            self._lock.release()
+
+    def merge_stats(self, other):
+        """
+        Ajoute les compteurs d'un autre collecteur (processus fils)
+        """
+        self._lock.acquire()
+        try:
+            for k, v in (other or {}).items():
+                self.stats[k] = self.stats.get(k, 0) + v
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def summary_lines(self):
+        st = self.stats
+        return [
+            "  cluster facts : noeuds=%d erreurs=%d hits=%d" % (
+                st["collected"], st["errors"], st["hits"]),
+        ]
+
+# ------------------------------------------------
+# collecteur par defaut (AnalyseV3, jdbc_raw) : SCAN seulement ;
+# JdbcCheck installe le sien avec toutes les sections
+CLUSTER_FACTS = ClusterFacts(sections=(u"SCAN",))
+
+def set_cluster_facts(facts):
+    global CLUSTER_FACTS
+    CLUSTER_FACTS = facts
+
+def get_cluster_facts():
+    return CLUSTER_FACTS
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Lib/cluster_inventory.py
+#
+# Inventaire noeud -> cluster -> SCAN (source SCAN avant SSH / srvctl)
+#   CSV  (";") : colonnes node ; cluster ; scan   (en-tete obligatoire)
+#   JSON       : [{"node": .., "cluster": .., "scan": ..}, ...]
+#                ou {"clusters": [{"name": .., "scan": .., "nodes": [..]}]}
+#   - index par nom complet et par nom court du noeud
+#   - noeud absent -> None (l'appelant passe par SSH)
+#   - verify=True : l'appelant interroge quand meme srvctl et signale
+#     les divergences (mismatch)
+#   - meme index alimente par le referentiel OEM (une requete par run,
+#     source "OEM", Lib/oem_flow.oem_get_cluster_scans)
+#
+# Contrat : (scan, err_type, err_detail) comme srvctl_config_scan, ou None
+#
+# Python 2.6 compatible
+
+import csv
+import json
+import threading
+
+from Lib.oem_flow import oem_get_cluster_scans, get_oem_snapshot
+
+SOURCE_NAME = "INVENTORY"
+SOURCE_OEM = "OEM"
+
+# ------------------------------------------------
+def _norm(name):
+    if not name:
+        return None
+    try:
+        if not isinstance(name, unicode):
+            name = unicode(name, "utf-8", "ignore")
+    except:
+        return None
+    n = name.replace(u"\ufeff", u"").strip().lower()
+    if n.endswith("."):
+        n = n[:-1]
+    return n or None
+
+def _short(name):
+    return name.split(".", 1)[0]
+
+# ------------------------------------------------
+class ClusterInventory(object):
+
+    def __init__(self, verify=False, name=SOURCE_NAME):
+        self.verify = verify
+        self.name = name
+        self.nodes = {}         # noeud -> (cluster, scan)
+        self.short = {}         # nom court -> (cluster, scan) | None si ambigu
+        self.files = []
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "mismatches": 0}
+
+    # --------------------------------------------
+    def add(self, node, cluster, scan):
+        node = _norm(node)
+        scan = _norm(scan)
+        if not node or not scan:
+            return False
+        entry = (cluster and cluster.strip() or None, scan)
+        self.nodes[node] = entry
+        s = _short(node)
+        if s in self.short and self.short[s] != entry:
+            self.short[s] = None
+        else:
+            self.short[s] = entry
+        return True
+
+    def load(self, path):
+        """
+        Retourne (ok, err_type, err_detail) ; err_detail = nb de noeuds si ok
+        """
+        try:
+            data = open(path, "rb").read()
+        except Exception as e:
+            return False, "INVENTORY_ERROR", "%s | %s" % (path, e)
+
+        n = 0
+        try:
+            if path.lower().endswith(".json"):
+                doc = json.loads(data.decode("utf-8"))
+                if isinstance(doc, dict):
+                    for c in doc.get("clusters") or []:
+                        for node in c.get("nodes") or []:
+                            n += self.add(node, c.get("name"), c.get("scan"))
+                else:
+                    for r in doc:
+                        n += self.add(r.get("node"), r.get("cluster"), r.get("scan"))
+            else:
+                reader = csv.reader(data.splitlines(), delimiter=";")
+                header = None
+                for r in reader:
+                    r = [c.decode("utf-8", "ignore") for c in r]
+                    if header is None:
+                        header = [_norm(c) for c in r]
+                        continue
+                    row = dict(zip(header, r))
+                    n += self.add(row.get("node"), row.get("cluster"), row.get("scan"))
+        except Exception as e:
+            return False, "INVENTORY_ERROR", "%s | %s" % (path, e)
+
+        self.files.append(path)
+        return True, None, n
+
+    # --------------------------------------------
+    def lookup(self, node):
+        """
+        (scan, None, None) si le noeud est inventorie, sinon None
+        """
+        n = _norm(node)
+        entry = None
+        if n:
+            entry = self.nodes.get(n) or self.short.get(_short(n))
+        self._count(entry and "hits" or "misses")
+        if entry is None:
+            return None
+        return entry[1], None, None
+
+    def cluster_of(self, node):
+        n = _norm(node)
+        entry = n and (self.nodes.get(n) or self.short.get(_short(n)))
+        return entry and entry[0] or None
+
+    def record_mismatch(self):
+        self._count("mismatches")
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0, "mismatches": 0}
+
+    def merge_stats(self, other):
+        for k, v in (other or {}).items():
+            self.stats[k] = self.stats.get(k, 0) + v
+
+    def summary_lines(self):
+        line = "  %s : nodes=%d | hits=%d misses=%d (ssh)" % (
+            self.name == SOURCE_NAME and "inventory" or self.name.lower(),
+            len(self.nodes), self.stats["hits"], self.stats["misses"])
+        if self.verify:
+            line += " | verify mismatches=%d" % self.stats["mismatches"]
+        return [line]
+
+# ------------------------------------------------
+def open_cluster_inventory(conf):
+    """
+    Data/config.conf :
+      CLUSTER_INVENTORY_FILE=Data/cluster_inventory.csv   (vide = desactive)
+      CLUSTER_INVENTORY_VERIFY=0   (1 = srvctl quand meme, divergences comptees)
+    Retourne (inventory|None, err_type, err_detail)
+    """
+    conf = conf or {}
+    paths = [p.strip() for p in (conf.get("CLUSTER_INVENTORY_FILE") or "").split(",")
+             if p.strip()]
+    if not paths:
+        return None, None, None
+
+    verify = str(conf.get("CLUSTER_INVENTORY_VERIFY", "0")).strip().lower() in (
+        "1", "yes", "true", "on")
+    inv = ClusterInventory(verify)
+    for p in paths:
+        ok, e, d = inv.load(p)
+        if not ok:
+            return None, e, d
+    return inv, None, None
+
+def open_oem_scan_source(conf, oem_conn, session=None):
+    """
+    Data/config.conf :
+      OEM_SCAN_SOURCE=1   (host -> cluster -> SCAN lus dans OEM, une requete par run)
+    Retourne (source|None, err_type, err_detail)
+    """
+    conf = conf or {}
+    if not oem_conn and get_oem_snapshot() is None:
+        return None, None, None
+    if str(conf.get("OEM_SCAN_SOURCE", "1")).strip().lower() in ("0", "no", "false", "off"):
+        return None, None, None
+
+    rows, e, d = oem_get_cluster_scans(oem_conn, session)
+    if e:
+        return None, e, d
+    src = ClusterInventory(False, SOURCE_OEM)
+    for host, cluster, scan in rows:
+        src.add(host, cluster, scan)
+    return src, None, None
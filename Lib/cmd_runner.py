@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+# Lib/cmd_runner.py
+#
+# Execution des commandes externes (nslookup, ssh, sqlplus, tnsping)
+#   - attente evenementielle (select sur les pipes), sans poll()+sleep
+#   - stdout / stderr lus pendant l'execution (pas de pipe plein)
+#   - stdin ecrit au fil de l'eau
+#   - timeout precis par commande (kill + rc=124)
+#   - supervision de plusieurs fils dans une seule boucle (run_many)
+#   - latence enregistree par type de commande
+#   - timeouts adaptatifs optionnels (Lib/adaptive_timeout) : les latences
+#     observees alimentent adaptive_timeout(kind, target, defaut)
+#
+# Codes retour speciaux : 124 = timeout, 127 = lancement impossible
+#
+# Python 2.6 compatible
+
+import os
+import errno
+import fcntl
+import select
+import subprocess
+import threading
+import time
+
+RC_TIMEOUT = 124
+RC_SPAWN_ERROR = 127
+
+READ_SIZE = 65536
+
+# ------------------------------------------------
+# LATENCE
+# ------------------------------------------------
+class LatencyStats(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.kinds = {}
+
+    def record(self, kind, target, elapsed, rc):
+        self._lock.acquire()
+        try:
+            k = self.kinds.setdefault(kind, {
+                "count": 0, "total": 0.0, "max": 0.0, "timeouts": 0, "errors": 0
+            })
+            k["count"] += 1
+            k["total"] += elapsed
+            if elapsed > k["max"]:
+                k["max"] = elapsed
+            if rc == RC_TIMEOUT:
+                k["timeouts"] += 1
+            elif rc != 0:
+                k["errors"] += 1
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self.kinds = {}
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        self._lock.acquire()
+        try:
+            return dict((k, dict(v)) for k, v in self.kinds.items())
+        finally:
+            self._lock.release()
+
+    def merge(self, kinds):
+        """
+        Ajoute les compteurs d'un autre processus (snapshot())
+        """
+        self._lock.acquire()
+        try:
+            for kind, o in (kinds or {}).items():
+                k = self.kinds.setdefault(kind, {
+                    "count": 0, "total": 0.0, "max": 0.0, "timeouts": 0, "errors": 0
+                })
+                for f in ("count", "total", "timeouts", "errors"):
+                    k[f] += o.get(f, 0)
+                if o.get("max", 0.0) > k["max"]:
+                    k["max"] = o["max"]
+        finally:
+            self._lock.release()
+
+    def summary_lines(self):
+        out = []
+        self._lock.acquire()
+        try:
+            for kind in sorted(self.kinds.keys()):
+                k = self.kinds[kind]
+                avg = (k["total"] / k["count"]) if k["count"] else 0.0
+                out.append(
+                    "  cmd %-9s: n=%d avg=%.0fms max=%.0fms timeouts=%d errors=%d" % (
+                        kind, k["count"], avg * 1000, k["max"] * 1000,
+                        k["timeouts"], k["errors"]))
+        finally:
+            self._lock.release()
+        return out
+
+LATENCY = LatencyStats()
+
+# Lib/adaptive_timeout.AdaptiveTimeouts ou None (timeouts statiques)
+ADAPTIVE = None
+
+def set_adaptive_timeouts(adaptive):
+    global ADAPTIVE
+    ADAPTIVE = adaptive
+
+def adaptive_timeout(kind, target, default):
+    """
+    Timeout appris pour (kind, target), default si rien d'appris
+    """
+    if ADAPTIVE is None:
+        return default
+    return ADAPTIVE.timeout(kind, target, default)
+
+def observe_latency(kind, target, elapsed, rc):
+    LATENCY.record(kind, target, elapsed, rc)
+    if ADAPTIVE is not None and rc != RC_SPAWN_ERROR:
+        ADAPTIVE.observe(kind, target, elapsed)
+
+# ------------------------------------------------
+def _to_unicode(s):
+    if s is None:
+        return u""
+    if isinstance(s, unicode):
+        return s
+    try:
+        return s.decode("utf-8", "ignore")
+    except:
+        return unicode(str(s), "utf-8", "ignore")
+
+def _set_nonblocking(fd):
+    fl = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+
+def _cmd_kind(cmd):
+    try:
+        return os.path.basename(cmd[0])
+    except:
+        return "cmd"
+
+# ------------------------------------------------
+class _Child(object):
+
+    def __init__(self, idx, spec, timeout_sec):
+        self.idx = idx
+        self.cmd = spec["cmd"]
+        self.kind = spec.get("kind") or _cmd_kind(self.cmd)
+        self.target = spec.get("target")
+        self.stdin_data = spec.get("stdin")
+        self.timeout_sec = spec.get("timeout_sec", timeout_sec)
+        self.observe = spec.get("observe", True)
+
+        self.out = []
+        self.err = []
+        self.rc = None
+        self.timed_out = False
+        self.p = None
+        self.fds = {}
+
+        self.start = time.time()
+        self.deadline = self.start + self.timeout_sec
+
+        try:
+            self.p = subprocess.Popen(
+                self.cmd,
+                stdin=(subprocess.PIPE if self.stdin_data is not None else None),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=spec.get("env"),
+                close_fds=True,
+            )
+        except Exception as e:
+            self.rc = RC_SPAWN_ERROR
+            self.err.append(str(e))
+            return
+
+        for f, name in ((self.p.stdout, "out"), (self.p.stderr, "err")):
+            _set_nonblocking(f.fileno())
+            self.fds[f.fileno()] = (f, name)
+
+        if self.stdin_data is not None:
+            self.stdin_buf = self.stdin_data
+            if isinstance(self.stdin_buf, unicode):
+                self.stdin_buf = self.stdin_buf.encode("utf-8")
+            _set_nonblocking(self.p.stdin.fileno())
+            if not self.stdin_buf:
+                self._close_stdin()
+
+    def _close_stdin(self):
+        try:
+            self.p.stdin.close()
+        except:
+            pass
+        self.stdin_buf = None
+
+    def wants_write(self):
+        return self.p is not None and getattr(self, "stdin_buf", None) is not None
+
+    def on_writable(self):
+        try:
+            n = os.write(self.p.stdin.fileno(), self.stdin_buf[:READ_SIZE])
+            self.stdin_buf = self.stdin_buf[n:]
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            # EPIPE : le fils n'attend plus rien
+            self.stdin_buf = ""
+        if not self.stdin_buf:
+            self._close_stdin()
+
+    def on_readable(self, fd):
+        f, name = self.fds[fd]
+        try:
+            data = os.read(fd, READ_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            data = ""
+        if data:
+            (self.out if name == "out" else self.err).append(data)
+            return
+        # EOF
+        try:
+            f.close()
+        except:
+            pass
+        del self.fds[fd]
+
+    def kill(self):
+        self.timed_out = True
+        try:
+            self.p.kill()
+        except:
+            pass
+        if self.wants_write():
+            self._close_stdin()
+        for fd in list(self.fds.keys()):
+            try:
+                while True:
+                    data = os.read(fd, READ_SIZE)
+                    if not data:
+                        break
+                    self.on_readable_data(fd, data)
+            except OSError:
+                pass
+            try:
+                self.fds[fd][0].close()
+            except:
+                pass
+        self.fds = {}
+        try:
+            self.p.wait()
+        except:
+            pass
+        self.rc = RC_TIMEOUT
+
+    def on_readable_data(self, fd, data):
+        f, name = self.fds[fd]
+        (self.out if name == "out" else self.err).append(data)
+
+    def finished(self):
+        if self.rc is not None:
+            return True
+        if self.fds or self.wants_write():
+            return False
+        rc = self.p.poll()
+        if rc is None:
+            return False
+        self.rc = rc
+        return True
+
+    def result(self):
+        return self.rc, "".join(self.out), "".join(self.err)
+
+# ------------------------------------------------
+def run_many(specs, timeout_sec=60):
+    """
+    specs : liste de dict {cmd, stdin?, env?, kind?, target?, timeout_sec?,
+            observe?} (observe=False : latence laissee a l'appelant)
+    Retourne la liste des (rc, out, err) (str) dans l'ordre des specs.
+    Tous les fils sont supervises par une seule boucle select().
+    """
+    children = [_Child(i, s, timeout_sec) for i, s in enumerate(specs)]
+    active = []
+    for c in children:
+        if c.rc is None:
+            active.append(c)
+        else:
+            LATENCY.record(c.kind, c.target, 0.0, c.rc)
+
+    while active:
+        now = time.time()
+
+        for c in active[:]:
+            if c.rc is None and now >= c.deadline:
+                c.kill()
+
+        rl = []
+        wl = []
+        owner = {}
+        waiting_exit = False
+        for c in active:
+            if c.rc is not None:
+                continue
+            for fd in c.fds:
+                rl.append(fd)
+                owner[fd] = c
+            if c.wants_write():
+                fd = c.p.stdin.fileno()
+                wl.append(fd)
+                owner[fd] = c
+            if not c.fds and not c.wants_write():
+                waiting_exit = True
+
+        if rl or wl:
+            pending = [c.deadline for c in active if c.rc is None]
+            wait = max(0.0, min(pending) - time.time()) if pending else 0.0
+            if waiting_exit:
+                # pipes fermes mais processus pas encore termine
+                wait = min(wait, 0.01)
+            try:
+                r, w, _ = select.select(rl, wl, [], wait)
+            except select.error as e:
+                if e.args and e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in w:
+                owner[fd].on_writable()
+            for fd in r:
+                if fd in owner[fd].fds:
+                    owner[fd].on_readable(fd)
+        elif waiting_exit:
+            time.sleep(0.01)
+
+        still = []
+        for c in active:
+            if c.finished():
+                if c.observe:
+                    observe_latency(c.kind, c.target, time.time() - c.start, c.rc)
+            else:
+                still.append(c)
+        active = still
+
+    return [c.result() for c in children]
+
+
+def run_cmd(cmd, timeout_sec, stdin_data=None, env=None, kind=None, target=None,
+            observe=True):
+    """
+    Retourne (rc, out, err) en str ; rc=124 timeout, rc=127 lancement KO
+    """
+    spec = {"cmd": cmd, "stdin": stdin_data, "env": env,
+            "kind": kind, "target": target, "observe": observe}
+    return run_many([spec], timeout_sec)[0]
+
+
+def run_cmd_u(cmd, timeout_sec, stdin_data=None, env=None, kind=None, target=None,
+              observe=True):
+    """
+    Comme run_cmd, sorties en unicode
+    """
+    rc, out, err = run_cmd(cmd, timeout_sec, stdin_data, env, kind, target, observe)
+    return rc, _to_unicode(out), _to_unicode(err)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# Lib/dns_backend.py
+#
+# Backends de resolution host -> CNAME (nom canonique)
+#   socket   : resolution in-process (socket.gethostbyname_ex), defaut
+#   nslookup : fork nslookup + lecture "canonical name" / "Name:" / "Nom"
+#   wire     : client DNS UDP pur Python (Lib/dns_wire), requetes en masse
+#   hedged   : wire + requete couverte vers le serveur suivant de
+#              DNS_NAMESERVERS si pas de reponse apres DNS_HEDGE_DELAY
+#
+# Contrat commun : (value, err_type, err_detail)
+# Echec temporaire du resolveur (EAI_AGAIN / EAI_FAIL, SERVFAIL) :
+# DNS_TEMP_FAILURE, ni cache negatif ni memo du run (reessaye)
+#
+# Python 2.6 compatible
+
+import socket
+import threading
+import time
+
+from Lib import dns_wire
+from Lib.cmd_runner import run_cmd_u, adaptive_timeout, observe_latency, RC_TIMEOUT
+from Lib.circuit_breaker import get_circuit_breaker
+
+DEFAULT_BACKEND = "socket"
+DNS_TIMEOUT_SEC = 8
+
+# codes d'echec temporaire : getaddrinfo (gaierror) et h_errno (herror :
+# TRY_AGAIN=2, NO_RECOVERY=3)
+_GAI_TEMP = [c for c in (getattr(socket, "EAI_AGAIN", None),
+                         getattr(socket, "EAI_FAIL", None)) if c is not None]
+_H_TEMP = (2, 3)
+
+def _is_temp_failure(exc):
+    code = exc.args and exc.args[0] or None
+    if isinstance(exc, socket.gaierror):
+        return code in _GAI_TEMP
+    return code in _H_TEMP
+
+# ------------------------------------------------
+def _to_unicode(s):
+    if s is None:
+        return u""
+    if isinstance(s, unicode):
+        return s
+    try:
+        return s.decode("utf-8", "ignore")
+    except:
+        return unicode(str(s), "utf-8", "ignore")
+
+def _clean_name(v):
+    v = _to_unicode(v).strip()
+    if "," in v:
+        v = v.split(",", 1)[0].strip()
+    if v.endswith("."):
+        v = v[:-1]
+    return v or None
+
+# ------------------------------------------------
+# BACKEND socket
+# ------------------------------------------------
+def gethostbyname_ex_timeout(host, timeout_sec):
+    """
+    socket.gethostbyname_ex borne dans le temps
+    Retourne ((name, aliases, ips) | None, exception | None, timed_out)
+    """
+    box = {}
+
+    def work():
+        try:
+            box["res"] = socket.gethostbyname_ex(host)
+        except Exception as e:
+            box["exc"] = e
+
+    t = threading.Thread(target=work)
+    t.setDaemon(True)
+    t.start()
+    t.join(timeout_sec)
+
+    if t.isAlive():
+        return None, None, True
+    return box.get("res"), box.get("exc"), False
+
+
+def cname_socket(host, timeout_sec=DNS_TIMEOUT_SEC):
+    try:
+        h = _to_unicode(host).encode("idna")
+    except:
+        h = str(host)
+
+    res, exc, timed_out = gethostbyname_ex_timeout(h, timeout_sec)
+    if timed_out:
+        return None, "NSLOOKUP_TIMEOUT", "dns timeout for %s" % host
+
+    if exc is not None:
+        if isinstance(exc, (socket.gaierror, socket.herror)):
+            if _is_temp_failure(exc):
+                return None, "DNS_TEMP_FAILURE", "dns temporary failure for %s (%s)" % (
+                    host, exc)
+            return None, "CNAME_NOT_FOUND", "No cname for %s (%s)" % (host, exc)
+        return None, "NSLOOKUP_ERROR", _to_unicode(str(exc))
+
+    name = _clean_name(res[0]) if res else None
+    if not name:
+        return None, "CNAME_NOT_FOUND", "No cname for %s" % host
+    return name, None, None
+
+# ------------------------------------------------
+# BACKEND nslookup (historique)
+# ------------------------------------------------
+def cname_nslookup(host, timeout_sec=DNS_TIMEOUT_SEC):
+    rc, out_u, err_u = run_cmd_u(["nslookup", host], timeout_sec,
+                                 kind="nslookup", target=host)
+    if rc == 124:
+        return None, "NSLOOKUP_TIMEOUT", "nslookup timeout for %s" % host
+    if not out_u:
+        return None, "NSLOOKUP_ERROR", err_u
+
+    for l in out_u.splitlines():
+        s = l.strip().lower()
+
+        # canonical name = xxx.
+        if s.startswith("canonical name"):
+            v = _clean_name(l.split("=", 1)[1])
+            if v:
+                return v, None, None
+
+        # Name: xxx
+        if s.startswith("name") or s.startswith("nom"):
+            if ":" in l:
+                v = _clean_name(l.split(":", 1)[1])
+                if v:
+                    return v, None, None
+
+    return None, "CNAME_NOT_FOUND", "No cname for %s" % host
+
+# ------------------------------------------------
+# BACKEND wire (Lib/dns_wire)
+# ------------------------------------------------
+WIRE_OPTS = {
+    "nameserver": None,     # None -> /etc/resolv.conf
+    "port": 53,
+    "timeout_sec": 2.0,
+    "retries": 2,
+    "nameservers": None,    # hedged : liste ordonnee (None -> /etc/resolv.conf)
+    "hedge_delay": 0.2,     # hedged : secondes avant la requete couverte
+}
+
+def _wire_timeout(timeout_sec):
+    # timeout_sec = budget par host, reessais compris ; DNS_TIMEOUT = plafond
+    # par tentative
+    t = WIRE_OPTS["timeout_sec"]
+    if timeout_sec:
+        t = min(t, float(timeout_sec) / (WIRE_OPTS["retries"] + 1))
+    return t
+
+def cname_wire(host, timeout_sec=DNS_TIMEOUT_SEC):
+    return cname_wire_bulk([host], timeout_sec).get(
+        host, (None, "HOST_EMPTY", "Host is empty"))
+
+def cname_wire_bulk(hosts, timeout_sec=None):
+    return dns_wire.resolve_cname_bulk(
+        hosts,
+        nameserver=WIRE_OPTS["nameserver"],
+        port=WIRE_OPTS["port"],
+        timeout_sec=_wire_timeout(timeout_sec),
+        retries=WIRE_OPTS["retries"],
+    )
+
+def cname_hedged(host, timeout_sec=DNS_TIMEOUT_SEC):
+    return cname_hedged_bulk([host], timeout_sec).get(
+        host, (None, "HOST_EMPTY", "Host is empty"))
+
+def cname_hedged_bulk(hosts, timeout_sec=None):
+    return dns_wire.resolve_cname_bulk(
+        hosts,
+        port=WIRE_OPTS["port"],
+        timeout_sec=_wire_timeout(timeout_sec),
+        retries=WIRE_OPTS["retries"],
+        nameservers=WIRE_OPTS["nameservers"],
+        hedge_delay=WIRE_OPTS["hedge_delay"],
+    )
+
+# ------------------------------------------------
+# SELECTION
+# ------------------------------------------------
+BACKENDS = {
+    "socket": cname_socket,
+    "nslookup": cname_nslookup,
+    "wire": cname_wire,
+    "hedged": cname_hedged,
+}
+
+BULK_BACKENDS = {
+    "wire": cname_wire_bulk,
+    "hedged": cname_hedged_bulk,
+}
+
+_BACKEND = DEFAULT_BACKEND
+
+def set_dns_backend(name):
+    """
+    DNS_BACKEND=socket|nslookup|wire (Data/config.conf)
+    Retourne (ok, err_type, err_detail) ; backend inconnu -> defaut conserve
+    """
+    global _BACKEND
+    n = (name or DEFAULT_BACKEND).strip().lower()
+    if n not in BACKENDS:
+        return False, "DNS_BACKEND_UNKNOWN", "Unknown DNS_BACKEND=%s (using %s)" % (
+            name, _BACKEND)
+    _BACKEND = n
+    return True, None, None
+
+def get_dns_backend():
+    return _BACKEND
+
+def _resolver_key():
+    # disjoncteur par resolveur : serveur wire, sinon resolveur systeme
+    if _BACKEND == "wire" and WIRE_OPTS["nameserver"]:
+        return "dns:%s" % WIRE_OPTS["nameserver"]
+    if _BACKEND == "hedged" and WIRE_OPTS["nameservers"]:
+        return "dns:%s" % ",".join(WIRE_OPTS["nameservers"])
+    return "dns:system"
+
+def backend_resolve_cname(host, timeout_sec=DNS_TIMEOUT_SEC):
+    cb = get_circuit_breaker()
+    key = _resolver_key()
+    ok, e, d = cb.allow(key)
+    if not ok:
+        return None, e, d
+    # timeout appris par resolveur (timeout_sec = a priori statique)
+    timeout_sec = adaptive_timeout("dns", key, timeout_sec)
+    t0 = time.time()
+    try:
+        res = BACKENDS[_BACKEND](host, timeout_sec)
+    except:
+        cb.release(key)
+        raise
+    timed_out = res[1] == "NSLOOKUP_TIMEOUT"
+    observe_latency("dns", key, time.time() - t0, timed_out and RC_TIMEOUT or 0)
+    cb.record(key, timed_out)
+    return res
+
+def backend_resolve_cname_bulk(hosts, timeout_sec=DNS_TIMEOUT_SEC):
+    """
+    Retourne {host: (value, err_type, err_detail)}
+    Backends sans mode masse : boucle sur backend_resolve_cname
+    """
+    bulk = BULK_BACKENDS.get(_BACKEND)
+    if bulk:
+        cb = get_circuit_breaker()
+        key = _resolver_key()
+        ok, e, d = cb.allow(key)
+        if not ok:
+            return dict((h, (None, e, d)) for h in hosts)
+        timeout_sec = adaptive_timeout("dns", key, timeout_sec)
+        out = {}
+        try:
+            out = bulk(hosts, timeout_sec)
+        finally:
+            recorded = False
+            for h in hosts:
+                if h in out:
+                    cb.record(key, out[h][1] == "NSLOOKUP_TIMEOUT")
+                    recorded = True
+            if not recorded:
+                # exception / aucun host rendu : appel d'essai libere
+                cb.release(key)
+        return out
+    out = {}
+    for h in hosts:
+        if h not in out:
+            out[h] = backend_resolve_cname(h, timeout_sec)
+    return out
+
+# ------------------------------------------------
+def configure_dns(conf):
+    """
+    Data/config.conf :
+      DNS_BACKEND=socket|nslookup|wire|hedged
+      DNS_NAMESERVER=10.0.0.1     (wire, defaut /etc/resolv.conf)
+      DNS_NAMESERVERS=10.0.0.1,10.0.0.2  (hedged, ordre = priorite)
+      DNS_HEDGE_DELAY=0.2         (hedged, secondes)
+      DNS_PORT=53                 (wire / hedged)
+      DNS_TIMEOUT=2               (wire / hedged, secondes par tentative)
+      DNS_RETRIES=2               (wire / hedged)
+    Retourne (ok, err_type, err_detail)
+    """
+    conf = conf or {}
+    try:
+        if conf.get("DNS_NAMESERVER"):
+            WIRE_OPTS["nameserver"] = conf.get("DNS_NAMESERVER").strip()
+        if conf.get("DNS_PORT"):
+            WIRE_OPTS["port"] = int(conf.get("DNS_PORT"))
+        if conf.get("DNS_TIMEOUT"):
+            WIRE_OPTS["timeout_sec"] = float(conf.get("DNS_TIMEOUT"))
+        if conf.get("DNS_RETRIES"):
+            WIRE_OPTS["retries"] = int(conf.get("DNS_RETRIES"))
+        if conf.get("DNS_NAMESERVERS"):
+            WIRE_OPTS["nameservers"] = [
+                n.strip() for n in conf.get("DNS_NAMESERVERS").split(",") if n.strip()
+            ]
+        if conf.get("DNS_HEDGE_DELAY"):
+            WIRE_OPTS["hedge_delay"] = float(conf.get("DNS_HEDGE_DELAY"))
+    except Exception as e:
+        return False, "DNS_CONF_INVALID", str(e)
+
+    return set_dns_backend(conf.get("DNS_BACKEND"))
+
+def dns_summary_lines():
+    """
+    Compteurs du client wire (requetes, reessais, requetes couvertes)
+    """
+    if _BACKEND not in BULK_BACKENDS:
+        return []
+    st = dns_wire.STATS
+    return [
+        "  dns %-6s : queries=%d retries=%d answers=%d hedges=%d hedge_wins=%d dropped=%d" % (
+            _BACKEND, st["queries"], st["retries"], st["answers"],
+            st["hedges"], st["hedge_wins"], st.get("dropped", 0)),
+    ]
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# Lib/dns_wire.py
+#
+# Client DNS pur Python (UDP) pour resolutions CNAME en masse
+#   - une seule socket UDP, N requetes en vol (fenetre)
+#   - chaines CNAME lues directement dans le format wire (RFC 1035)
+#   - timeout / retries par requete, liste "search" facon resolv.conf
+#   - requetes couvertes (hedging) : sans reponse du serveur primaire apres
+#     `hedge_delay`, la meme requete part vers le serveur suivant ; la
+#     premiere reponse gagne, les autres sont ignorees
+#   - seules les reponses venant d'un serveur configure (adresse, port)
+#     sont prises en compte
+#
+# Contrat par host : (value, err_type, err_detail), comme resolve_cname
+#
+# Python 2.6 compatible
+
+import errno
+import random
+import select
+import socket
+import struct
+import time
+
+from collections import deque
+
+RESOLV_CONF = "/etc/resolv.conf"
+
+QTYPE_A = 1
+QTYPE_CNAME = 5
+QCLASS_IN = 1
+
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+MAX_CNAME_HOPS = 16
+
+STATS = {
+    "queries": 0,
+    "retries": 0,
+    "answers": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "dropped": 0,
+}
+
+def reset_stats():
+    for k in STATS:
+        STATS[k] = 0
+
+def merge_stats(other):
+    """
+    Ajoute les compteurs d'un autre processus
+    """
+    for k, v in (other or {}).items():
+        STATS[k] = STATS.get(k, 0) + v
+
+# ------------------------------------------------
+def _to_unicode(s):
+    if s is None:
+        return u""
+    if isinstance(s, unicode):
+        return s
+    try:
+        return s.decode("utf-8", "ignore")
+    except:
+        return unicode(str(s), "utf-8", "ignore")
+
+def _norm(name):
+    n = _to_unicode(name).strip().lower()
+    if n.endswith("."):
+        n = n[:-1]
+    return n
+
+def read_resolv_conf(path=RESOLV_CONF):
+    """
+    Retourne (nameservers, search)
+    """
+    ns = []
+    search = []
+    try:
+        for l in open(path, "rb").read().splitlines():
+            p = l.split()
+            if not p or p[0].startswith("#") or p[0].startswith(";"):
+                continue
+            if p[0] == "nameserver" and len(p) > 1:
+                ns.append(p[1])
+            elif p[0] in ("search", "domain"):
+                search = p[1:]
+    except:
+        pass
+    return ns, search
+
+# ------------------------------------------------
+# FORMAT WIRE
+# ------------------------------------------------
+def build_query(qid, name, qtype=QTYPE_A):
+    n = _norm(name)
+    out = [struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0)]
+    for label in n.split("."):
+        if not label:
+            continue
+        lb = label.encode("idna")
+        if len(lb) > 63:
+            raise ValueError("label too long: %r" % label)
+        out.append(chr(len(lb)) + lb)
+    out.append("\0")
+    out.append(struct.pack("!HH", qtype, QCLASS_IN))
+    return "".join(out)
+
+def read_name(data, off):
+    """
+    Lit un nom (avec compression) -> (nom, offset apres le nom)
+    """
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        if off >= len(data):
+            raise ValueError("name out of bounds")
+        ln = ord(data[off])
+        if (ln & 0xC0) == 0xC0:
+            if off + 1 >= len(data):
+                raise ValueError("bad pointer")
+            if end is None:
+                end = off + 2
+            off = ((ln & 0x3F) << 8) | ord(data[off + 1])
+            hops += 1
+            if hops > 64:
+                raise ValueError("pointer loop")
+            continue
+        if ln == 0:
+            if end is None:
+                end = off + 1
+            break
+        labels.append(data[off + 1:off + 1 + ln])
+        off += 1 + ln
+    return ".".join(labels).decode("ascii", "ignore"), end
+
+def parse_response(data):
+    """
+    Retourne dict {id, rcode, tc, qname, answers:[(name, type, value)]}
+    """
+    if len(data) < 12:
+        raise ValueError("short packet")
+    qid, flags, qd, an, ns, ar = struct.unpack("!HHHHHH", data[:12])
+    off = 12
+
+    qname = None
+    for i in range(qd):
+        n, off = read_name(data, off)
+        if qname is None:
+            qname = n
+        off += 4
+
+    answers = []
+    for i in range(an):
+        n, off = read_name(data, off)
+        rtype, rclass, ttl, rdlen = struct.unpack("!HHIH", data[off:off + 10])
+        off += 10
+        rdata_off = off
+        off += rdlen
+        if rtype == QTYPE_CNAME:
+            v, _ = read_name(data, rdata_off)
+        elif rtype == QTYPE_A and rdlen == 4:
+            v = socket.inet_ntoa(data[rdata_off:rdata_off + 4])
+        else:
+            v = None
+        answers.append((_norm(n), rtype, v))
+
+    return {
+        "id": qid,
+        "rcode": flags & 0x000F,
+        "tc": bool(flags & 0x0200),
+        "qname": _norm(qname),
+        "answers": answers,
+    }
+
+def canonical_name(qname, answers):
+    """
+    Suit la chaine CNAME depuis qname.
+    Retourne le nom canonique, ou None si aucun enregistrement pour qname
+    """
+    cnames = {}
+    owners = {}
+    for n, t, v in answers:
+        owners[n] = 1
+        if t == QTYPE_CNAME and v:
+            cnames[n] = _norm(v)
+
+    cur = _norm(qname)
+    if cur not in owners:
+        return None
+
+    hops = 0
+    while cur in cnames and hops < MAX_CNAME_HOPS:
+        cur = cnames[cur]
+        hops += 1
+    return cur
+
+# ------------------------------------------------
+# RESOLUTION EN MASSE
+# ------------------------------------------------
+def _candidates(host, search):
+    h = _norm(host)
+    if not h:
+        return []
+    # nom qualifie : tel quel ; nom court : liste search puis nom nu
+    if "." in h:
+        return [h]
+    out = []
+    for d in (search or []):
+        d = _norm(d)
+        if d:
+            out.append("%s.%s" % (h, d))
+    out.append(h)
+    return out
+
+class _Query(object):
+    def __init__(self, host, cands):
+        self.host = host
+        self.cands = cands
+        self.ci = 0
+        self.tries = 0
+        self.qid = None
+        self.deadline = 0
+        self.packet = None
+        self.hedge_at = None
+        self.ns_next = 1
+
+    def name(self):
+        return self.cands[self.ci]
+
+
+def parse_nameserver(ns, port=53):
+    """
+    "10.0.0.1" ou "10.0.0.1:5353" -> (ip, port)
+    """
+    ns = ns.strip()
+    if ns.count(":") == 1:
+        h, p = ns.split(":")
+        return h, int(p)
+    return ns, int(port)
+
+
+def resolve_cname_bulk(hosts, nameserver=None, port=53, timeout_sec=2.0,
+                       retries=2, search=None, window=256,
+                       nameservers=None, hedge_delay=None):
+    """
+    Resout une liste de hosts via une seule socket UDP.
+    nameservers + hedge_delay (s) : requete couverte vers le serveur
+    suivant si le primaire n'a pas repondu apres hedge_delay.
+    Retourne {host: (cname, err_type, err_detail)}
+    """
+    if nameserver is not None and not nameservers:
+        nameservers = [nameserver]
+    if not nameservers or search is None:
+        ns_conf, search_conf = read_resolv_conf()
+        if not nameservers:
+            nameservers = ns_conf or ["127.0.0.1"]
+        if search is None:
+            search = search_conf
+    if not hedge_delay:
+        nameservers = nameservers[:1]
+
+    results = {}
+    pending = deque()
+    seen = {}
+    for h in hosts:
+        if h in seen:
+            continue
+        seen[h] = 1
+        cands = _candidates(h, search)
+        if not cands:
+            results[h] = (None, "HOST_EMPTY", "Host is empty")
+            continue
+        pending.append(_Query(h, cands))
+
+    if not pending:
+        return results
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(0)
+    except Exception as e:
+        for q in pending:
+            results[q.host] = (None, "NSLOOKUP_ERROR", "dns socket error | %s" % e)
+        return results
+
+    addrs = [parse_nameserver(ns, port) for ns in nameservers]
+    # adresses numeriques : comparees a la source des reponses
+    for i, (h, p) in enumerate(addrs):
+        try:
+            addrs[i] = (socket.gethostbyname(h), p)
+        except Exception:
+            pass
+    inflight = {}
+
+    def send(q):
+        qid = random.randint(1, 0xFFFF)
+        while qid in inflight:
+            qid = random.randint(1, 0xFFFF)
+        q.packet = build_query(qid, q.name())
+        try:
+            sock.sendto(q.packet, addrs[0])
+        except Exception as e:
+            results[q.host] = (None, "NSLOOKUP_ERROR",
+                               "dns send error for %s | %s" % (q.host, e))
+            return
+        STATS["queries"] += 1
+        now = time.time()
+        q.qid = qid
+        q.deadline = now + timeout_sec
+        q.ns_next = 1
+        q.hedge_at = (now + hedge_delay) if len(addrs) > 1 else None
+        inflight[qid] = q
+
+    def hedge(q, now):
+        # meme requete (meme id) vers le serveur suivant
+        try:
+            sock.sendto(q.packet, addrs[q.ns_next])
+            STATS["hedges"] += 1
+        except Exception:
+            pass
+        q.ns_next += 1
+        if q.ns_next < len(addrs):
+            q.hedge_at = now + hedge_delay
+        else:
+            q.hedge_at = None
+
+    def next_candidate(q, err_type, detail):
+        q.ci += 1
+        q.tries = 0
+        if q.ci < len(q.cands):
+            pending.append(q)
+        else:
+            results[q.host] = (None, err_type, detail)
+
+    try:
+        while pending or inflight:
+            while pending and len(inflight) < window:
+                send(pending.popleft())
+
+            if not inflight:
+                continue
+
+            now = time.time()
+            marks = [q.deadline for q in inflight.values()]
+            marks.extend([q.hedge_at for q in inflight.values() if q.hedge_at])
+            wait = max(0.0, min(marks) - now)
+            try:
+                r, _, _ = select.select([sock], [], [], wait)
+            except select.error as e:
+                if e.args and e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            # reception
+            while r:
+                try:
+                    data, src = sock.recvfrom(4096)
+                except socket.error as e:
+                    if e.args and e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    if e.args and e.args[0] == errno.ECONNREFUSED:
+                        break
+                    raise
+                # reponse d'une source non configuree : ignoree
+                if src[:2] not in addrs:
+                    STATS["dropped"] += 1
+                    continue
+                try:
+                    resp = parse_response(data)
+                except Exception:
+                    continue
+
+                q = inflight.get(resp["id"])
+                if q is None or resp["qname"] != _norm(q.name()):
+                    continue
+                del inflight[resp["id"]]
+                STATS["answers"] += 1
+                if src[:2] != addrs[0]:
+                    STATS["hedge_wins"] += 1
+
+                if resp["rcode"] == RCODE_NXDOMAIN:
+                    next_candidate(q, "CNAME_NOT_FOUND", "No cname for %s" % q.host)
+                    continue
+                if resp["rcode"] == RCODE_SERVFAIL:
+                    results[q.host] = (None, "DNS_TEMP_FAILURE",
+                                       "dns SERVFAIL for %s" % q.host)
+                    continue
+                if resp["rcode"] != 0:
+                    results[q.host] = (None, "NSLOOKUP_ERROR",
+                                       "dns rcode=%d for %s" % (resp["rcode"], q.host))
+                    continue
+
+                cn = canonical_name(q.name(), resp["answers"])
+                if cn:
+                    results[q.host] = (cn, None, None)
+                else:
+                    next_candidate(q, "CNAME_NOT_FOUND", "No cname for %s" % q.host)
+
+            # requetes couvertes
+            now = time.time()
+            for q in inflight.values():
+                if q.hedge_at and q.hedge_at <= now:
+                    hedge(q, now)
+
+            # expirations
+            for qid in [k for k, q in inflight.items() if q.deadline <= now]:
+                q = inflight.pop(qid)
+                q.tries += 1
+                if q.tries <= retries:
+                    STATS["retries"] += 1
+                    pending.appendleft(q)
+                else:
+                    results[q.host] = (None, "NSLOOKUP_TIMEOUT",
+                                       "dns timeout for %s" % q.host)
+    finally:
+        try:
+            sock.close()
+        except:
+            pass
+
+    return results
+
+
+def resolve_cname(host, nameserver=None, port=53, timeout_sec=2.0,
+                  retries=2, search=None):
+    res = resolve_cname_bulk([host], nameserver, port, timeout_sec, retries, search)
+    return res.get(host, (None, "HOST_EMPTY", "Host is empty"))
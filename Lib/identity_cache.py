@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# Lib/identity_cache.py
+#
+# Cache persistant (fichier JSON) des identites reseau
+#   CNAME : host  -> CNAME
+#   SCAN  : CNAME -> SCAN
+# Chaque entree est horodatee, TTL par type (Data/config.conf)
+# Cache negatif : les echecs de resolution (timeout, introuvable) sont
+# memorises avec leur type d'erreur, TTL court double a chaque echec
+# consecutif (backoff exponentiel, plafonne). Un succes efface l'echec.
+#
+# Python 2.6 compatible
+
+import os
+import json
+import time
+import threading
+
+KIND_CNAME = "CNAME"
+KIND_SCAN = "SCAN"
+
+DEFAULT_TTL = {
+    KIND_CNAME: 86400,      # 1 jour
+    KIND_SCAN: 604800,      # 7 jours
+}
+
+# erreurs mises en cache negatif (les autres sont toujours retentees,
+# DNS_TEMP_FAILURE compris)
+NEGATIVE_ERRORS = (
+    "NSLOOKUP_TIMEOUT",
+    "CNAME_NOT_FOUND",
+    "SRVCTL_TIMEOUT",
+    "SRVCTL_ERROR",
+)
+
+DEFAULT_NEG_TTL = 300           # 5 min au premier echec
+DEFAULT_NEG_TTL_MAX = 21600     # 6 h maximum
+
+# ------------------------------------------------
+def _key(host):
+    if not host:
+        return None
+    try:
+        if not isinstance(host, unicode):
+            host = unicode(host, "utf-8", "ignore")
+    except:
+        return None
+    h = host.strip().lower()
+    if h.endswith("."):
+        h = h[:-1]
+    return h or None
+
+def _cached_detail(e):
+    """
+    ErrorDetail d'une erreur servie par le cache negatif
+    """
+    until = time.strftime("%Y-%m-%d %H:%M:%S",
+                          time.localtime(e.get("ts", 0) + e.get("ttl", 0)))
+    return u"%s [CACHED fails=%d retry_after=%s]" % (
+        e.get("detail") or u"", e.get("fails", 1), until)
+
+def _int(v, default):
+    try:
+        return int(str(v).strip())
+    except:
+        return default
+
+# ------------------------------------------------
+class IdentityCache(object):
+
+    def __init__(self, path, ttl=None, neg_ttl=DEFAULT_NEG_TTL,
+                 neg_ttl_max=DEFAULT_NEG_TTL_MAX):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl:
+            self.ttl.update(ttl)
+        self.neg_ttl = neg_ttl
+        self.neg_ttl_max = neg_ttl_max
+
+        self.entries = {KIND_CNAME: {}, KIND_SCAN: {}}
+        self.new = {}           # (kind, cle) -> entree ecrite depuis clear_new()
+        self.dirty = False
+        self._lock = threading.RLock()
+
+        self.stats = {
+            "hits": 0,
+            "expired": 0,
+            "misses": 0,
+            "writes": 0,
+            "neg_hits": 0,
+            "neg_writes": 0,
+        }
+
+    # --------------------------------------------
+    def load(self):
+        """
+        Retourne (ok, err_type, err_detail)
+        Fichier absent -> cache vide (pas une erreur)
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return True, None, None
+        try:
+            data = json.loads(open(self.path, "rb").read().decode("utf-8"))
+        except Exception as e:
+            return False, "IDCACHE_ERROR", "%s | %s" % (self.path, e)
+
+        for kind in (KIND_CNAME, KIND_SCAN):
+            part = (data.get("entries") or {}).get(kind) or {}
+            if isinstance(part, dict):
+                self.entries[kind] = part
+        return True, None, None
+
+    def save(self):
+        self._lock.acquire()
+        try:
+            self._save()
+        finally:
+            self._lock.release()
+
+    def _save(self):
+        if not self.path or not self.dirty:
+            return
+        data = {
+            "SavedAt": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "entries": self.entries,
+        }
+        tmp = "%s.tmp" % self.path
+        open(tmp, "wb").write(
+            json.dumps(data, indent=1, ensure_ascii=False).encode("utf-8")
+        )
+        os.rename(tmp, self.path)
+        self.dirty = False
+
+    # --------------------------------------------
+    def get(self, kind, host, now=None):
+        """
+        Retourne (value, err_type, err_detail) si entree valide, sinon None
+        """
+        self._lock.acquire()
+        try:
+            return self._get(kind, host, now)
+        finally:
+            self._lock.release()
+
+    def _get(self, kind, host, now=None):
+        k = _key(host)
+        if not k:
+            return None
+
+        e = self.entries.get(kind, {}).get(k)
+        if not e:
+            self.stats["misses"] += 1
+            return None
+
+        now = now or time.time()
+        if e.get("error"):
+            if (now - e.get("ts", 0)) > e.get("ttl", 0):
+                self.stats["expired"] += 1
+                return None
+            self.stats["neg_hits"] += 1
+            return None, e["error"], _cached_detail(e)
+
+        if (now - e.get("ts", 0)) > self.ttl.get(kind, 0):
+            self.stats["expired"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return e.get("value"), None, None
+
+    def put(self, kind, host, value, now=None):
+        self._lock.acquire()
+        try:
+            self._put(kind, host, value, now)
+        finally:
+            self._lock.release()
+
+    def _put(self, kind, host, value, now=None):
+        k = _key(host)
+        if not k or not value:
+            return
+        e = {
+            "value": value,
+            "ts": int(now or time.time()),
+        }
+        self.entries.setdefault(kind, {})[k] = e
+        self.new[(kind, k)] = e
+        self.dirty = True
+        self.stats["writes"] += 1
+
+    def put_error(self, kind, host, err_type, err_detail, now=None):
+        """
+        Cache negatif : TTL = neg_ttl * 2^(echecs-1), plafonne a neg_ttl_max
+        """
+        self._lock.acquire()
+        try:
+            self._put_error(kind, host, err_type, err_detail, now)
+        finally:
+            self._lock.release()
+
+    def _put_error(self, kind, host, err_type, err_detail, now=None):
+        k = _key(host)
+        if not k or err_type not in NEGATIVE_ERRORS:
+            return
+        prev = self.entries.get(kind, {}).get(k) or {}
+        fails = prev.get("error") and (prev.get("fails", 0) + 1) or 1
+        ttl = min(self.neg_ttl * (2 ** (fails - 1)), self.neg_ttl_max)
+        e = {
+            "error": err_type,
+            "detail": err_detail,
+            "fails": fails,
+            "ttl": ttl,
+            "ts": int(now or time.time()),
+        }
+        self.entries.setdefault(kind, {})[k] = e
+        self.new[(kind, k)] = e
+        self.dirty = True
+        self.stats["neg_writes"] += 1
+
+    def expire_errors(self, err_types, since):
+        """
+        Expire les echecs de ces types enregistres depuis `since`
+        (reessai dans le meme run) ; le compteur d'echecs est conserve
+        pour le backoff
+        """
+        self._lock.acquire()
+        try:
+            for part in self.entries.values():
+                for e in part.values():
+                    if e.get("error") in err_types and e.get("ts", 0) >= since:
+                        e["ttl"] = -1
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    # -processes : le parent est seul ecrivain du fichier, les fils lui
+    # renvoient leurs nouvelles entrees (et leurs compteurs)
+    def clear_new(self):
+        self._lock.acquire()
+        try:
+            self.new = {}
+            for k in self.stats:
+                self.stats[k] = 0
+        finally:
+            self._lock.release()
+
+    def new_entries(self):
+        self._lock.acquire()
+        try:
+            return {
+                "entries": [[kind, k, dict(e)] for (kind, k), e in self.new.items()],
+                "stats": dict(self.stats),
+            }
+        finally:
+            self._lock.release()
+
+    def merge(self, delta):
+        """
+        Entrees ecrites par un autre processus (new_entries()) ; la plus
+        recente gagne
+        """
+        delta = delta or {}
+        self._lock.acquire()
+        try:
+            for kind, k, e in delta.get("entries") or []:
+                part = self.entries.setdefault(kind, {})
+                cur = part.get(k)
+                if cur is None or e.get("ts", 0) >= cur.get("ts", 0):
+                    part[k] = e
+                    self.dirty = True
+            for k, v in (delta.get("stats") or {}).items():
+                self.stats[k] = self.stats.get(k, 0) + v
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def summary_lines(self):
+        st = self.stats
+        return [
+            "  identity cache : hits=%d expired=%d misses=%d writes=%d" % (
+                st["hits"], st["expired"], st["misses"], st["writes"]),
+            "  identity cache negatif : hits=%d writes=%d" % (
+                st["neg_hits"], st["neg_writes"]),
+        ]
+
+# ------------------------------------------------
+def open_identity_cache(conf):
+    """
+    Construit le cache depuis Data/config.conf
+      IDENTITY_CACHE_FILE=Data/identity_cache.json
+      IDENTITY_CACHE_TTL_CNAME=86400   (secondes)
+      IDENTITY_CACHE_TTL_SCAN=604800   (secondes)
+      IDENTITY_CACHE_NEG_TTL=300       (secondes, premier echec)
+      IDENTITY_CACHE_NEG_TTL_MAX=21600 (secondes, plafond du backoff)
+    Retourne (cache|None, err_type, err_detail)
+    """
+    path = (conf or {}).get("IDENTITY_CACHE_FILE")
+    if not path:
+        return None, None, None
+
+    ttl = {
+        KIND_CNAME: _int(conf.get("IDENTITY_CACHE_TTL_CNAME"),
+                         DEFAULT_TTL[KIND_CNAME]),
+        KIND_SCAN: _int(conf.get("IDENTITY_CACHE_TTL_SCAN"),
+                        DEFAULT_TTL[KIND_SCAN]),
+    }
+
+    cache = IdentityCache(
+        path, ttl,
+        _int(conf.get("IDENTITY_CACHE_NEG_TTL"), DEFAULT_NEG_TTL),
+        _int(conf.get("IDENTITY_CACHE_NEG_TTL_MAX"), DEFAULT_NEG_TTL_MAX),
+    )
+    ok, e, d = cache.load()
+    if not ok:
+        return cache, e, d
+    return cache, None, None
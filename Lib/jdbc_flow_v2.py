@@ -2,8 +2,39 @@
 # Lib/jdbc_flow_v2.py — VERSION FINALE STABLE
 
 import re
-import subprocess
-import time
+
+from Lib.cluster_facts import get_cluster_facts
+from Lib.identity_cache import KIND_CNAME, KIND_SCAN
+from Lib.dns_backend import backend_resolve_cname, backend_resolve_cname_bulk
+
+# Cache persistant (Lib/identity_cache.IdentityCache) ou None
+IDENTITY_CACHE = None
+
+def set_identity_cache(cache):
+    global IDENTITY_CACHE
+    IDENTITY_CACHE = cache
+
+# Export de zone DNS (Lib/zone_snapshot.ZoneIndex) ou None
+# consulte avant le cache et le DNS reel, jamais ecrit dans le cache
+ZONE_SNAPSHOT = None
+
+def set_zone_snapshot(index):
+    global ZONE_SNAPSHOT
+    ZONE_SNAPSHOT = index
+
+# Sources SCAN consultees avant SSH / srvctl, dans l'ordre
+# (ex. Lib/cluster_inventory.ClusterInventory) : .name, .verify, .lookup(node)
+SCAN_SOURCES = []
+
+# Origine du SCAN par CNAME pour ce run : INVENTORY | OEM | CACHE | SSH
+_SCAN_ORIGIN = {}
+
+def set_scan_sources(sources):
+    global SCAN_SOURCES
+    SCAN_SOURCES = [s for s in (sources or []) if s is not None]
+
+def scan_source(cname):
+    return _SCAN_ORIGIN.get(_normalize_host(cname))
 
 # ============================================================
 # MODELE
@@ -45,35 +76,6 @@ def _normalize_host(h):
         return None
     return _to_unicode(h).strip()
 
-def _run_cmd(cmd, timeout_sec):
-    """
-    Exécution avec timeout — Python 2.6 compatible
-    """
-    try:
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except Exception as e:
-        return 127, u"", _to_unicode(str(e))
-
-    start = time.time()
-    while True:
-        rc = p.poll()
-        if rc is not None:
-            out, err = p.communicate()
-            return rc, _to_unicode(out), _to_unicode(err)
-
-        if (time.time() - start) > timeout_sec:
-            try:
-                p.kill()
-            except:
-                pass
-            try:
-                out, err = p.communicate()
-            except:
-                out, err = "", ""
-            return 124, _to_unicode(out), _to_unicode(err)
-
-        time.sleep(0.1)
-
 # ============================================================
 # JDBC PARSING
 # ============================================================
@@ -172,40 +174,70 @@ def compare(scan1, scan2):
 # DNS / ORACLE — RESOLUTION REELLE
 # ============================================================
 
+def _cache_result(kind, host, res):
+    """
+    Succes -> cache persistant ; echec -> cache negatif (backoff)
+    """
+    if IDENTITY_CACHE is None:
+        return
+    if res[1]:
+        IDENTITY_CACHE.put_error(kind, host, res[1], res[2])
+    else:
+        IDENTITY_CACHE.put(kind, host, res[0])
+
+
 def resolve_cname(host):
     host = _normalize_host(host)
     if not host:
         return None, "HOST_EMPTY", "Host is empty"
 
-    rc, out_u, err_u = _run_cmd(["nslookup", host], timeout_sec=8)
-    if rc == 124:
-        return None, "NSLOOKUP_TIMEOUT", "nslookup timeout for %s" % host
-    if not out_u:
-        return None, "NSLOOKUP_ERROR", err_u
-
-    for l in out_u.splitlines():
-        s = l.strip().lower()
-
-        # canonical name = xxx.
-        if s.startswith("canonical name"):
-            v = l.split("=", 1)[1].strip()
-            if "," in v:
-                v = v.split(",", 1)[0].strip()
-            if v.endswith("."):
-                v = v[:-1]
-            return _normalize_host(v), None, None
-
-        # Name: xxx
-        if s.startswith("name") or s.startswith("nom"):
-            if ":" in l:
-                v = l.split(":", 1)[1].strip()
-                if "," in v:
-                    v = v.split(",", 1)[0].strip()
-                if v.endswith("."):
-                    v = v[:-1]
-                return _normalize_host(v), None, None
-
-    return None, "CNAME_NOT_FOUND", "No cname for %s" % host
+    if ZONE_SNAPSHOT is not None:
+        hit = ZONE_SNAPSHOT.resolve(host)
+        if hit:
+            return hit
+
+    if IDENTITY_CACHE is not None:
+        hit = IDENTITY_CACHE.get(KIND_CNAME, host)
+        if hit:
+            return hit
+
+    res = backend_resolve_cname(host, timeout_sec=8)
+    _cache_result(KIND_CNAME, host, res)
+    return res
+
+
+def resolve_cname_bulk(hosts):
+    """
+    Version masse de resolve_cname : {host: (cname, err_type, err_detail)}
+    L'export de zone puis le cache persistant sont consultes avant le backend DNS
+    """
+    out = {}
+    todo = []
+    for h in hosts:
+        n = _normalize_host(h)
+        if not n:
+            out[h] = (None, "HOST_EMPTY", "Host is empty")
+            continue
+        if ZONE_SNAPSHOT is not None:
+            hit = ZONE_SNAPSHOT.resolve(n)
+            if hit:
+                out[h] = hit
+                continue
+        if IDENTITY_CACHE is not None:
+            hit = IDENTITY_CACHE.get(KIND_CNAME, n)
+            if hit:
+                out[h] = hit
+                continue
+        todo.append(n)
+
+    if todo:
+        res = backend_resolve_cname_bulk(todo, timeout_sec=8)
+        for h in hosts:
+            n = _normalize_host(h)
+            if n in res:
+                out[h] = res[n]
+                _cache_result(KIND_CNAME, n, res[n])
+    return out
 
 
 def resolve_scan(host):
@@ -217,30 +249,56 @@ def resolve_scan(host):
     if e:
         return None, e, d
 
-    cmd = [
-        "ssh",
-        "-o", "StrictHostKeyChecking=no",
-        "-o", "UserKnownHostsFile=/dev/null",
-        "oracle@%s" % cname,
-        ". /home/oracle/.bash_profile ; srvctl config scan"
-    ]
-
-    rc, out_u, err_u = _run_cmd(cmd, timeout_sec=12)
-    if rc == 124:
-        return None, "SRVCTL_TIMEOUT", "srvctl timeout for %s" % cname
-    if not out_u:
-        return None, "SRVCTL_ERROR", err_u
-
-    for l in out_u.splitlines():
-        s = l.strip()
-        if s.lower().startswith("scan name"):
-            v = s.split(":", 1)[1].strip()
-            # 🔧 nettoyage critique
-            if "," in v:
-                v = v.split(",", 1)[0].strip()
-            if v.endswith("."):
-                v = v[:-1]
-            if v:
-                return _normalize_host(v), None, None
-
-    return None, "SCAN_NOT_FOUND", "No SCAN for %s" % cname
+    res = srvctl_config_scan(cname)
+    if cname in _SCAN_ORIGIN:
+        _SCAN_ORIGIN[host] = _SCAN_ORIGIN[cname]
+    return res
+
+
+def srvctl_config_scan(cname):
+    """
+    srvctl config scan sur le noeud (CNAME deja resolu)
+    Retourne (scan, err_type, err_detail)
+    """
+    cname = _normalize_host(cname)
+    if not cname:
+        return None, "HOST_EMPTY", "Host is empty"
+
+    # sources declaratives (inventaire...) : SSH seulement si absent ou verify
+    known = None
+    for src in SCAN_SOURCES:
+        hit = src.lookup(cname)
+        if hit:
+            if not src.verify:
+                _SCAN_ORIGIN[cname] = src.name
+                return hit
+            known = (src, hit)
+            break
+
+    if IDENTITY_CACHE is not None and known is None:
+        hit = IDENTITY_CACHE.get(KIND_SCAN, cname)
+        if hit:
+            if not hit[1]:
+                _SCAN_ORIGIN[cname] = "CACHE"
+            return hit
+
+    res = _ssh_srvctl_scan(cname)
+    _cache_result(KIND_SCAN, cname, res)
+    if not res[1]:
+        _SCAN_ORIGIN[cname] = "SSH"
+        if known and not compare(res[0], known[1][0]):
+            known[0].record_mismatch()
+        return res
+    if known:
+        # verification impossible (SSH KO) : la source reste la reponse
+        _SCAN_ORIGIN[cname] = known[0].name
+        return known[1]
+    return res
+
+
+def _ssh_srvctl_scan(cname):
+    # une seule collecte SSH par noeud pour le run (Lib/cluster_facts)
+    v, e, d = get_cluster_facts().scan(cname)
+    if e:
+        return None, e, d
+    return _normalize_host(v), None, None
@@ -4,7 +4,9 @@
 # Librairie d'interprétation RAW JDBC (issue AnalyseV2)
 
 import re
-import subprocess
+
+from Lib.cluster_facts import get_cluster_facts
+from Lib.dns_backend import backend_resolve_cname
 
 # ------------------------------------------------
 class JdbcChaine(object):
@@ -66,20 +68,12 @@ def parse_jdbc(raw):
 
 # ------------------------------------------------
 def resolve_cname(host):
+    # meme backend que Lib/jdbc_flow_v2 (socket ou nslookup, cf DNS_BACKEND)
     try:
-        p = subprocess.Popen(["nslookup", host],
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        out, err = p.communicate()
-        output = out.decode("utf-8", "ignore")
-        for l in output.splitlines():
-            l = l.strip()
-            if l.startswith("Nom") or l.startswith("Name"):
-                v = l.split(":", 1)[1].strip()
-                if "," in v:
-                    v = v.split(",")[0].strip()
-                return v, None, None
-        return None, "CNAME_ERROR", "No Name in nslookup for " + host
+        v, e, d = backend_resolve_cname(host)
+        if e:
+            return None, "CNAME_ERROR", d
+        return v, None, None
     except Exception as e:
         return None, "CNAME_EXCEPTION", str(e)
 
@@ -87,35 +81,17 @@ def resolve_cname(host):
 def resolve_scan_address(host):
     try:
         if "scan" in host.lower():
-            p = subprocess.Popen(["nslookup", host],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            out, err = p.communicate()
-            output = out.decode("utf-8", "ignore")
-            for l in output.splitlines():
-                l = l.strip()
-                if l.startswith("Nom") or l.startswith("Name"):
-                    return l.split(":", 1)[1].strip(), None, None
-            return None, "NSLOOKUP_ERROR", "No Name in nslookup for " + host
-
-        cmd = ["ssh",
-               "-o", "StrictHostKeyChecking=no",
-               "-o", "UserKnownHostsFile=/dev/null",
-               "oracle@%s" % host,
-               ". /home/oracle/.bash_profile ; srvctl config scan"]
-        p = subprocess.Popen(cmd,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        out, err = p.communicate()
-        output = out.decode("utf-8", "ignore")
-        for l in output.splitlines():
-            l = l.strip()
-            if l.startswith("SCAN name"):
-                v = l.split(":", 1)[1].strip()
-                if "," in v:
-                    v = v.split(",")[0].strip()
-                return v, None, None
-        return None, "SRVCTL_ERROR", "No SCAN in srvctl for " + host
+            v, e, d = backend_resolve_cname(host)
+            if e:
+                return None, "NSLOOKUP_ERROR", d
+            return v, None, None
+
+        v, e, d = get_cluster_facts().scan(host)
+        if e == "SRVCTL_TIMEOUT":
+            return None, e, d
+        if e:
+            return None, "SRVCTL_ERROR", "No SCAN in srvctl for " + host
+        return v, None, None
     except Exception as e:
         return None, "SCAN_EXCEPTION", str(e)
 
@@ -6,11 +6,12 @@ from Lib.analyse_builder_v3 import (
     build_raw_debug,
     compute_net_side,
     fill_net_from_addresses,
+    inject_dr_host,
     build_status
 )
 
 from Lib.jdbc_flow_v2 import interpret
-from Lib.oem_flow import oem_get_host_and_port
+from Lib.oem_flow import oem_get_target_profile, get_oem_snapshot
 from Lib.host_coherence import check_host_coherence
 import Lib.analyse_builder_v3 as ABV3
 from Lib.host_coherence import check_host_coherence
@@ -18,7 +19,13 @@ from Lib.scan_service_checks import compute_scan_path, compute_service_check
 from Lib.decision import compute_decision
 
 # ------------------------------------------------
-def build_object_v3(row, obj_id, oem_conn, pos, total, force):
+def build_object_v3(row, obj_id, oem_conn, pos, total, force, oem_session=None):
+    """
+    OEM : profil de cible (Lib/oem_flow.oem_get_target_profile), servi par
+          le cache du run s'il a ete pre-charge (oem_get_target_profiles),
+          sinon une requete
+    oem_session : Lib/oem_session.OemSession pour la requete unitaire (optionnel)
+    """
 
     # =====================================================
     # RAW SOURCES
@@ -35,27 +42,7 @@ def build_object_v3(row, obj_id, oem_conn, pos, total, force):
     # =====================================================
     # INJECTION DR (si nécessaire)
     # =====================================================
-    if getattr(new_o, "addresses", None):
-        dr_addr = new_o.addresses.get("DR")
-        if dr_addr and not dr_addr.get("host"):
-
-            # priorité 1 : JDBC DR explicite
-            dr_jdbc = (
-                raw.get("New connection string avec DR")
-                or raw.get("New connection string  avec DR")
-            )
-            if dr_jdbc:
-                dr_o, e_dr, d_dr = interpret(dr_jdbc)
-                if dr_o and getattr(dr_o, "addresses", None):
-                    dr_host = dr_o.addresses.get("Primaire", {}).get("host")
-                    if dr_host:
-                        new_o.addresses["DR"]["host"] = dr_host
-
-            # priorité 2 : CNAME DR
-            if not new_o.addresses["DR"].get("host"):
-                cname_dr = raw.get("Cnames DR")
-                if cname_dr:
-                    new_o.addresses["DR"]["host"] = cname_dr
+    inject_dr_host(new_o, raw)
 
     # =====================================================
     # STRUCTURE NETWORK
@@ -78,17 +65,18 @@ def build_object_v3(row, obj_id, oem_conn, pos, total, force):
     # =====================================================
     # OEM — récupération host / port (cluster Oracle)
     # =====================================================
-    if oem_conn:
-        oem_host, oem_port, e, d = oem_get_host_and_port(
-            oem_conn,
-            raw.get("Databases")
-        )
+    # sans oem_conn : snapshot OEM local (Lib/oem_snapshot)
+    if oem_conn or get_oem_snapshot() is not None:
+        target = raw.get("Databases")
+        profile, e, d = oem_get_target_profile(oem_conn, target, oem_session)
         if ABV3.DEBUG:
-            print("DEBUG OEM:", oem_host, oem_port, e, d)
+            print("DEBUG OEM:", profile, e, d)
 
-        if not e and oem_host:
-            net["OEM"]["Primaire"]["host"] = oem_host
-            net["OEM"]["Primaire"]["port"] = oem_port
+        if not e and profile.get("host"):
+            net["OEM"]["Primaire"]["host"] = profile["host"]
+            net["OEM"]["Primaire"]["port"] = profile["port"]
+            net["OEM"]["Primaire"]["oracle_version"] = profile["oracle_version"]
+            net["OEM"]["Primaire"]["cluster"] = profile["cluster"]
 
     # OEM — résolution réseau
     if net["OEM"]["Primaire"].get("host"):
@@ -131,15 +119,18 @@ def build_object_v3(row, obj_id, oem_conn, pos, total, force):
     # =====================================================
     err_type = None
     err_detail = None
+    err_cause = None
+    causes = []
 
     for role in ("Primaire", "DR"):
         net["Current"][role], e, d = compute_net_side(
             net["Current"][role],
             "CURRENT_%s" % role.upper(),
-            pos, total
+            pos, total, causes
         )
         if e and not err_type:
             err_type, err_detail = e, d
+            err_cause = causes and causes[-1] or None
 
     # =====================================================
     # Résolution réseau NEW
@@ -148,10 +139,11 @@ def build_object_v3(row, obj_id, oem_conn, pos, total, force):
         net["New"][role], e, d = compute_net_side(
             net["New"][role],
             "NEW_%s" % role.upper(),
-            pos, total
+            pos, total, causes
         )
         if e and not err_type:
             err_type, err_detail = e, d
+            err_cause = causes and causes[-1] or None
 
     # =====================================================
     # COHERENCE METIER (Host + Service naming)
@@ -202,6 +194,8 @@ def build_object_v3(row, obj_id, oem_conn, pos, total, force):
     # =====================================================
     # VALIDATIONS AVANCEES
     # =====================================================
+    # type d'erreur brut (timeout transitoire -> file de reessai)
+    status["ErrorCause"] = err_cause
     status["Coherence"] = coh
     status["ScanPath"] = compute_scan_path(net, raw)
     status["ServiceCheck"] = compute_service_check(net, raw)
@@ -2,16 +2,63 @@
 # Lib/oem_flow.py
 #
 # OEM Oracle access (autonome, sans dépendance projet)
+# Chaque fonction accepte session= (Lib/oem_session.OemSession) pour
+# reutiliser un sqlplus deja connecte au lieu d'un sqlplus -s par appel
 
-import subprocess
+import threading
+
+from Lib.cmd_runner import run_cmd, RC_TIMEOUT
+
+OEM_TIMEOUT_SEC = 120
+
+# Snapshot local du referentiel (Lib/oem_snapshot.OemSnapshot) ou None :
+# s'il est charge, les fonctions ci-dessous repondent depuis le snapshot
+OEM_SNAPSHOT = None
+
+def set_oem_snapshot(snap):
+    global OEM_SNAPSHOT
+    OEM_SNAPSHOT = snap
+
+def get_oem_snapshot():
+    return OEM_SNAPSHOT
 
 # ------------------------------------------------
-def oem_get_host_and_port(oem_conn, target_name):
+def _sqlplus(oem_conn, sql, target, session=None):
+    """
+    sql : lignes du script (sans "exit")
+    session : Lib/oem_session.OemSession (sqlplus persistant) ou None
+              (un sqlplus -s par appel)
+    Retourne (rc, out, err) en str
+    """
+    if session is not None:
+        return session.run("\n".join(sql), target=target)
+    payload = "\n".join(sql + ["exit"]) + "\n"
+    return run_cmd(["sqlplus", "-s", oem_conn], OEM_TIMEOUT_SEC,
+                   stdin_data=payload, kind="sqlplus", target=target)
+
+def _sqlplus_error(text):
+    """
+    Premiere ligne d'erreur ORA- / SP2- de la sortie sqlplus, sinon None
+    (sans "whenever sqlerror", sqlplus sort avec rc=0 apres une erreur)
+    """
+    for ln in text.splitlines():
+        ln = ln.strip()
+        if ln.startswith("ORA-") or ln.startswith("SP2-"):
+            return ln
+    return None
+
+# ------------------------------------------------
+def oem_get_host_and_port(oem_conn, target_name, session=None):
     """
     Retourne (host, port, err_type, err_detail)
     NB: le champ 'port' transporte désormais la VERSION ORACLE
+    Historique : preferer oem_get_target_profile (host, port et version
+    en une requete, cache du run)
     """
 
+    if OEM_SNAPSHOT is not None and target_name:
+        return OEM_SNAPSHOT.host_and_port(target_name)
+
     if not oem_conn:
         return None, None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
 
@@ -55,26 +102,14 @@ where
   and d.target_name = '&&TNAME';
 """.strip())
 
-
-
-    sql.append("exit")
-
-    payload = "\n".join(sql) + "\n"
-
     try:
-        p = subprocess.Popen(
-            ["sqlplus", "-s", oem_conn],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-
-        out, err = p.communicate(payload)
-        rc = p.returncode
+        rc, out, err = _sqlplus(oem_conn, sql, target_name, session)
 
         o = out.decode("utf-8", "ignore").strip()
         e = err.decode("utf-8", "ignore").strip()
 
+        if rc == RC_TIMEOUT:
+            return None, None, "OEM_TIMEOUT", "sqlplus timeout for target %s" % target_name
         if rc not in (0, None):
             return None, None, "OEM_SQLPLUS_ERROR", "sqlplus rc=%s | %s" % (rc, e or o)
 
@@ -109,10 +144,13 @@ where
     except Exception as ex:
         return None, None, "OEM_EXCEPTION", str(ex)
 
-def oem_get_oracle_version(oem_conn, target_name):
+def oem_get_oracle_version(oem_conn, target_name, session=None):
     """
     Retourne (oracle_version, err_type, err_detail)
     """
+    if OEM_SNAPSHOT is not None and target_name:
+        return OEM_SNAPSHOT.oracle_version(target_name)
+
     if not oem_conn:
         return None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
     if not target_name:
@@ -146,22 +184,14 @@ where
   t.target_name = '&&TNAME';
 """.strip())
 
-    sql.append("exit")
-    payload = "\n".join(sql) + "\n"
-
     try:
-        p = subprocess.Popen(
-            ["sqlplus", "-s", oem_conn],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        out, err = p.communicate(payload)
-        rc = p.returncode
+        rc, out, err = _sqlplus(oem_conn, sql, target_name, session)
 
         o = out.decode("utf-8", "ignore").strip()
         e = err.decode("utf-8", "ignore").strip()
 
+        if rc == RC_TIMEOUT:
+            return None, "OEM_TIMEOUT", "sqlplus timeout for target %s" % target_name
         if rc not in (0, None):
             return None, "OEM_SQLPLUS_ERROR", "sqlplus rc=%s | %s" % (rc, e or o)
 
@@ -182,4 +212,266 @@ where
 
     except Exception as ex:
         return None, "OEM_EXCEPTION", str(ex)
-                                                
+
+def oem_get_cluster_scans(oem_conn, session=None):
+    """
+    Une seule requete pour tout le referentiel : host -> cluster -> SCAN
+    Retourne ([(host, cluster, scan)], err_type, err_detail)
+    """
+    if OEM_SNAPSHOT is not None:
+        return OEM_SNAPSHOT.cluster_scans()
+
+    if not oem_conn:
+        return None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
+
+    sql = []
+    sql.append("set pages 0")
+    sql.append("set head off")
+    sql.append("set feed off")
+    sql.append("set verify off")
+    sql.append("set echo off")
+    sql.append("set trimspool on")
+    sql.append("set lines 400")
+
+    sql.append("""
+select
+  m.member_target_name
+  || '|' || c.target_name
+  || '|' ||
+  max(case
+        when lower(tp.property_name) like '%scan%name%'
+        then tp.property_value
+      end)
+from
+  sysman.mgmt$target c
+  join sysman.mgmt$target_members m
+    on m.aggregate_target_guid = c.target_guid
+   and m.member_target_type = 'host'
+  left join sysman.mgmt$target_properties tp
+    on tp.target_guid = c.target_guid
+where
+  c.target_type = 'cluster'
+group by
+  m.member_target_name, c.target_name;
+""".strip())
+
+    try:
+        rc, out, err = _sqlplus(oem_conn, sql, "oem:clusters", session)
+
+        o = out.decode("utf-8", "ignore").strip()
+        e = err.decode("utf-8", "ignore").strip()
+
+        if rc == RC_TIMEOUT:
+            return None, "OEM_TIMEOUT", "sqlplus timeout for cluster list"
+        if rc not in (0, None):
+            return None, "OEM_SQLPLUS_ERROR", "sqlplus rc=%s | %s" % (rc, e or o)
+
+        rows = []
+        for ln in o.splitlines():
+            parts = [p.strip() for p in ln.split("|")]
+            if len(parts) != 3 or not parts[0] or not parts[2]:
+                continue
+            rows.append((parts[0], parts[1], parts[2]))
+
+        if not rows:
+            return None, "OEM_NO_RESULT", "No cluster / SCAN in OEM repository"
+        return rows, None, None
+
+    except Exception as ex:
+        return None, "OEM_EXCEPTION", str(ex)
+
+# ------------------------------------------------
+# Profil de cible : host, port listener, version, type, cluster / RAC
+# en UNE requete (remplace le couple oem_get_host_and_port +
+# oem_get_oracle_version : un aller-retour referentiel par base au lieu
+# de deux). Resultats memorises pour le run (PROFILE_CACHE), cibles
+# inconnues comprises ; les erreurs ne sont pas memorisees.
+
+OEM_BULK_CHUNK = 500     # noms par clause IN (limite Oracle : 1000)
+
+# types de cible "base" : profils en direct et snapshot (Lib/oem_snapshot)
+DB_TARGET_TYPES = "'oracle_database', 'rac_database'"
+
+def _sql_in(names):
+    return ", ".join(["'%s'" % n.replace("'", "''") for n in names])
+
+PROFILE_CACHE = {}
+_PROFILE_LOCK = threading.Lock()
+
+def reset_profile_cache():
+    _PROFILE_LOCK.acquire()
+    try:
+        PROFILE_CACHE.clear()
+    finally:
+        _PROFILE_LOCK.release()
+
+def unknown_profile(target_name):
+    return {
+        "target": target_name,
+        "type": "UNKNOWN_TYPE",
+        "host": "UNKNOWN_HOST",
+        "port": "UNKNOWN_PORT",
+        "oracle_version": "UNKNOWN_VERSION",
+        "cluster": None,
+        "rac_database": None,
+    }
+
+def _parse_profile(line):
+    """
+    target|type|host|port|version|cluster|rac_database -> profil ou None
+    """
+    parts = [p.strip() for p in line.split("|")]
+    if len(parts) != 7 or not parts[0]:
+        return None
+    return {
+        "target": parts[0],
+        "type": parts[1] or "UNKNOWN_TYPE",
+        "host": parts[2] or "UNKNOWN_HOST",
+        "port": parts[3] or "UNKNOWN_PORT",
+        "oracle_version": parts[4] or "UNKNOWN_VERSION",
+        "cluster": parts[5] or None,
+        "rac_database": parts[6] or None,
+    }
+
+def oem_get_target_profiles(oem_conn, target_names, chunk_size=OEM_BULK_CHUNK,
+                            session=None):
+    """
+    Profils de plusieurs cibles : une session sqlplus, une requete par
+    paquet de chunk_size noms, seulement pour les cibles absentes du cache
+    Retourne ({target: profil}, err_type, err_detail)
+    profil : dict target, type, host, port, oracle_version, cluster,
+             rac_database (cluster / rac_database = None si non membre)
+    """
+    names = []
+    seen = {}
+    for t in (target_names or []):
+        if t and t not in seen:
+            seen[t] = 1
+            names.append(t)
+
+    out_map = {}
+    missing = []
+    _PROFILE_LOCK.acquire()
+    try:
+        for t in names:
+            if t in PROFILE_CACHE:
+                out_map[t] = dict(PROFILE_CACHE[t])
+            else:
+                missing.append(t)
+    finally:
+        _PROFILE_LOCK.release()
+    if not missing:
+        return out_map, None, None
+
+    if OEM_SNAPSHOT is not None:
+        found = {}
+        for t in missing:
+            found[t] = OEM_SNAPSHOT.profile(t)
+    else:
+        if not oem_conn:
+            return None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
+
+        sql = []
+        sql.append("set pages 0")
+        sql.append("set head off")
+        sql.append("set feed off")
+        sql.append("set verify off")
+        sql.append("set echo off")
+        sql.append("set trimspool on")
+        sql.append("set lines 1000")
+
+        for i in range(0, len(missing), chunk_size):
+            sql.append("""
+select
+  d.target_name
+  || '|' || max(d.target_type)
+  || '|' || nvl(max(h.target_name), 'UNKNOWN_HOST')
+  || '|' ||
+  nvl(
+    max(case
+          when lower(tp.property_name) = 'port'
+            or lower(tp.property_name) like '%%port%%'
+          then tp.property_value
+        end),
+    'UNKNOWN_PORT'
+  )
+  || '|' ||
+  nvl(
+    max(case
+          when lower(tp.property_name) like '%%oracle%%version%%'
+            or lower(tp.property_name) = 'version'
+          then tp.property_value
+        end),
+    'UNKNOWN_VERSION'
+  )
+  || '|' || max(cm.aggregate_target_name)
+  || '|' || max(rm.aggregate_target_name)
+from
+  sysman.mgmt$target d
+  left join sysman.mgmt$target h
+    on h.target_type = 'host'
+   and h.target_name = d.host_name
+  left join sysman.mgmt$target_properties tp
+    on tp.target_guid = d.target_guid
+  left join sysman.mgmt$target_members cm
+    on cm.aggregate_target_type = 'cluster'
+   and cm.member_target_type = 'host'
+   and cm.member_target_name = d.host_name
+  left join sysman.mgmt$target_members rm
+    on rm.aggregate_target_type = 'rac_database'
+   and rm.member_target_guid = d.target_guid
+where
+  d.target_type in (%s)
+  and d.target_name in (%s)
+group by
+  d.target_name;
+""".strip() % (DB_TARGET_TYPES, _sql_in(missing[i:i + chunk_size])))
+
+        try:
+            rc, out, err = _sqlplus(oem_conn, sql,
+                                    len(missing) == 1 and missing[0] or "oem:profiles",
+                                    session)
+
+            o = out.decode("utf-8", "ignore").strip()
+            e = err.decode("utf-8", "ignore").strip()
+
+            if rc == RC_TIMEOUT:
+                return None, "OEM_TIMEOUT", "sqlplus timeout for %d targets" % len(missing)
+            if rc not in (0, None):
+                return None, "OEM_SQLPLUS_ERROR", "sqlplus rc=%s | %s" % (rc, e or o)
+            # requete en erreur (rc=0) : rien en cache, la cible n'est pas
+            # inconnue du referentiel
+            ora = _sqlplus_error(o)
+            if ora:
+                return None, "OEM_SQLPLUS_ERROR", ora
+
+            found = {}
+            for ln in o.splitlines():
+                p = _parse_profile(ln)
+                if p is not None and p["target"] in seen:
+                    found[p["target"]] = p
+
+        except Exception as ex:
+            return None, "OEM_EXCEPTION", str(ex)
+
+    _PROFILE_LOCK.acquire()
+    try:
+        for t in missing:
+            # absente du referentiel -> profil inconnu (memorise aussi)
+            PROFILE_CACHE[t] = found.get(t) or unknown_profile(t)
+            out_map[t] = dict(PROFILE_CACHE[t])
+    finally:
+        _PROFILE_LOCK.release()
+    return out_map, None, None
+
+def oem_get_target_profile(oem_conn, target_name, session=None):
+    """
+    Profil d'une cible (cache du run, sinon une requete)
+    Retourne (profil, err_type, err_detail)
+    """
+    if not target_name:
+        return None, "OEM_TARGET_EMPTY", "Target name is empty"
+    m, e, d = oem_get_target_profiles(oem_conn, [target_name], session=session)
+    if e:
+        return None, e, d
+    return m[target_name], None, None
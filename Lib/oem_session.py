@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# Lib/oem_session.py
+#
+# Session sqlplus persistante vers le referentiel OEM
+#   - un seul processus "sqlplus -s" (un seul login) pour N requetes
+#   - chaque requete est envoyee sur stdin suivie d'un "prompt <sentinelle>" ;
+#     la sortie est lue au fil de l'eau jusqu'a la sentinelle
+#   - ecriture (stdin) et lecture (stdout) dans la meme boucle select :
+#     une grosse requete dont la sortie remplit le pipe ne bloque pas
+#   - timeout par requete (ecriture comprise) : sqlplus tue (rc=124), la
+#     session sera reouverte a la requete suivante
+#   - reconnexion automatique si sqlplus est mort (1 nouvel essai),
+#     et apres fork (chaque processus ouvre sa propre session)
+#   - une requete a la fois (verrou) : utilisable depuis plusieurs threads
+#
+# Contrat de run() : (rc, out, err) comme Lib/cmd_runner.run_cmd
+#
+# Python 2.6 compatible
+
+import os
+import errno
+import atexit
+import select
+import signal
+import subprocess
+import threading
+import time
+
+from Lib.cmd_runner import RC_TIMEOUT, RC_SPAWN_ERROR, observe_latency, _set_nonblocking
+
+OEM_SESSION_TIMEOUT_SEC = 120
+SENTINEL = "@@OEM_END"
+READ_SIZE = 65536
+
+SETUP = [
+    "set pages 0",
+    "set head off",
+    "set feed off",
+    "set verify off",
+    "set echo off",
+    "set trimspool on",
+    "set lines 400",
+]
+
+# ------------------------------------------------
+class OemSession(object):
+
+    def __init__(self, oem_conn, timeout_sec=OEM_SESSION_TIMEOUT_SEC,
+                 cmd=None):
+        self.oem_conn = oem_conn
+        self.timeout_sec = timeout_sec
+        self.cmd = cmd or ["sqlplus", "-s", oem_conn]
+
+        self.proc = None
+        self.pid = None             # processus proprietaire de self.proc
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.stats = {"logins": 0, "queries": 0, "timeouts": 0, "reconnects": 0}
+
+    # --------------------------------------------
+    def _alive(self):
+        if self.proc is None:
+            return False
+        if self.pid != os.getpid():
+            # fils apres fork : pipes du parent, on ne les touche pas
+            self.proc = None
+            return False
+        return self.proc.poll() is None
+
+    def _open(self):
+        try:
+            self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT,
+                                         close_fds=True)
+        except OSError as e:
+            self.proc = None
+            return False, str(e)
+        self.pid = os.getpid()
+        _set_nonblocking(self.proc.stdin.fileno())
+        _set_nonblocking(self.proc.stdout.fileno())
+        self.stats["logins"] += 1
+        return True, None
+
+    def _kill(self):
+        p = self.proc
+        self.proc = None
+        if p is None:
+            return
+        try:
+            os.kill(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        try:
+            p.wait()
+        except OSError:
+            pass
+
+    # --------------------------------------------
+    def _exchange(self, sql, timeout_sec):
+        """
+        Envoie sql + sentinelle, lit jusqu'a la sentinelle
+        Retourne (rc, out) ; rc=None si sqlplus est mort en route
+        """
+        self._seq += 1
+        marker = "%s %d@@" % (SENTINEL, self._seq)
+        payload = "\n".join(SETUP + [sql.rstrip(), "prompt %s" % marker]) + "\n"
+
+        fd = self.proc.stdout.fileno()
+        wfd = self.proc.stdin.fileno()
+        deadline = time.time() + timeout_sec
+        buf = []
+        data = ""
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                self._kill()
+                return RC_TIMEOUT, data
+            try:
+                r, w, x = select.select([fd], payload and [wfd] or [], [], left)
+            except select.error:
+                continue
+            if w:
+                try:
+                    n = os.write(wfd, payload[:READ_SIZE])
+                    payload = payload[n:]
+                except OSError as e:
+                    if e.errno not in (errno.EAGAIN, errno.EINTR):
+                        # EPIPE : sqlplus mort
+                        return None, "".join(buf)
+            if not r:
+                continue
+            try:
+                chunk = os.read(fd, READ_SIZE)
+            except OSError:
+                continue
+            if not chunk:
+                return None, "".join(buf)
+            buf.append(chunk)
+            data = "".join(buf)
+            i = data.find(marker)
+            if i >= 0:
+                return 0, data[:i]
+
+    def run(self, sql, target=None, timeout_sec=None):
+        """
+        sql : script SQL*Plus sans "exit"
+        Retourne (rc, out, err) en str ; rc=124 timeout, rc=127 lancement KO
+        """
+        timeout_sec = timeout_sec or self.timeout_sec
+        self._lock.acquire()
+        try:
+            t0 = time.time()
+            rc, out = None, ""
+            for attempt in (1, 2):
+                if not self._alive():
+                    if self.stats["logins"]:
+                        self.stats["reconnects"] += 1
+                    ok, err = self._open()
+                    if not ok:
+                        observe_latency("sqlplus", target, time.time() - t0, RC_SPAWN_ERROR)
+                        return RC_SPAWN_ERROR, "", err
+                rc, out = self._exchange(sql, timeout_sec)
+                if rc is not None:
+                    break
+                # sqlplus mort pendant la requete : reconnexion, 1 nouvel essai
+                self._kill()
+
+            self.stats["queries"] += 1
+            if rc is None:
+                rc = 1
+                observe_latency("sqlplus", target, time.time() - t0, rc)
+                return rc, "", out or "sqlplus session closed"
+            if rc == RC_TIMEOUT:
+                self.stats["timeouts"] += 1
+            observe_latency("sqlplus", target, time.time() - t0, rc)
+            return rc, out, ""
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def close(self):
+        self._lock.acquire()
+        try:
+            if not self._alive():
+                return
+            try:
+                self.proc.stdin.write("exit\n")
+                self.proc.stdin.close()
+            except (IOError, OSError):
+                pass
+            deadline = time.time() + 5
+            while self.proc.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            self._kill()
+        finally:
+            self._lock.release()
+
+    def reset_stats(self):
+        for k in self.stats:
+            self.stats[k] = 0
+
+    def merge_stats(self, other):
+        for k, v in (other or {}).items():
+            self.stats[k] = self.stats.get(k, 0) + v
+
+    def summary_lines(self):
+        st = self.stats
+        return [
+            "  oem session : logins=%d queries=%d timeouts=%d reconnects=%d" % (
+                st["logins"], st["queries"], st["timeouts"], st["reconnects"]),
+        ]
+
+# ------------------------------------------------
+def open_oem_session(conf, oem_conn):
+    """
+    Data/config.conf :
+      OEM_SESSION=1           (0 = un sqlplus par requete, historique)
+      OEM_SESSION_TIMEOUT=120 (secondes par requete)
+    Retourne (session|None, err_type, err_detail) ; connexion a la 1ere requete
+    """
+    conf = conf or {}
+    if not oem_conn:
+        return None, None, None
+    if str(conf.get("OEM_SESSION", "1")).strip().lower() in ("0", "no", "false", "off"):
+        return None, None, None
+    try:
+        timeout_sec = float(conf.get("OEM_SESSION_TIMEOUT") or OEM_SESSION_TIMEOUT_SEC)
+    except ValueError:
+        return None, "OEM_SESSION_CONF_INVALID", "OEM_SESSION_TIMEOUT=%s" % (
+            conf.get("OEM_SESSION_TIMEOUT"))
+    s = OemSession(oem_conn, timeout_sec)
+    atexit.register(s.close)
+    return s, None, None
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+# Lib/oem_snapshot.py
+#
+# Snapshot local du referentiel OEM (analyse hors ligne, rejouable)
+#   - export en UNE passe sqlplus : bases (host, port, version) et
+#     appartenance host -> cluster -> SCAN
+#   - fichier JSON horodate (CapturedAt / CapturedTs) : age controle au
+#     chargement (OEM_SNAPSHOT_MAX_AGE)
+#   - index en memoire : Lib/oem_flow repond depuis le snapshot
+#     (set_oem_snapshot) au lieu d'interroger le referentiel
+#   - cible absente du snapshot -> meme reponse que le referentiel pour
+#     une cible inconnue (UNKNOWN_HOST / UNKNOWN_PORT / UNKNOWN_VERSION)
+#   - synchro incrementale (sync_oem_snapshot) : seules les cibles chargees
+#     depuis le dernier watermark (heure du referentiel, LAST_LOAD_TIME_UTC)
+#     sont relues ; les suppressions sont detectees sur la liste des noms
+#     (une colonne, pas de jointure)
+#   - LAST_LOAD_TIME_UTC ne bouge pas sur un changement de propriete (port,
+#     SCAN) ou d'appartenance a un cluster : export complet force quand le
+#     dernier export complet (FullTs) depasse OEM_SNAPSHOT_FULL_EVERY
+#
+# Python 2.6 compatible
+
+import os
+import json
+import time
+
+from Lib.oem_flow import _sqlplus, _sqlplus_error, RC_TIMEOUT, unknown_profile
+from Lib.oem_flow import DB_TARGET_TYPES
+
+SNAPSHOT_VERSION = 1
+DEFAULT_MAX_AGE = 86400         # 1 jour
+SYNC_OVERLAP_SEC = 300          # recouvrement : chargements en cours au watermark
+DEFAULT_FULL_EVERY = 604800     # 7 jours entre deux exports complets
+
+# heure du referentiel (UTC) : prochain watermark, pris AVANT la lecture
+WATERMARK_SQL = """
+select
+  'W|' || to_char(sys_extract_utc(systimestamp), 'YYYY-MM-DD HH24:MI:SS')
+from
+  dual;
+""".strip()
+
+DATABASES_SQL = """
+select
+  'D|' || d.target_name
+  || '|' || nvl(max(h.target_name), 'UNKNOWN_HOST')
+  || '|' ||
+  nvl(
+    max(case
+          when lower(tp.property_name) = 'port'
+            or lower(tp.property_name) like '%port%'
+          then tp.property_value
+        end),
+    'UNKNOWN_PORT'
+  )
+  || '|' ||
+  nvl(
+    max(case
+          when lower(tp.property_name) like '%oracle%version%'
+            or lower(tp.property_name) = 'version'
+          then tp.property_value
+        end),
+    'UNKNOWN_VERSION'
+  )
+from
+  sysman.mgmt$target d
+  left join sysman.mgmt$target h
+    on h.target_type = 'host'
+   and h.target_name = d.host_name
+  left join sysman.mgmt$target_properties tp
+    on tp.target_guid = d.target_guid
+where
+  d.target_type in (@DB_TYPES@)@SINCE_D@
+group by
+  d.target_name;
+""".strip().replace("@DB_TYPES@", DB_TARGET_TYPES)
+
+# cluster sans membre : ligne C|<vide>|cluster| (membres a remplacer)
+CLUSTERS_SQL = """
+select
+  'C|' || m.member_target_name
+  || '|' || c.target_name
+  || '|' ||
+  max(case
+        when lower(tp.property_name) like '%scan%name%'
+        then tp.property_value
+      end)
+from
+  sysman.mgmt$target c
+  left join sysman.mgmt$target_members m
+    on m.aggregate_target_guid = c.target_guid
+   and m.member_target_type = 'host'
+  left join sysman.mgmt$target_properties tp
+    on tp.target_guid = c.target_guid
+where
+  c.target_type = 'cluster'@SINCE_C@
+group by
+  m.member_target_name, c.target_name;
+""".strip()
+
+# noms seuls : detection des suppressions
+NAMES_SQL = """
+select
+  decode(target_type, 'cluster', 'K|', 'N|') || target_name
+from
+  sysman.mgmt$target
+where
+  target_type in (@DB_TYPES@, 'cluster');
+""".strip().replace("@DB_TYPES@", DB_TARGET_TYPES)
+
+EXPORT_SQL = "\n\n".join([
+    WATERMARK_SQL,
+    DATABASES_SQL.replace("@SINCE_D@", ""),
+    CLUSTERS_SQL.replace("@SINCE_C@", ""),
+])
+
+def _since(alias, watermark):
+    return ("\n  and %s.last_load_time_utc >= "
+            "to_date('%s', 'YYYY-MM-DD HH24:MI:SS') - %d / 86400" % (
+                alias, watermark, SYNC_OVERLAP_SEC))
+
+def sync_sql(watermark):
+    return "\n\n".join([
+        WATERMARK_SQL,
+        DATABASES_SQL.replace("@SINCE_D@", _since("d", watermark)),
+        CLUSTERS_SQL.replace("@SINCE_C@", _since("c", watermark)),
+        NAMES_SQL,
+    ])
+
+# ------------------------------------------------
+def parse_export(text):
+    """
+    Lignes W|watermark, D|target|host|port|version, C|host|cluster|scan,
+    N|base et K|cluster
+    Retourne un dict : watermark, databases, clusters, touched (clusters
+    relus), names / cluster_names (None si absents), rows
+    """
+    out = {
+        "watermark": None, "databases": {}, "clusters": [], "touched": {},
+        "names": None, "cluster_names": None, "rows": 0,
+    }
+    for ln in (text or "").splitlines():
+        parts = [p.strip() for p in ln.strip().split("|")]
+        kind = parts[0]
+        if kind == "W" and len(parts) == 2 and parts[1]:
+            out["watermark"] = parts[1]
+        elif kind == "D" and len(parts) == 5 and parts[1]:
+            out["databases"][parts[1]] = {
+                "host": parts[2], "port": parts[3], "version": parts[4],
+            }
+        elif kind == "C" and len(parts) == 4 and parts[2]:
+            out["touched"][parts[2]] = 1
+            if parts[1] and parts[3]:
+                out["clusters"].append([parts[1], parts[2], parts[3]])
+        elif kind == "N" and len(parts) == 2 and parts[1]:
+            if out["names"] is None:
+                out["names"] = {}
+            out["names"][parts[1]] = 1
+        elif kind == "K" and len(parts) == 2 and parts[1]:
+            if out["cluster_names"] is None:
+                out["cluster_names"] = {}
+            out["cluster_names"][parts[1]] = 1
+        else:
+            continue
+        out["rows"] += 1
+    return out
+
+def _run_export(oem_conn, sql_text, target, session):
+    """
+    Retourne (texte, err_type, err_detail)
+    """
+    sql = [
+        "set pages 0",
+        "set head off",
+        "set feed off",
+        "set verify off",
+        "set echo off",
+        "set trimspool on",
+        "set lines 1000",
+        sql_text,
+    ]
+    try:
+        rc, out, err = _sqlplus(oem_conn, sql, target, session)
+    except Exception as ex:
+        return None, "OEM_EXCEPTION", str(ex)
+
+    o = out.decode("utf-8", "ignore")
+    if rc == RC_TIMEOUT:
+        return None, "OEM_TIMEOUT", "sqlplus timeout for %s" % target
+    if rc not in (0, None):
+        e = err.decode("utf-8", "ignore").strip()
+        return None, "OEM_SQLPLUS_ERROR", "sqlplus rc=%s | %s" % (rc, e or o.strip())
+    # une requete en erreur (rc=0) : sortie partielle, ni snapshot ni
+    # watermark (les changements de la fenetre seraient perdus)
+    ora = _sqlplus_error(o)
+    if ora:
+        return None, "OEM_SQLPLUS_ERROR", ora
+    return o, None, None
+
+def _stamp(snap, t0, mode, rows, **counts):
+    snap["CapturedAt"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t0))
+    snap["CapturedTs"] = int(t0)
+    sync = {
+        "Mode": mode,
+        "DurationSec": round(time.time() - t0, 3),
+        "Rows": rows,
+    }
+    sync.update(counts)
+    snap["LastSync"] = sync
+    return snap, None, None
+
+def export_oem_snapshot(oem_conn, session=None):
+    """
+    Export complet
+    Retourne (snapshot dict, err_type, err_detail)
+    """
+    if not oem_conn:
+        return None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
+
+    t0 = time.time()
+    o, e, d = _run_export(oem_conn, EXPORT_SQL, "oem:snapshot", session)
+    if e:
+        return None, e, d
+
+    p = parse_export(o)
+    if not p["databases"]:
+        return None, "OEM_NO_RESULT", "No database target exported"
+
+    return _stamp({
+        "Version": SNAPSHOT_VERSION,
+        "Watermark": p["watermark"],
+        "FullTs": int(t0),
+        "databases": p["databases"],
+        "clusters": p["clusters"],
+    }, t0, "full", p["rows"], Databases=len(p["databases"]))
+
+def sync_oem_snapshot(oem_conn, snap, session=None, full_every=DEFAULT_FULL_EVERY):
+    """
+    Synchro incrementale de snap (dict charge depuis le fichier) :
+      - bases / clusters charges depuis Watermark - SYNC_OVERLAP_SEC relus
+        et fusionnes (un cluster relu remplace tous ses membres)
+      - cibles absentes de la liste des noms supprimees
+    Export complet a la place : snapshot sans Watermark, ou dernier export
+    complet (FullTs) plus vieux que full_every secondes (0 = jamais)
+    Retourne (snapshot dict, err_type, err_detail) ; snap["LastSync"] :
+    Mode, DurationSec, Rows, Changed, Deleted
+    """
+    if not snap or not snap.get("Watermark"):
+        return export_oem_snapshot(oem_conn, session)
+    if full_every and time.time() - (snap.get("FullTs") or 0) > full_every:
+        return export_oem_snapshot(oem_conn, session)
+    if not oem_conn:
+        return None, "OEM_CONN_EMPTY", "OEM_CONN is empty"
+
+    t0 = time.time()
+    o, e, d = _run_export(oem_conn, sync_sql(snap["Watermark"]),
+                          "oem:snapshot-sync", session)
+    if e:
+        return None, e, d
+
+    p = parse_export(o)
+    if not p["watermark"] or p["names"] is None:
+        return None, "OEM_NO_RESULT", "Incomplete OEM snapshot sync output"
+
+    databases = dict(snap.get("databases") or {})
+    databases.update(p["databases"])
+    deleted = 0
+    for name in list(databases):
+        if name not in p["names"]:
+            del databases[name]
+            deleted += 1
+
+    live = p["cluster_names"] or {}
+    gone = {}
+    clusters = []
+    for row in snap.get("clusters") or []:
+        if row[1] in p["touched"]:
+            continue
+        if row[1] not in live:
+            gone[row[1]] = 1
+            continue
+        clusters.append(row)
+    clusters.extend(p["clusters"])
+    deleted += len(gone)
+
+    return _stamp({
+        "Version": SNAPSHOT_VERSION,
+        "Watermark": p["watermark"],
+        "FullTs": snap.get("FullTs"),
+        "databases": databases,
+        "clusters": clusters,
+    }, t0, "incremental", p["rows"],
+        Changed=len(p["databases"]) + len(p["touched"]), Deleted=deleted)
+
+def save_snapshot(path, snap):
+    tmp = "%s.tmp" % path
+    open(tmp, "wb").write(
+        json.dumps(snap, indent=1, ensure_ascii=False).encode("utf-8")
+    )
+    os.rename(tmp, path)
+
+# ------------------------------------------------
+class OemSnapshot(object):
+
+    def __init__(self, snap, path=None):
+        self.path = path
+        self.captured_at = snap.get("CapturedAt")
+        self.captured_ts = snap.get("CapturedTs") or 0
+        self.databases = snap.get("databases") or {}
+        self.clusters = snap.get("clusters") or []
+        self.last_sync = snap.get("LastSync")
+        self.stats = {"hits": 0, "misses": 0}
+
+    # --------------------------------------------
+    def age_sec(self, now=None):
+        return int((now or time.time()) - self.captured_ts)
+
+    def is_stale(self, max_age, now=None):
+        return bool(max_age) and self.age_sec(now) > max_age
+
+    # --------------------------------------------
+    def _db(self, target):
+        d = self.databases.get(target)
+        # compteurs indicatifs (pas de verrou : += concurrent tolere)
+        self.stats[d is None and "misses" or "hits"] += 1
+        return d or {}
+
+    def host_and_port(self, target):
+        """
+        Meme contrat que oem_flow.oem_get_host_and_port
+        """
+        d = self._db(target)
+        return (d.get("host") or "UNKNOWN_HOST",
+                d.get("port") or "UNKNOWN_PORT", None, None)
+
+    def oracle_version(self, target):
+        d = self._db(target)
+        return d.get("version") or "UNKNOWN_VERSION", None, None
+
+    def profile(self, target):
+        """
+        Meme contrat que oem_flow.oem_get_target_profile (type / RAC non
+        exportes : oracle_database, rac_database=None)
+        """
+        d = self._db(target)
+        if not d:
+            return unknown_profile(target)
+        host = d.get("host") or "UNKNOWN_HOST"
+        cluster = None
+        for row in self.clusters:
+            if row[0] == host:
+                cluster = row[1]
+                break
+        return {
+            "target": target,
+            "type": "oracle_database",
+            "host": host,
+            "port": d.get("port") or "UNKNOWN_PORT",
+            "oracle_version": d.get("version") or "UNKNOWN_VERSION",
+            "cluster": cluster,
+            "rac_database": None,
+        }
+
+    def cluster_scans(self):
+        if not self.clusters:
+            return None, "OEM_NO_RESULT", "No cluster / SCAN in OEM snapshot"
+        return [tuple(c) for c in self.clusters], None, None
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0}
+
+    def merge_stats(self, other):
+        for k, v in (other or {}).items():
+            self.stats[k] = self.stats.get(k, 0) + v
+
+    def summary_lines(self):
+        line = "  oem snapshot : %s (age %dh) | databases=%d clusters=%d | hits=%d misses=%d" % (
+            self.captured_at, self.age_sec() // 3600, len(self.databases),
+            len(self.clusters), self.stats["hits"], self.stats["misses"])
+        ls = self.last_sync
+        if ls:
+            line += " | last sync=%s %.1fs rows=%d" % (
+                ls.get("Mode"), ls.get("DurationSec") or 0, ls.get("Rows") or 0)
+        return [line]
+
+# ------------------------------------------------
+def read_snapshot(path):
+    """
+    Retourne (snapshot dict, err_type, err_detail)
+    """
+    if not path or not os.path.isfile(path):
+        return None, "OEM_SNAPSHOT_MISSING", "Missing %s" % path
+    try:
+        snap = json.loads(open(path, "rb").read().decode("utf-8"))
+    except Exception as e:
+        return None, "OEM_SNAPSHOT_ERROR", "%s | %s" % (path, e)
+    if not snap.get("CapturedTs") or not isinstance(snap.get("databases"), dict):
+        return None, "OEM_SNAPSHOT_ERROR", "%s | not an OEM snapshot" % path
+    return snap, None, None
+
+def load_oem_snapshot(path):
+    """
+    Retourne (OemSnapshot|None, err_type, err_detail)
+    """
+    snap, e, d = read_snapshot(path)
+    if e:
+        return None, e, d
+    return OemSnapshot(snap, path), None, None
+
+def full_every_option(conf):
+    """
+    Data/config.conf :
+      OEM_SNAPSHOT_FULL_EVERY=604800   (secondes entre deux exports complets
+                                        en -sync, 0 = incremental seulement)
+    """
+    try:
+        return max(0, int(str((conf or {}).get("OEM_SNAPSHOT_FULL_EVERY",
+                                               DEFAULT_FULL_EVERY)).strip()))
+    except ValueError:
+        return DEFAULT_FULL_EVERY
+
+def open_oem_snapshot(conf, path=None):
+    """
+    Data/config.conf :
+      OEM_SNAPSHOT_FILE=Data/oem_snapshot.json   (vide = referentiel en direct)
+      OEM_SNAPSHOT_MAX_AGE=86400                 (secondes, 0 = pas de controle)
+    Retourne (snapshot|None, err_type, err_detail) ; snapshot trop vieux ->
+    snapshot retourne avec OEM_SNAPSHOT_STALE
+    """
+    conf = conf or {}
+    path = path or conf.get("OEM_SNAPSHOT_FILE")
+    if not path:
+        return None, None, None
+    snap, e, d = load_oem_snapshot(path)
+    if e:
+        return None, e, d
+    try:
+        max_age = int(str(conf.get("OEM_SNAPSHOT_MAX_AGE", DEFAULT_MAX_AGE)).strip())
+    except ValueError:
+        max_age = DEFAULT_MAX_AGE
+    if snap.is_stale(max_age):
+        return snap, "OEM_SNAPSHOT_STALE", "%s captured at %s (%dh ago)" % (
+            path, snap.captured_at, snap.age_sec() // 3600)
+    return snap, None, None
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Lib/prefetch.py
+#
+# Prefetch par fenetre glissante (AnalyseV3, alternative a RunResolver.prime)
+#   - quand la ligne N demarre, les hosts des lignes N+1..N+k sont mis en
+#     file et resolus en arriere-plan (CNAME puis SCAN, memo du resolver)
+#   - la construction des lignes ne bloque plus sur une phase 1 complete :
+#     la ligne 1 demarre tout de suite, les suivantes trouvent leurs
+#     reponses pretes
+#   - taux de hit : hosts deja resolus au demarrage de leur ligne
+#
+# Threads uniquement (les fils -processes n'en profiteraient pas).
+#
+# Python 2.6 compatible
+
+import threading
+import Queue
+
+from Lib.resolver_run import normalize_key
+
+DEFAULT_WINDOW = 10
+DEFAULT_WORKERS = 2
+
+# ------------------------------------------------
+class Prefetcher(object):
+
+    def __init__(self, resolver, by_id, ids, window=DEFAULT_WINDOW,
+                 workers=DEFAULT_WORKERS):
+        """
+        resolver : RunResolver du run
+        by_id    : {id: [hosts]} (Lib/analyse_plan.build_plan, interpret())
+        ids      : ids dans l'ordre de construction
+        """
+        self.resolver = resolver
+        self.by_id = by_id
+        self.ids = list(ids)
+        self.pos = dict((oid, i) for i, oid in enumerate(self.ids))
+        self.window = max(1, window)
+        self.workers = max(1, workers)
+
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._next = 0
+        self._seen = {}
+        self._threads = []
+        self.stats = {"rows": 0, "refs": 0, "ready": 0, "queued": 0, "errors": 0}
+
+    # --------------------------------------------
+    def start(self):
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name="prefetch-%d" % (n + 1))
+            t.setDaemon(True)
+            t.start()
+            self._threads.append(t)
+        self._fill(0)
+
+    def stop(self):
+        for t in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    # --------------------------------------------
+    def _fill(self, first):
+        """
+        Met en file les hosts des lignes [first, first + window)
+        """
+        self._lock.acquire()
+        try:
+            limit = min(len(self.ids), first + self.window)
+            while self._next < limit:
+                for h in self.by_id.get(self.ids[self._next]) or []:
+                    k = normalize_key(h)
+                    if k and k not in self._seen:
+                        self._seen[k] = 1
+                        self.stats["queued"] += 1
+                        self._queue.put(h)
+                self._next += 1
+        finally:
+            self._lock.release()
+
+    def _worker(self):
+        while True:
+            h = self._queue.get()
+            if h is None:
+                return
+            try:
+                # meme enchainement que compute_net_side
+                cname, e, d = self.resolver.resolve_cname(h)
+                if not e and cname:
+                    self.resolver.resolve_scan(cname)
+            except Exception:
+                # la ligne refera la resolution elle-meme ; compte pour le resume
+                self._lock.acquire()
+                try:
+                    self.stats["errors"] += 1
+                finally:
+                    self._lock.release()
+
+    # --------------------------------------------
+    def row_started(self, oid):
+        """
+        Appele au demarrage de la construction de la ligne oid
+        """
+        hosts = self.by_id.get(oid) or []
+        ready = 0
+        for h in hosts:
+            if self.resolver.ready(h):
+                ready += 1
+
+        self._lock.acquire()
+        try:
+            self.stats["rows"] += 1
+            self.stats["refs"] += len(hosts)
+            self.stats["ready"] += ready
+        finally:
+            self._lock.release()
+
+        i = self.pos.get(oid)
+        if i is not None:
+            self._fill(i + 1)
+
+    def hit_rate(self):
+        if not self.stats["refs"]:
+            return None
+        return float(self.stats["ready"]) / self.stats["refs"]
+
+    def summary_lines(self):
+        rate = self.hit_rate()
+        return [
+            "  prefetch : window=%d workers=%d | hosts=%d | hit rate=%s (%d/%d) | errors=%d" % (
+                self.window, self.workers, self.stats["queued"],
+                rate is None and "N/A" or ("%d%%" % int(rate * 100)),
+                self.stats["ready"], self.stats["refs"], self.stats["errors"]),
+        ]
+
+# ------------------------------------------------
+def prefetch_options(conf, args=None):
+    """
+    Data/config.conf :
+      PREFETCH_WINDOW=0     (lignes d'avance, 0 = phase 1 complete historique)
+      PREFETCH_WORKERS=2
+    -prefetch=N sur la ligne de commande est prioritaire sur PREFETCH_WINDOW
+    """
+    conf = conf or {}
+    out = {}
+    for key, name, default in (
+            ("PREFETCH_WINDOW", "window", 0),
+            ("PREFETCH_WORKERS", "workers", DEFAULT_WORKERS)):
+        try:
+            out[name] = max(0, int(str(conf.get(key, default)).strip()))
+        except:
+            out[name] = default
+    for a in (args or []):
+        if a.startswith("-prefetch="):
+            try:
+                out["window"] = max(0, int(a.split("=", 1)[1]))
+            except:
+                pass
+    out["workers"] = max(1, out["workers"])
+    return out
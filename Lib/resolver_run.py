@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Lib/resolver_run.py
+#
+# Resolver memoise pour UN run AnalyseV3
+#   - une seule resolution par host normalise (CNAME) / par CNAME (SCAN)
+#   - les erreurs sont memorisees au meme titre que les succes, sauf les
+#     refus / echecs temporaires (NO_MEMO_ERRORS : redemandes)
+#   - compteurs hit / miss affiches en fin de run
+#   - thread-safe : un host demande par plusieurs workers n'est resolu
+#     qu'une fois (les autres attendent la resolution en cours)
+#
+# Python 2.6 compatible
+
+import threading
+
+from Lib.jdbc_flow_v2 import (
+    resolve_cname,
+    resolve_cname_bulk,
+    srvctl_config_scan,
+    scan_source,
+    _normalize_host
+)
+from Lib.analyse_runner import run_threads
+
+# jamais memorises : disjoncteur ouvert, resolveur DNS momentanement KO
+NO_MEMO_ERRORS = ("CIRCUIT_OPEN", "DNS_TEMP_FAILURE")
+
+# ------------------------------------------------
+def normalize_key(host):
+    h = _normalize_host(host)
+    if not h:
+        return None
+    h = h.lower()
+    if h.endswith("."):
+        h = h[:-1]
+    return h
+
+# ------------------------------------------------
+class RunResolver(object):
+
+    def __init__(self, cname_func=None, scan_func=None, bulk_cname_func=None):
+        self._cname_func = cname_func or resolve_cname
+        self._scan_func = scan_func or srvctl_config_scan
+        self._bulk_cname_func = bulk_cname_func or resolve_cname_bulk
+
+        self._cname = {}
+        self._scan = {}
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        self.stats = {
+            "cname_hits": 0,
+            "cname_misses": 0,
+            "scan_hits": 0,
+            "scan_misses": 0,
+            "primed_cname": 0,
+            "primed_scan": 0,
+        }
+
+    # --------------------------------------------
+    def _memo(self, kind, table, key, func, arg):
+        """
+        Lecture memo / resolution unique par cle (kind = "cname" | "scan")
+        """
+        self._lock.acquire()
+        try:
+            if key in table:
+                self.stats[kind + "_hits"] += 1
+                return table[key]
+            ev = self._inflight.get((kind, key))
+            owner = ev is None
+            if owner:
+                ev = threading.Event()
+                self._inflight[(kind, key)] = ev
+                self.stats[kind + "_misses"] += 1
+        finally:
+            self._lock.release()
+
+        if not owner:
+            ev.wait()
+            self._lock.acquire()
+            try:
+                if key in table:
+                    self.stats[kind + "_hits"] += 1
+                    return table[key]
+            finally:
+                self._lock.release()
+            # le proprietaire a echoue (exception) : resolution directe
+            return func(arg)
+
+        res = None
+        try:
+            res = func(arg)
+        finally:
+            self._lock.acquire()
+            try:
+                # refus / echec temporaire : pas memorise
+                if res is not None and res[1] not in NO_MEMO_ERRORS:
+                    table[key] = res
+                del self._inflight[(kind, key)]
+            finally:
+                self._lock.release()
+            ev.set()
+        return res
+
+    def _store(self, kind, table, key, res):
+        if res and res[1] in NO_MEMO_ERRORS:
+            return
+        self._lock.acquire()
+        try:
+            table[key] = res
+            self.stats["primed_" + kind] += 1
+        finally:
+            self._lock.release()
+
+    def _known(self, table, key):
+        self._lock.acquire()
+        try:
+            return table.get(key)
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def resolve_cname(self, host):
+        """
+        Meme contrat que jdbc_flow_v2.resolve_cname :
+        (cname, err_type, err_detail)
+        """
+        key = normalize_key(host)
+        if not key:
+            return self._cname_func(host)
+        return self._memo("cname", self._cname, key, self._cname_func, host)
+
+    # --------------------------------------------
+    def resolve_scan(self, host):
+        """
+        Meme contrat que jdbc_flow_v2.resolve_scan :
+        host -> CNAME (memoise) -> srvctl config scan (memoise par CNAME)
+        """
+        cname, e, d = self.resolve_cname(host)
+        if e:
+            return None, e, d
+
+        key = normalize_key(cname)
+        if not key:
+            return self._scan_func(cname)
+        return self._memo("scan", self._scan, key, self._scan_func, cname)
+
+    def ready(self, host):
+        """
+        True si resolve_scan(resolve_cname(host)) repondra sans I/O
+        (erreurs memorisees comprises). Lecture seule, aucun compteur
+        """
+        v = self._known(self._cname, normalize_key(host))
+        if v is None:
+            return False
+        if v[1] or not v[0]:
+            return True
+        v = self._known(self._cname, normalize_key(v[0]))
+        if v is None:
+            return False
+        if v[1] or not v[0]:
+            return True
+        return self._known(self._scan, normalize_key(v[0])) is not None
+
+    def scan_source(self, host):
+        """
+        Origine du SCAN deja resolu pour host (INVENTORY | CACHE | SSH...)
+        Lecture seule : aucune resolution, aucun compteur
+        """
+        v = self._known(self._cname, normalize_key(host))
+        node = (v and not v[1] and v[0]) or host
+        return scan_source(node)
+
+    # --------------------------------------------
+    def prime_cnames(self, hosts):
+        """
+        CNAME de chaque host unique (backend masse), sans SCAN
+        (prime etape 1 ; -order=locality avec le prefetch)
+        """
+        todo = []
+        seen = {}
+        for h in hosts:
+            k = normalize_key(h)
+            if k and self._known(self._cname, k) is None and k not in seen:
+                seen[k] = 1
+                todo.append(h)
+        if not todo:
+            return
+
+        res = self._bulk_cname_func(todo)
+        for h in todo:
+            if h in res:
+                self._store("cname", self._cname, normalize_key(h), res[h])
+
+    def prime(self, hosts, progress=None, workers=1):
+        """
+        Resolution en masse (phase I/O) avant construction des objets.
+          1) CNAME de chaque host unique (backend masse)
+          2) CNAME des CNAME (resolve_scan(cname) les redemande)
+          3) SCAN une fois par CNAME unique (workers threads en parallele)
+        progress : callable(pos, total, step) optionnel
+        """
+        self.prime_cnames(hosts)
+
+        cnames = []
+        for h in hosts:
+            v = self._known(self._cname, normalize_key(h))
+            if v and not v[1] and v[0]:
+                cnames.append(v[0])
+        self.prime_cnames(cnames)
+
+        nodes = []
+        seen = {}
+        for c in cnames:
+            v = self._known(self._cname, normalize_key(c))
+            if not v or v[1] or not v[0]:
+                continue
+            k = normalize_key(v[0])
+            if k and self._known(self._scan, k) is None and k not in seen:
+                seen[k] = 1
+                nodes.append(v[0])
+
+        total = len(nodes)
+        done = [0]
+
+        def on_result(node, res):
+            self._store("scan", self._scan, normalize_key(node), res)
+            done[0] += 1
+            if progress:
+                progress(done[0], total, "PRIME_SCAN")
+
+        run_threads(nodes, self._scan_func, workers, on_result)
+
+    # --------------------------------------------
+    def forget_errors(self, err_types):
+        """
+        Oublie les erreurs memorisees de ces types (reessai)
+        Retourne le nombre d'entrees retirees
+        """
+        n = 0
+        self._lock.acquire()
+        try:
+            for table in (self._cname, self._scan):
+                for k in list(table.keys()):
+                    if table[k][1] in err_types:
+                        del table[k]
+                        n += 1
+        finally:
+            self._lock.release()
+        return n
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self._lock.acquire()
+        try:
+            for k in self.stats:
+                self.stats[k] = 0
+        finally:
+            self._lock.release()
+
+    def merge_stats(self, other):
+        """
+        Ajoute les compteurs d'un autre resolver (processus fils)
+        """
+        self._lock.acquire()
+        try:
+            for k, v in (other or {}).items():
+                self.stats[k] = self.stats.get(k, 0) + v
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def summary_lines(self):
+        st = self.stats
+        return [
+            "  resolver CNAME : hits=%d misses=%d" % (
+                st["cname_hits"], st["cname_misses"]),
+            "  resolver SCAN  : hits=%d misses=%d" % (
+                st["scan_hits"], st["scan_misses"]),
+            "  resolver prime : cname=%d scan=%d" % (
+                st["primed_cname"], st["primed_scan"]),
+        ]
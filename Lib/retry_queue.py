@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Lib/retry_queue.py
+#
+# File de reessai differee (AnalyseV3)
+#   - les lignes en erreur transitoire (timeout DNS / SSH, disjoncteur
+#     ouvert) sont reconstruites APRES la passe principale
+#   - concurrence propre (threads), backoff exponentiel entre tentatives,
+#     nombre maximum de tentatives
+#   - l'objet reconstruit remplace la version precedente (on_result)
+#
+# Une erreur servie par le cache negatif ([CACHED ...]) n'est pas
+# reessayee : le backoff du cache s'applique.
+#
+# Python 2.6 compatible
+
+import time
+
+from Lib.analyse_runner import run_threads
+
+TRANSIENT_ERRORS = (
+    "NSLOOKUP_TIMEOUT",
+    "DNS_TEMP_FAILURE",
+    "SRVCTL_TIMEOUT",
+    "CIRCUIT_OPEN",
+)
+
+DEFAULT_MAX_ATTEMPTS = 2
+DEFAULT_BACKOFF = 30
+DEFAULT_WORKERS = 2
+
+# ------------------------------------------------
+def is_transient(obj):
+    st = (obj or {}).get("Status") or {}
+    if st.get("ErrorCause") not in TRANSIENT_ERRORS:
+        return False
+    return "[CACHED " not in (st.get("ErrorDetail") or "")
+
+# ------------------------------------------------
+def run_retry_queue(ids, build_fn, on_result, workers=DEFAULT_WORKERS,
+                    max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_sec=DEFAULT_BACKOFF,
+                    before_attempt=None, sleep=time.sleep):
+    """
+    ids            : ids en erreur transitoire (passe principale)
+    build_fn(id)   : reconstruction de l'objet
+    on_result(id, obj) : remplacement dans le store (thread courant)
+    before_attempt(n)  : oubli des erreurs memorisees avant la tentative n
+    Retourne les compteurs {queued, attempts, recovered, failed}
+    """
+    stats = {"queued": len(ids), "attempts": 0, "recovered": 0, "failed": 0}
+    pending = list(ids)
+
+    for n in range(1, max_attempts + 1):
+        if not pending:
+            break
+        sleep(backoff_sec * (2 ** (n - 1)))
+        if before_attempt:
+            before_attempt(n)
+        stats["attempts"] = n
+
+        still = []
+
+        def merge(oid, obj):
+            on_result(oid, obj)
+            if is_transient(obj):
+                still.append(oid)
+            else:
+                stats["recovered"] += 1
+
+        run_threads(pending, build_fn, workers, merge)
+        pending = still
+
+    stats["failed"] = len(pending)
+    return stats
+
+def retry_summary_lines(stats):
+    return [
+        "  retry : queued=%d recovered=%d failed=%d attempts=%d" % (
+            stats["queued"], stats["recovered"], stats["failed"],
+            stats["attempts"]),
+    ]
+
+# ------------------------------------------------
+def retry_options(conf):
+    """
+    Data/config.conf :
+      RETRY_MAX_ATTEMPTS=2   (0 = pas de reessai)
+      RETRY_BACKOFF=30       (secondes avant la 1ere tentative, double ensuite)
+      RETRY_WORKERS=2
+    """
+    conf = conf or {}
+    out = {}
+    for key, name, default in (
+            ("RETRY_MAX_ATTEMPTS", "max_attempts", DEFAULT_MAX_ATTEMPTS),
+            ("RETRY_BACKOFF", "backoff_sec", DEFAULT_BACKOFF),
+            ("RETRY_WORKERS", "workers", DEFAULT_WORKERS)):
+        try:
+            out[name] = max(0, int(str(conf.get(key, default)).strip()))
+        except:
+            out[name] = default
+    out["workers"] = max(1, out["workers"])
+    return out
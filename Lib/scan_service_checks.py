@@ -63,6 +63,7 @@ def compute_scan_path(network, rawsource):
     """
     Authority: Network.New (current choice).
     Uses OEM scan as reference if available.
+    ResolvedSource : origin of ResolvedSCAN (INVENTORY | OEM | CACHE | SSH).
     Produces:
       Status["ScanPath"] = { Rule, Primary:{...}, DR:{...} }
     """
@@ -88,6 +89,8 @@ def compute_scan_path(network, rawsource):
         host = nb.get("host")
         cname = nb.get("cname")
         scan = nb.get("scan")
+        # INVENTORY | OEM | CACHE | SSH (Lib/jdbc_flow_v2.scan_source)
+        scan_src = nb.get("scan_source")
 
         # 1) Host missing
         if not host:
@@ -140,6 +143,7 @@ def compute_scan_path(network, rawsource):
                 "Host": host,
                 "CNAME": cname,
                 "ResolvedSCAN": scan,
+                "ResolvedSource": scan_src,
                 "ExpectedSCAN": expected_scan,
                 "ExpectedSource": expected_source,
                 "TargetDatabase": target_db
@@ -152,6 +156,7 @@ def compute_scan_path(network, rawsource):
             "Host": host,
             "CNAME": cname,
             "ResolvedSCAN": scan,
+            "ResolvedSource": scan_src,
             "ExpectedSCAN": expected_scan,
             "ExpectedSource": expected_source,
             "TargetDatabase": target_db
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# Lib/ssh_pool.py
+#
+# Pool de connexions SSH maitres (OpenSSH ControlMaster / ControlPersist)
+#   - une connexion maitre par (user, host), ouverte a la premiere commande
+#   - les commandes suivantes passent par le socket de controle
+#     (pas de TCP / echange de cles / authentification a chaque appel)
+#   - duree de vie bornee : ControlPersist (inactivite) + age max
+#   - fermeture des maitres (ssh -O exit) et du repertoire en fin de process ;
+#     un fils (-processes) arrete les maitres qu'il a ouverts (ssh -O stop)
+#     avant de sortir, le parent ferme ensuite les sockets restants
+#   - compteurs : connexions ouvertes / commandes executees
+#
+# Sans pool (set_ssh_pool(None)), ssh_argv() rend la commande ssh classique.
+#
+# Python 2.6 compatible
+
+import os
+import atexit
+import signal
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import time
+
+DEFAULT_PERSIST = 300
+DEFAULT_MAX_AGE = 900
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_OPEN_TIMEOUT = 30       # ouverture complete du maitre (banniere, auth)
+
+SSH_POOL = None
+
+# ------------------------------------------------
+def _base_argv(user, host, opts):
+    argv = ["ssh"]
+    for o in (opts or []):
+        argv.extend(["-o", o])
+    return argv, "%s@%s" % (user, host) if user else host
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+# ------------------------------------------------
+class SshPool(object):
+
+    def __init__(self, control_dir=None, persist_sec=DEFAULT_PERSIST,
+                 max_age_sec=DEFAULT_MAX_AGE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 open_timeout=DEFAULT_OPEN_TIMEOUT):
+        self.persist_sec = persist_sec
+        self.max_age_sec = max_age_sec
+        self.connect_timeout = connect_timeout
+        self.open_timeout = open_timeout
+
+        self._own_dir = control_dir is None
+        self.control_dir = control_dir or tempfile.mkdtemp(prefix="sshcm_")
+        if not os.path.isdir(self.control_dir):
+            os.makedirs(self.control_dir)
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._masters = {}      # (user, host) -> (path, opened_at, pid)
+        self._failed = {}       # (user, host) -> 1 (pas de nouvel essai)
+
+        self.stats = {
+            "opened": 0,
+            "failed": 0,
+            "expired": 0,
+            "commands": 0,
+            "reused": 0,
+        }
+
+    # --------------------------------------------
+    def _path(self, user, host):
+        # chemin court et stable (limite ~100 car. des sockets unix)
+        h = hashlib.md5(("%s@%s" % (user or "", host)).encode("utf-8")).hexdigest()
+        return os.path.join(self.control_dir, h[:16])
+
+    def _key_lock(self, key):
+        self._lock.acquire()
+        try:
+            return self._key_locks.setdefault(key, threading.Lock())
+        finally:
+            self._lock.release()
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def _open_master(self, user, host, path, opts):
+        """
+        ssh -M -N -f : rend la main une fois authentifie, le maitre reste
+        en arriere-plan (sorties vers /dev/null pour ne pas retenir de pipe,
+        d'ou Popen et non run_cmd qui attend la fin des pipes)
+        ConnectTimeout ne couvre que le connect TCP : banniere / auth bloquees
+        -> ssh tue apres open_timeout
+        """
+        argv, dest = _base_argv(user, host, opts)
+        argv.extend([
+            "-o", "BatchMode=yes",
+            "-o", "ConnectTimeout=%d" % self.connect_timeout,
+            "-o", "ControlMaster=yes",
+            "-o", "ControlPath=%s" % path,
+            "-o", "ControlPersist=%d" % self.persist_sec,
+            "-M", "-N", "-f", dest,
+        ])
+        devnull = open(os.devnull, "r+")
+        try:
+            try:
+                p = subprocess.Popen(argv, stdin=devnull, stdout=devnull,
+                                     stderr=devnull, close_fds=True)
+                # attente bloquante de la sortie de ssh -f ; minuterie de
+                # secours qui le tue (rc = -SIGKILL)
+                timer = threading.Timer(self.open_timeout, _kill, [p.pid])
+                timer.start()
+                try:
+                    rc = p.wait()
+                finally:
+                    timer.cancel()
+            except Exception:
+                rc = -1
+        finally:
+            devnull.close()
+        return rc == 0 and os.path.exists(path)
+
+    def _control(self, user, host, path, op):
+        """
+        ssh -O check | exit sur le socket de controle -> True si rc=0
+        """
+        argv, dest = _base_argv(user, host, None)
+        argv.extend(["-o", "ControlPath=%s" % path, "-O", op, dest])
+        devnull = open(os.devnull, "r+")
+        try:
+            try:
+                return subprocess.Popen(argv, stdin=devnull, stdout=devnull,
+                                        stderr=devnull, close_fds=True).wait() == 0
+            except Exception:
+                return False
+        finally:
+            devnull.close()
+
+    def _close_master(self, user, host, path):
+        self._control(user, host, path, "exit")
+
+    # --------------------------------------------
+    def master_path(self, user, host, opts=None, now=None):
+        """
+        Socket de controle pret pour (user, host), ou None (ssh direct)
+        """
+        key = (user, host)
+        kl = self._key_lock(key)
+        kl.acquire()
+        try:
+            now = now or time.time()
+            m = self._masters.get(key)
+            if m:
+                path, opened_at, pid = m
+                if now - opened_at < self.max_age_sec and os.path.exists(path):
+                    self._count("reused")
+                    return path
+                # maitre trop vieux ou disparu (ControlPersist expire)
+                self._close_master(user, host, path)
+                del self._masters[key]
+                self._count("expired")
+
+            if key in self._failed:
+                return None
+
+            path = self._path(user, host)
+            if os.path.exists(path) and self._control(user, host, path, "check"):
+                # maitre ouvert par un autre processus (fils -processes)
+                self._masters[key] = (path, now, None)
+                self._count("reused")
+                return path
+            if self._open_master(user, host, path, opts):
+                self._masters[key] = (path, now, os.getpid())
+                self._count("opened")
+                return path
+
+            self._failed[key] = 1
+            self._count("failed")
+            return None
+        finally:
+            kl.release()
+
+    def argv(self, user, host, remote, opts=None):
+        argv, dest = _base_argv(user, host, opts)
+        path = self.master_path(user, host, opts)
+        self._count("commands")
+        if path:
+            argv.extend(["-o", "ControlMaster=no", "-o", "ControlPath=%s" % path])
+        argv.extend([dest, remote])
+        return argv
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self._lock.acquire()
+        try:
+            for k in self.stats:
+                self.stats[k] = 0
+        finally:
+            self._lock.release()
+
+    def merge_stats(self, other):
+        """
+        Ajoute les compteurs d'un autre pool (processus fils)
+        """
+        self._lock.acquire()
+        try:
+            for k, v in (other or {}).items():
+                self.stats[k] = self.stats.get(k, 0) + v
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def close_all(self):
+        """
+        Parent : ferme tous les maitres, y compris ceux laisses par les fils
+        dans le repertoire de controle (temporaire), puis le supprime
+        Fils (fork) : arrete seulement les maitres qu'il a ouverts ; -O stop
+        laisse finir les commandes d'un autre fils qui les reutilise
+        """
+        pid = os.getpid()
+        child = pid != self._pid
+        self._lock.acquire()
+        try:
+            masters = list(self._masters.items())
+            self._masters = {}
+        finally:
+            self._lock.release()
+        done = {}
+        for (user, host), (path, opened_at, owner) in masters:
+            if child and owner != pid:
+                continue
+            self._control(user, host, path, child and "stop" or "exit")
+            done[path] = 1
+        if child or not self._own_dir:
+            # SSH_CONTROL_DIR partage : seuls nos maitres sont fermes
+            return
+        try:
+            left = os.listdir(self.control_dir)
+        except OSError:
+            left = []
+        for name in left:
+            path = os.path.join(self.control_dir, name)
+            if path not in done:
+                # ControlPath sans jeton : la destination est indifferente
+                self._control(None, "localhost", path, "exit")
+        shutil.rmtree(self.control_dir, True)
+
+    def summary_lines(self):
+        st = self.stats
+        return [
+            "  ssh pool : connexions=%d echecs=%d expirees=%d | commandes=%d reutilisees=%d" % (
+                st["opened"], st["failed"], st["expired"],
+                st["commands"], st["reused"]),
+        ]
+
+# ------------------------------------------------
+def set_ssh_pool(pool):
+    global SSH_POOL
+    SSH_POOL = pool
+
+def get_ssh_pool():
+    return SSH_POOL
+
+def ssh_argv(user, host, remote, opts=None):
+    """
+    Commande ssh pour executer `remote` sur user@host,
+    via le pool si actif
+    """
+    if SSH_POOL is not None:
+        return SSH_POOL.argv(user, host, remote, opts)
+    argv, dest = _base_argv(user, host, opts)
+    argv.extend([dest, remote])
+    return argv
+
+# ------------------------------------------------
+def open_ssh_pool(conf):
+    """
+    Lit SSH_POOL / SSH_CONTROL_DIR / SSH_CONTROL_PERSIST / SSH_MAX_AGE /
+    SSH_MASTER_TIMEOUT
+    Retourne (pool|None, err_type, err_detail) ; le pool est ferme a la
+    sortie du process.
+    """
+    conf = conf or {}
+    if str(conf.get("SSH_POOL", "1")).strip().lower() in ("0", "no", "false", "off"):
+        return None, None, None
+
+    try:
+        persist = int(conf.get("SSH_CONTROL_PERSIST", DEFAULT_PERSIST))
+        max_age = int(conf.get("SSH_MAX_AGE", DEFAULT_MAX_AGE))
+        open_timeout = int(conf.get("SSH_MASTER_TIMEOUT", DEFAULT_OPEN_TIMEOUT))
+    except:
+        return None, "SSH_POOL_CONF", \
+            "SSH_CONTROL_PERSIST / SSH_MAX_AGE / SSH_MASTER_TIMEOUT must be integers"
+
+    try:
+        pool = SshPool(conf.get("SSH_CONTROL_DIR") or None, persist, max_age,
+                       open_timeout=open_timeout)
+    except Exception as e:
+        return None, "SSH_POOL_ERROR", str(e)
+
+    atexit.register(pool.close_all)
+    return pool, None, None
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Lib/zone_snapshot.py
+#
+# Index en memoire d'un export de zone DNS (CNAME / A)
+#   - format zone BIND : "nom [ttl] [IN] TYPE valeur", $ORIGIN, $TTL,
+#     commentaires ";", proprietaire implicite (ligne commencant par un blanc)
+#   - noms relatifs completes par $ORIGIN, "@" = origine
+#   - resolution host -> CNAME en suivant la chaine dans l'index
+#     (la chaine doit finir sur un A de l'index, sinon miss)
+#   - absent de l'index -> None (l'appelant interroge le DNS reel)
+#
+# Contrat : (value, err_type, err_detail) comme resolve_cname, ou None
+#
+# Python 2.6 compatible
+
+import threading
+
+from Lib.dns_wire import read_resolv_conf
+
+MAX_CNAME_HOPS = 16
+RTYPES = ("CNAME", "A")
+
+# ------------------------------------------------
+def _norm(name):
+    if not name:
+        return None
+    try:
+        if not isinstance(name, unicode):
+            name = unicode(name, "utf-8", "ignore")
+    except:
+        return None
+    n = name.strip().lower()
+    if n.endswith("."):
+        n = n[:-1]
+    return n or None
+
+def _absolute(name, origin):
+    if name == "@":
+        return origin
+    if name.endswith("."):
+        return name[:-1]
+    if origin:
+        return "%s.%s" % (name, origin)
+    return name
+
+# ------------------------------------------------
+class ZoneIndex(object):
+
+    def __init__(self, search=None):
+        self.cnames = {}
+        self.addrs = {}
+        self.files = []
+        self.search = search
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    # --------------------------------------------
+    def load(self, path):
+        """
+        Ajoute un export de zone a l'index
+        Retourne (ok, err_type, err_detail)
+        """
+        try:
+            f = open(path, "rb")
+        except Exception as e:
+            return False, "ZONE_SNAPSHOT_ERROR", "%s | %s" % (path, e)
+
+        origin = None
+        owner = None
+        n = 0
+        try:
+            for raw in f:
+                line = raw.decode("utf-8", "ignore").split(";", 1)[0]
+                if not line.strip():
+                    continue
+                parts = line.split()
+
+                if parts[0].upper() == "$ORIGIN" and len(parts) > 1:
+                    origin = _norm(parts[1])
+                    continue
+                if parts[0].startswith("$"):
+                    continue
+
+                if not line[0].isspace():
+                    owner = _norm(_absolute(parts[0], origin))
+                    parts = parts[1:]
+                if not owner:
+                    continue
+
+                # [ttl] [IN] TYPE valeur
+                up = [p.upper() for p in parts]
+                rtype = None
+                for i, p in enumerate(up):
+                    if p in RTYPES:
+                        rtype = p
+                        break
+                if rtype is None or i + 1 >= len(parts):
+                    continue
+                value = parts[i + 1]
+
+                if rtype == "CNAME":
+                    self.cnames[owner] = _norm(_absolute(value, origin))
+                else:
+                    self.addrs.setdefault(owner, []).append(value)
+                n += 1
+        finally:
+            f.close()
+
+        self.files.append(path)
+        return True, None, n
+
+    # --------------------------------------------
+    def _names(self, host):
+        h = _norm(host)
+        if not h:
+            return []
+        if "." in h:
+            return [h]
+        if self.search is None:
+            self.search = read_resolv_conf()[1]
+        out = []
+        for d in self.search:
+            out.append("%s.%s" % (h, _norm(d)))
+        out.append(h)
+        return out
+
+    def resolve(self, host):
+        """
+        (cname, None, None) si le host est dans l'index, sinon None
+        La chaine doit aboutir a un enregistrement A de l'index : une cible
+        hors des zones chargees peut etre elle-meme un CNAME -> miss, le
+        DNS reel resout alors la chaine complete
+        """
+        for name in self._names(host):
+            cur = name
+            hops = 0
+            while cur in self.cnames and hops < MAX_CNAME_HOPS:
+                cur = self.cnames[cur]
+                hops += 1
+            if cur in self.addrs:
+                self._count("hits")
+                return cur, None, None
+        self._count("misses")
+        return None
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self._lock.release()
+
+    # --------------------------------------------
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0}
+
+    def merge_stats(self, other):
+        for k, v in (other or {}).items():
+            self.stats[k] = self.stats.get(k, 0) + v
+
+    def summary_lines(self):
+        return [
+            "  zone snapshot : cname=%d a=%d | hits=%d misses=%d (live DNS)" % (
+                len(self.cnames), len(self.addrs),
+                self.stats["hits"], self.stats["misses"]),
+        ]
+
+# ------------------------------------------------
+def open_zone_snapshot(paths):
+    """
+    paths : liste de fichiers d'export (ZONE_SNAPSHOT_FILE / -zone=)
+    Retourne (index|None, err_type, err_detail)
+    """
+    paths = [p for p in (paths or []) if p]
+    if not paths:
+        return None, None, None
+    idx = ZoneIndex()
+    for p in paths:
+        ok, e, d = idx.load(p)
+        if not ok:
+            return None, e, d
+    return idx, None, None
@@ -7,9 +7,13 @@ import json
 import time
 
 from Lib.io_common import load_main_conf
-from Lib.oem_flow import oem_get_host_and_port
-from Lib.oem_flow import oem_get_oracle_version
+from Lib.oem_flow import oem_get_target_profile
 from Lib.analyse_builder_v3 import compute_net_side
+from Lib.identity_cache import open_identity_cache
+from Lib.jdbc_flow_v2 import set_identity_cache
+from Lib.dns_backend import configure_dns
+from Lib.ssh_pool import open_ssh_pool, set_ssh_pool
+from Lib.oem_session import open_oem_session
 
 # ------------------------------------------------
 def usage():
@@ -42,6 +46,13 @@ if __name__ == "__main__":
         print("OEM connection string not found in OEM_CONF_FILE")
         sys.exit(1)
 
+    id_cache, ice, icd = open_identity_cache(conf)
+    set_identity_cache(id_cache)
+    configure_dns(conf)
+    set_ssh_pool(open_ssh_pool(conf)[0])
+    # un seul login sqlplus pour les requetes OEM ci-dessous
+    session = open_oem_session(conf, oem_conn)[0]
+
 
     result = {
         "Database": db_name,
@@ -51,7 +62,10 @@ if __name__ == "__main__":
                 "port": None,
                 "cname": None,
                 "scan": None,
-                "oracle_version": None
+                "oracle_version": None,
+                "type": None,
+                "cluster": None,
+                "rac_database": None
             }
         },
         "Status": {
@@ -63,22 +77,18 @@ if __name__ == "__main__":
     }
 
     # ------------------------------------------------
-    # 1) OEM host / port
+    # 1) OEM profil : host / port / version / cluster (une requete)
     # ------------------------------------------------
-    host, ora_version, e, d = oem_get_host_and_port(oem_conn, db_name)
+    profile, e, d = oem_get_target_profile(oem_conn, db_name, session)
     if e:
         result["Status"]["ErrorType"] = e
         result["Status"]["ErrorDetail"] = d
         print(json.dumps(result, indent=2))
         sys.exit(0)
 
-    host, port, e, d = oem_get_host_and_port(oem_conn, db_name)
-    result["OEM"]["Primaire"]["host"] = host
-    result["OEM"]["Primaire"]["port"] = port
-
-    ora_version, e2, d2 = oem_get_oracle_version(oem_conn, db_name)
-    if not e2:
-        result["OEM"]["Primaire"]["oracle_version"] = ora_version
+    host = profile["host"]
+    for k in ("host", "port", "oracle_version", "type", "cluster", "rac_database"):
+        result["OEM"]["Primaire"][k] = profile[k]
     # ------------------------------------------------
     # 2) Résolution réseau (CNAME + SCAN)
     # ------------------------------------------------
@@ -97,4 +107,7 @@ if __name__ == "__main__":
         result["OEM"]["Primaire"]["scan"] = block.get("scan")
         result["Status"]["Valid"] = True
 
+    if id_cache:
+        id_cache.save()
+
     print(json.dumps(result, indent=2))
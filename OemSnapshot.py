@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# OemSnapshot.py — export du referentiel OEM vers un snapshot local
+#   -sync : synchro incrementale du snapshot existant (cibles chargees
+#           depuis le dernier watermark + suppressions), export complet
+#           si le fichier n'existe pas encore ou si le dernier export
+#           complet depasse OEM_SNAPSHOT_FULL_EVERY
+
+import os
+import sys
+
+from Lib.io_common import load_main_conf
+from Lib.oem_session import open_oem_session
+from Lib.oem_snapshot import export_oem_snapshot, sync_oem_snapshot, save_snapshot, read_snapshot
+from Lib.oem_snapshot import full_every_option
+
+DEFAULT_FILE = "Data/oem_snapshot.json"
+
+# ------------------------------------------------
+def usage():
+    print("Usage: python OemSnapshot.py [-sync] [SNAPSHOT_FILE]")
+    sys.exit(1)
+
+# ------------------------------------------------
+if __name__ == "__main__":
+
+    args = sys.argv[1:]
+    sync = "-sync" in args
+    args = [a for a in args if a != "-sync"]
+    if len(args) > 1 or (args and args[0].startswith("-")):
+        usage()
+
+    conf, ce, cd = load_main_conf()
+    if ce:
+        print("Configuration error: %s" % ce)
+        print(cd)
+        sys.exit(1)
+
+    path = (args and args[0]) or conf.get("OEM_SNAPSHOT_FILE") or DEFAULT_FILE
+
+    OEM_CONF = conf.get("OEM_CONF_FILE")
+    if not OEM_CONF:
+        print("OEM_CONF_FILE not defined in config")
+        sys.exit(1)
+
+    from AnalyseV3 import read_oem_conn
+    oem_conn = read_oem_conn(OEM_CONF)
+
+    if not oem_conn:
+        print("OEM connection string not found in OEM_CONF_FILE")
+        sys.exit(1)
+
+    session = open_oem_session(conf, oem_conn)[0]
+    if sync and os.path.isfile(path):
+        old, e, d = read_snapshot(path)
+        if e:
+            print("OEM snapshot error: %s | %s" % (e, d))
+            sys.exit(1)
+        snap, e, d = sync_oem_snapshot(oem_conn, old, session,
+                                       full_every_option(conf))
+    else:
+        snap, e, d = export_oem_snapshot(oem_conn, session)
+    if e:
+        print("OEM snapshot error: %s | %s" % (e, d))
+        sys.exit(1)
+
+    save_snapshot(path, snap)
+    print("OEM snapshot: %s | databases=%d clusters=%d | CapturedAt=%s" % (
+        path, len(snap["databases"]), len(snap["clusters"]), snap["CapturedAt"]))
+    ls = snap["LastSync"]
+    line = "OEM snapshot sync: %s | %.1fs | rows=%d" % (
+        ls["Mode"], ls["DurationSec"], ls["Rows"])
+    if ls["Mode"] == "incremental":
+        line += " | changed=%d deleted=%d" % (ls["Changed"], ls["Deleted"])
+    print(line)
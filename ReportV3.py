@@ -456,6 +456,7 @@ def show_object(o, debug=False):
 
         if key[0] == "OEM":
             rows.insert(1, ("Port", block.get("port")))
+            rows.insert(2, ("Version", block.get("oracle_version")))
 
         print_table(rows)
 
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Tests/fake_bin.py
+#
+# Faux executables pour les tests (sqlplus, ssh...) : script shell ecrit
+# dans un repertoire temporaire mis en tete du PATH le temps de l'appel.
+# "%(dir)s" dans le script -> repertoire du faux executable (fichiers de
+# trace : appels, logins, payload...)
+
+import os
+import shutil
+import tempfile
+
+
+def with_fake_bin(name, script, fn, bindir=None):
+    """
+    Ecrit bindir/name, execute fn(bindir) avec bindir en tete du PATH,
+    restaure le PATH. bindir absent -> repertoire temporaire supprime a la fin
+    Retourne le resultat de fn
+    """
+    own = bindir is None
+    if own:
+        bindir = tempfile.mkdtemp()
+    path = os.path.join(bindir, name)
+    f = open(path, "w")
+    f.write(script % {"dir": bindir})
+    f.close()
+    os.chmod(path, 0o755)
+
+    old_path = os.environ.get("PATH", "")
+    os.environ["PATH"] = bindir + os.pathsep + old_path
+    try:
+        return fn(bindir)
+    finally:
+        os.environ["PATH"] = old_path
+        if own:
+            shutil.rmtree(bindir, True)
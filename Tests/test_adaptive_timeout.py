@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from Lib.adaptive_timeout import AdaptiveTimeouts, percentile
+
+
+def test_timeout_from_p99():
+    a = AdaptiveTimeouts(None, k=2.0, floor=1.0, ceiling=20.0, min_samples=5)
+
+    # a priori statique tant qu'il n'y a pas assez d'echantillons
+    assert a.timeout("ssh", "node1", 12) == 12
+
+    for v in (0.5, 0.6, 0.7, 0.8, 2.0):
+        a.observe("ssh", "node1", v)
+    assert a.timeout("ssh", "node1", 12) == 4.0
+    # cible froide : jamais sous l'a priori (p99 du type plus court)
+    assert a.timeout("ssh", "node2", 12) == 12
+
+    # cible lente : bornee par le plafond
+    for i in range(5):
+        a.observe("ssh", "slow", 15.0)
+    assert a.timeout("ssh", "slow", 12) == 20.0
+    # cible froide, type devenu lent : elargie au p99 du type
+    assert a.timeout("ssh", "node3", 12) == 20.0
+
+    # cible rapide : bornee par le plancher
+    for i in range(5):
+        a.observe("dns", "dns:system", 0.01)
+    assert a.timeout("dns", "dns:system", 8) == 1.0
+
+    assert percentile([3, 1, 2], 0.5) == 2
+    print("OK — timeout = p99 x k, clamped")
+
+
+def test_profile_persisted():
+    path = os.path.join(tempfile.mkdtemp(), "latency_profile.json")
+    a = AdaptiveTimeouts(path, k=3.0)
+    for i in range(10):
+        a.observe("ssh", "node1", 1.0)
+    a.save()
+
+    b = AdaptiveTimeouts(path, k=3.0)
+    assert b.load()[0] is True
+    assert b.timeout("ssh", "node1", 12) == 3.0
+
+    # echantillons d'un processus fils
+    b.clear_new()
+    c = AdaptiveTimeouts(None)
+    c.observe("sqlplus", "DB1", 2.0)
+    b.merge(c.new_samples())
+    assert b.kinds["sqlplus"] == [2.0]
+    print("OK — learned latencies reloaded as prior")
+
+
+if __name__ == "__main__":
+    test_timeout_from_p99()
+    test_profile_persisted()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from Lib.analyse_plan import locality_order, cname_cluster_of, build_plan, oem_hosts_by_id
+from Lib.cluster_inventory import ClusterInventory
+from Lib.resolver_run import RunResolver
+
+
+def test_locality_groups_rows_by_target():
+    by_id = {
+        1: ["a.test", "x.test"],
+        2: ["b.test"],
+        3: ["A.test."],
+        4: [],
+        5: ["node2.test"],
+        6: ["b.test"],
+        7: ["node1.test"],
+    }
+    ids = [1, 2, 3, 4, 5, 6, 7]
+
+    out, groups = locality_order(ids, by_id)
+    assert out == [1, 3, 2, 6, 4, 5, 7]
+    assert groups == 5
+
+    # cluster connu (inventaire / OEM) : noeuds du meme cluster regroupes
+    clusters = {"node1.test": "CLU1", "node2.test": "CLU1"}
+    out, groups = locality_order(ids, by_id, clusters.get)
+    assert out == [1, 3, 2, 6, 4, 5, 7]
+    assert groups == 4
+
+    out, groups = locality_order([7, 1, 5], by_id, clusters.get)
+    assert out == [7, 5, 1]
+    print("OK — rows grouped by host / cluster, first appearance order")
+
+
+def test_locality_by_memoised_cname():
+    # alias JDBC -> noeud (CNAME) ; l'inventaire ne connait que les noeuds
+    aliases = {"db1-vip.test": "node1.test", "db2-vip.test": "node2.test"}
+    calls = []
+
+    def fake_cname(host):
+        calls.append(host)
+        return aliases.get(host, host), None, None
+
+    def fake_bulk(hosts):
+        return dict((h, fake_cname(h)) for h in hosts)
+
+    r = RunResolver(cname_func=fake_cname, scan_func=lambda c: (None, None, None),
+                    bulk_cname_func=fake_bulk)
+    r.prime_cnames(["db1-vip.test", "db2-vip.test", "other.test"])
+    n = len(calls)
+
+    inv = ClusterInventory()
+    inv.add("node1.test", "CLU1", "clu1-scan.test")
+    inv.add("node2.test", "CLU1", "clu1-scan.test")
+    by_id = {1: ["db1-vip.test"], 2: ["other.test"], 3: ["DB2-VIP.test"]}
+    out, groups = locality_order([1, 2, 3], by_id, cname_cluster_of(r, [inv, None]))
+    assert out == [1, 3, 2]
+    assert groups == 2
+    # memo du resolver uniquement, aucune resolution supplementaire
+    assert len(calls) == n
+    print("OK — locality uses the memoised CNAME, not the JDBC alias")
+
+
+def test_plan_includes_oem_hosts():
+    jdbc = (u"jdbc:oracle:thin:@(DESCRIPTION="
+            u"(ADDRESS=(PROTOCOL=TCP)(HOST=%s)(PORT=1521))"
+            u"(CONNECT_DATA=(SERVICE_NAME=SRV)))")
+    rows = [
+        {"Databases": u"DB1", "Current connection string": jdbc % u"vip1.test",
+         "New connection string": jdbc % u"vip1.test"},
+        {"Databases": u"DB2", "Current connection string": jdbc % u"vip2.test",
+         "New connection string": jdbc % u"vip2.test"},
+        {"Databases": u"", "Current connection string": jdbc % u"vip3.test",
+         "New connection string": jdbc % u"vip3.test"},
+    ]
+    # profils charges en masse avant la phase 1
+    oem_map = {
+        u"DB1": {"host": u"node1.test"},
+        u"DB2": {"host": u"vip2.test"},
+    }
+    oem_hosts = oem_hosts_by_id(rows, [1, 2, 3], oem_map)
+    assert oem_hosts == {1: u"node1.test", 2: u"vip2.test"}
+
+    plan = build_plan(rows, [1, 2, 3], oem_hosts)
+    assert u"node1.test" in plan["hosts"]
+    assert plan["by_id"][1][-1] == u"node1.test"
+    # host OEM deja reference par le JDBC : une seule resolution
+    assert plan["hosts"] == [u"vip1.test", u"node1.test", u"vip2.test", u"vip3.test"]
+    assert oem_hosts_by_id(rows, [1, 2, 3], None) == {}
+    print("OK — OEM hosts from the bulk profiles are in the plan")
+
+
+if __name__ == "__main__":
+    test_locality_groups_rows_by_target()
+    test_locality_by_memoised_cname()
+    test_plan_includes_oem_hosts()
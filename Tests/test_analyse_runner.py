@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+from Lib.analyse_runner import run_threads, run_processes, parse_workers, ChildStats
+
+
+def test_run_threads_merges_in_item_order():
+    def slow_square(i):
+        time.sleep(random.random() * 0.01)
+        return i * i
+
+    seen = []
+    run_threads(range(1, 51), slow_square, 8, lambda i, r: seen.append((i, r)))
+
+    assert [i for i, r in seen] == range(1, 51)
+    assert seen[9] == (10, 100)
+    print("OK — results merged in id order")
+
+
+def test_run_threads_reraises_worker_error():
+    def boom(i):
+        if i == 7:
+            raise ValueError("row 7")
+        return i
+
+    try:
+        run_threads(range(1, 20), boom, 4, lambda i, r: None)
+    except ValueError:
+        pass
+    else:
+        assert False, "worker exception not propagated"
+    print("OK — worker exception propagated")
+
+
+def test_run_processes_chunks_and_single_writer():
+    seen = []
+    stats = []
+    run_processes(range(1, 41), lambda i: {"id": i, "sq": i * i}, 3,
+                  lambda i, r: seen.append(r),
+                  chunk_size=6,
+                  child_stats=lambda: {"rows": 1},
+                  on_stats=stats.append)
+
+    assert [o["id"] for o in seen] == range(1, 41)
+    assert seen[4]["sq"] == 25
+    assert len(stats) == 3
+    print("OK — process pool results merged in id order")
+
+
+def test_child_stats_components():
+    class Comp(object):
+        def __init__(self):
+            self.stats = {"n": 3}
+
+        def reset_stats(self):
+            self.stats = {"n": 0}
+
+        def merge_stats(self, other):
+            self.stats["n"] += (other or {}).get("n", 0)
+
+    a = Comp()
+    samples = []
+    st = ChildStats()
+    st.add_stats("a", a)
+    st.add_stats("none", None)
+    st.add("samples", lambda: None, lambda: [1, 2], samples.extend)
+
+    st.reset()
+    assert a.stats == {"n": 0}
+    a.stats["n"] = 2
+    snap = st.snapshot()
+    assert snap == {"a": {"n": 2}, "samples": [1, 2]}
+    st.merge(snap)
+    assert a.stats == {"n": 4}
+    assert samples == [1, 2]
+
+
+def test_parse_workers():
+    assert parse_workers(["-debug"]) == 1
+    assert parse_workers(["-workers=6"]) == 6
+    assert parse_workers(["-workers=abc"]) == 1
+    assert parse_workers(["-workers=0"]) == 1
+
+
+if __name__ == "__main__":
+    test_run_threads_merges_in_item_order()
+    test_run_threads_reraises_worker_error()
+    test_run_processes_chunks_and_single_writer()
+    test_child_stats_components()
+    test_parse_workers()
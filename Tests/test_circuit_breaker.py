@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import Lib.dns_backend as db
+from Lib.circuit_breaker import (
+    CircuitBreaker, set_circuit_breaker, OPEN, HALF_OPEN, CLOSED
+)
+
+
+def test_open_half_open_close():
+    cb = CircuitBreaker(threshold=3, cooldown=60)
+    key = "ssh:node1"
+
+    for i in range(3):
+        assert cb.allow(key, now=1000)[0] is True
+        cb.record(key, True, now=1000)
+    assert cb.targets[key]["state"] == OPEN
+
+    ok, e, d = cb.allow(key, now=1010)
+    assert ok is False and e == "CIRCUIT_OPEN" and "ssh:node1" in d
+
+    # cooldown ecoule : un seul appel d'essai
+    assert cb.allow(key, now=1061)[0] is True
+    assert cb.targets[key]["state"] == HALF_OPEN
+    assert cb.allow(key, now=1061)[0] is False
+
+    # essai en timeout -> OPEN, puis essai OK -> CLOSED
+    cb.record(key, True, now=1061)
+    assert cb.targets[key]["state"] == OPEN
+    assert cb.allow(key, now=1122)[0] is True
+    cb.record(key, False)
+    assert cb.targets[key]["state"] == CLOSED
+
+    st = cb.targets[key]
+    assert st["opens"] == 2 and st["rejected"] == 2
+    assert "opens=2" in cb.summary_lines()[0]
+    print("OK — breaker CLOSED -> OPEN -> HALF_OPEN -> CLOSED")
+
+
+def test_dns_short_circuit():
+    calls = []
+
+    def dead_dns(host, timeout_sec):
+        calls.append(host)
+        return None, "NSLOOKUP_TIMEOUT", "dns timeout for %s" % host
+
+    orig = db.BACKENDS["socket"]
+    db.BACKENDS["socket"] = dead_dns
+    set_circuit_breaker(CircuitBreaker(threshold=2, cooldown=600))
+    try:
+        db.set_dns_backend("socket")
+        res = [db.backend_resolve_cname("h%d" % i) for i in range(5)]
+    finally:
+        db.BACKENDS["socket"] = orig
+        set_circuit_breaker(CircuitBreaker())
+
+    assert calls == ["h0", "h1"]
+    assert [r[1] for r in res] == ["NSLOOKUP_TIMEOUT"] * 2 + ["CIRCUIT_OPEN"] * 3
+    print("OK — DNS calls short-circuited after consecutive timeouts")
+
+
+def test_half_open_probe_not_stuck():
+    def broken_dns(host, timeout_sec):
+        raise RuntimeError("resolver crashed")
+
+    cb = CircuitBreaker(threshold=1, cooldown=10)
+    cb.record("dns:x", True, now=100)
+
+    # essai autorise mais jamais conclu : libere apres un cooldown
+    assert cb.allow("dns:x", now=111)[0] is True
+    assert cb.allow("dns:x", now=112)[1] == "CIRCUIT_OPEN"
+    assert cb.allow("dns:x", now=122)[0] is True
+
+    # exception entre allow() et record() : essai libere tout de suite
+    orig = db.BACKENDS["socket"]
+    db.BACKENDS["socket"] = broken_dns
+    set_circuit_breaker(cb)
+    try:
+        db.set_dns_backend("socket")
+        cb.release("dns:system")
+        cb.record("dns:system", True)
+        cb.targets["dns:system"]["opened_at"] = 0
+        try:
+            db.backend_resolve_cname("h1")
+        except RuntimeError:
+            pass
+        assert cb.targets["dns:system"]["probing"] is False
+        assert cb.allow("dns:system")[0] is True
+    finally:
+        db.BACKENDS["socket"] = orig
+        set_circuit_breaker(CircuitBreaker())
+    print("OK — HALF_OPEN probe released on exception / after cooldown")
+
+
+if __name__ == "__main__":
+    test_open_half_open_close()
+    test_dns_short_circuit()
+    test_half_open_probe_not_stuck()
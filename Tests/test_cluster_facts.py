@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import Lib.cluster_facts as cf
+from Lib.cluster_facts import ClusterFacts, parse_facts, facts_script
+from Lib.circuit_breaker import CircuitBreaker, set_circuit_breaker, CLOSED
+
+# ------------------------------------------------------------
+# MOCK sortie du script composite
+# ------------------------------------------------------------
+
+FACTS_OUT = u"""@@SCAN
+SCAN name: appp0-scan.groupe.generali.fr., Network: 1
+Subnet IPv4: 10.1.1.0/255.255.255.0/eth0, static
+@@LISTENER
+Services Summary...
+Service "SRV_APP_M19GAWP0" has 1 instance(s).
+  Instance "M19GAWP01", status READY, has 1 handler(s) for this service...
+Service "M19GAWP0XDB" has 1 instance(s).
+@@SERVICES M19GAWP0
+Service name: SRV_APP_M19GAWP0
+Server pool:
+Service name: SRV_BATCH_M19GAWP0
+@@SERVICES M19XYZP0
+Service name: SRV_XYZ_M19XYZP0
+@@END
+"""
+
+CALLS = []
+
+def _sections_out(cmd):
+    # sortie limitee aux sections du script envoye
+    script = cmd[-1]
+    out = FACTS_OUT
+    if "srvctl config service" not in script:
+        out = out.split(u"@@SERVICES")[0] + u"@@END\n"
+    if "lsnrctl" not in script:
+        head, rest = out.split(u"@@LISTENER")
+        out = head + u"@@" + rest.split(u"@@", 1)[1]
+    return out
+
+def fake_run_cmd_u(cmd, timeout_sec, kind=None, target=None, observe=True):
+    CALLS.append(target)
+    if target == "down":
+        return 255, u"", u"ssh: connect to host down port 22: Connection refused"
+    return 0, _sections_out(cmd), u""
+
+
+def test_parse_sections():
+    rec = parse_facts(FACTS_OUT, "node1")
+    assert rec["complete"] is True
+    assert rec["scan"] == (u"appp0-scan.groupe.generali.fr", None, None)
+    assert rec["databases"]["M19GAWP0"] == [u"SRV_APP_M19GAWP0", u"SRV_BATCH_M19GAWP0"]
+    assert rec["listener_services"] == [u"SRV_APP_M19GAWP0", u"M19GAWP0XDB"]
+    print("OK — composite output parsed into one record")
+
+
+def test_one_round_trip_per_node():
+    orig = cf.run_cmd_u
+    cf.run_cmd_u = fake_run_cmd_u
+    del CALLS[:]
+    try:
+        facts = ClusterFacts()
+        assert facts.scan("node1")[0] == u"appp0-scan.groupe.generali.fr"
+        assert u"SRV_APP_M19GAWP0" in facts.listener_services("NODE1.")[0]
+        assert facts.services("node1", "m19gawp0")[0][1] == u"SRV_BATCH_M19GAWP0"
+        # base d'un autre cluster : aucun service (pas ceux des autres bases)
+        assert facts.services("node1", "UNKNOWN")[0] == []
+        assert len(facts.services("node1")[0]) == 3
+
+        v, e, d = facts.scan("down")
+        assert v is None and e == "SRVCTL_ERROR" and "refused" in d
+        facts.listener_services("down")
+
+        assert CALLS == ["node1", "down"]
+        assert facts.stats == {"collected": 1, "hits": 5, "errors": 1}
+    finally:
+        cf.run_cmd_u = orig
+    print("OK — one SSH round-trip per node, record reused")
+
+
+def test_timeout_keeps_scan_section():
+    partial = FACTS_OUT.split(u"Service name: SRV_XYZ")[0]
+    cb = CircuitBreaker(threshold=1, cooldown=600)
+    set_circuit_breaker(cb)
+
+    def slow_run_cmd_u(cmd, timeout_sec, kind=None, target=None, observe=True):
+        if target == "stuck":
+            return cf.RC_TIMEOUT, u"@@SCAN\nSCAN name: stuck-scan", u""
+        return cf.RC_TIMEOUT, partial, u""
+
+    orig = cf.run_cmd_u
+    cf.run_cmd_u = slow_run_cmd_u
+    try:
+        facts = ClusterFacts()
+        # SCAN arrive avant le timeout : toujours resolu
+        assert facts.scan("big")[0] == u"appp0-scan.groupe.generali.fr"
+        assert facts.services("big", "M19GAWP0")[0] == \
+            [u"SRV_APP_M19GAWP0", u"SRV_BATCH_M19GAWP0"]
+        # listener emis avant la boucle par base : recu
+        assert facts.listener_services("big")[0] == [u"SRV_APP_M19GAWP0", u"M19GAWP0XDB"]
+        # section non recue : timeout pour l'appelant
+        assert facts.services("big", "M19XYZP0")[1] == "SRVCTL_TIMEOUT"
+        # SCAN recu en entier : noeud sain pour le disjoncteur
+        assert cb.targets["ssh:big"]["state"] == CLOSED
+        assert cb.targets["ssh:big"]["fails"] == 0
+
+        # section SCAN elle-meme tronquee : timeout (echec compte)
+        assert facts.scan("stuck")[1] == "SRVCTL_TIMEOUT"
+        assert cb.targets["ssh:stuck"]["fails"] == 1
+    finally:
+        cf.run_cmd_u = orig
+        set_circuit_breaker(CircuitBreaker())
+    print("OK — partial output kept on timeout, SCAN still resolved")
+
+
+def test_sections_on_demand():
+    script = facts_script([u"SCAN"])
+    assert "srvctl config scan" in script
+    assert "lsnrctl" not in script and "srvctl config service" not in script
+    full = facts_script()
+    # SCAN et listener avant la boucle par base
+    assert full.index("@@SCAN") < full.index("@@LISTENER") < full.index("@@SERVICES")
+
+    orig = cf.run_cmd_u
+    cf.run_cmd_u = fake_run_cmd_u
+    del CALLS[:]
+    try:
+        facts = ClusterFacts(sections=[u"SCAN"])
+        assert facts.scan("node1")[0] == u"appp0-scan.groupe.generali.fr"
+        assert facts.scan("node1")[1] is None
+        assert CALLS == ["node1"]
+        # section non collectee : nouvel aller-retour, une seule fois
+        assert u"M19GAWP0XDB" in facts.listener_services("node1")[0]
+        assert facts.services("node1", "M19XYZP0")[0] == [u"SRV_XYZ_M19XYZP0"]
+        assert facts.listener_services("node1")[1] is None
+        assert facts.scan("node1")[1] is None
+        assert CALLS == ["node1", "node1", "node1"]
+    finally:
+        cf.run_cmd_u = orig
+    print("OK — SCAN-only collection, other sections on demand")
+
+
+if __name__ == "__main__":
+    test_parse_sections()
+    test_one_round_trip_per_node()
+    test_timeout_keeps_scan_section()
+    test_sections_on_demand()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import tempfile
+
+from Lib.cluster_inventory import ClusterInventory, open_cluster_inventory
+from Lib.cluster_inventory import open_oem_scan_source
+from Lib import jdbc_flow_v2
+from fake_bin import with_fake_bin
+
+CSV = """node;cluster;scan
+node1.example.com;CLU1;clu1-scan.example.com
+node2.example.com;CLU1;clu1-scan.example.com
+"""
+
+
+def _file(name, data):
+    path = os.path.join(tempfile.mkdtemp(), name)
+    open(path, "wb").write(data.encode("utf-8"))
+    return path
+
+
+def test_inventory_formats():
+    inv, e, d = open_cluster_inventory({"CLUSTER_INVENTORY_FILE": _file("inv.csv", CSV)})
+    assert e is None
+    assert inv.lookup("NODE1.example.com.") == ("clu1-scan.example.com", None, None)
+    # nom court
+    assert inv.lookup("node2") == ("clu1-scan.example.com", None, None)
+    assert inv.cluster_of("node2.example.com") == "CLU1"
+    assert inv.lookup("node9.example.com") is None
+    assert inv.stats == {"hits": 2, "misses": 1, "mismatches": 0}
+
+    js = ClusterInventory()
+    doc = {"clusters": [{"name": "CLU2", "scan": "clu2-scan",
+                         "nodes": ["node3.example.com", "node4.example.com"]}]}
+    assert js.load(_file("inv.json", json.dumps(doc))) == (True, None, 2)
+    assert js.lookup("node4.example.com")[0] == "clu2-scan"
+
+    assert open_cluster_inventory({"CLUSTER_INVENTORY_FILE": "/nonexistent.csv"})[1] == \
+        "INVENTORY_ERROR"
+    print("OK — inventory indexed from CSV / JSON")
+
+
+def test_inventory_before_ssh():
+    inv = ClusterInventory()
+    inv.add("node1.example.com", "CLU1", "clu1-scan")
+
+    ssh = []
+
+    def fake_ssh(cname):
+        ssh.append(cname)
+        if cname.startswith("down"):
+            return None, "SRVCTL_ERROR", "ssh: connection refused"
+        if cname.startswith("node2"):
+            return "CLU2-SCAN.example.com", None, None
+        return "ssh-scan", None, None
+
+    saved = jdbc_flow_v2._ssh_srvctl_scan
+    jdbc_flow_v2._ssh_srvctl_scan = fake_ssh
+    jdbc_flow_v2.set_scan_sources([inv])
+    try:
+        assert jdbc_flow_v2.srvctl_config_scan("node1.example.com")[0] == "clu1-scan"
+        assert jdbc_flow_v2.scan_source("node1.example.com") == "INVENTORY"
+        assert jdbc_flow_v2.srvctl_config_scan("node7.example.com")[0] == "ssh-scan"
+        assert jdbc_flow_v2.scan_source("node7.example.com") == "SSH"
+        assert ssh == ["node7.example.com"]
+
+        # verification : srvctl quand meme, divergence comptee
+        inv.verify = True
+        assert jdbc_flow_v2.srvctl_config_scan("node1.example.com")[0] == "ssh-scan"
+        assert inv.stats["mismatches"] == 1
+
+        # meme SCAN a la casse pres : pas de divergence
+        inv.add("node2.example.com", "CLU2", "clu2-scan.example.com")
+        jdbc_flow_v2.srvctl_config_scan("node2.example.com")
+        assert inv.stats["mismatches"] == 1
+
+        # SSH KO : le SCAN connu de l'inventaire reste la reponse
+        inv.add("down.example.com", "CLU3", "clu3-scan")
+        assert jdbc_flow_v2.srvctl_config_scan("down.example.com") == \
+            ("clu3-scan", None, None)
+        assert jdbc_flow_v2.scan_source("down.example.com") == "INVENTORY"
+    finally:
+        jdbc_flow_v2.set_scan_sources(None)
+        jdbc_flow_v2._ssh_srvctl_scan = saved
+    print("OK — SSH only for nodes missing from the inventory")
+
+
+# MOCK sqlplus : referentiel OEM host|cluster|scan, appels comptes
+FAKE_SQLPLUS = """#!/bin/sh
+cat > /dev/null
+echo x >> "%(dir)s/calls"
+echo "node1.example.com|CLU1|clu1-scan.example.com"
+echo "node2.example.com|CLU1|clu1-scan.example.com"
+echo "lonely.example.com|CLU2|"
+"""
+
+
+def test_oem_cluster_scans_once_per_run():
+    def run(bindir):
+        calls = os.path.join(bindir, "calls")
+        src, e, d = open_oem_scan_source({}, "user/pwd@oem")
+        assert e is None
+        assert src.name == "OEM"
+        assert len(src.nodes) == 2
+        for h in ("node1.example.com", "node2", "node1.example.com"):
+            assert src.lookup(h)[0] == "clu1-scan.example.com"
+        assert src.lookup("lonely.example.com") is None
+        assert len(open(calls).read().splitlines()) == 1
+
+        assert open_oem_scan_source({"OEM_SCAN_SOURCE": "0"}, "user/pwd@oem")[0] is None
+        assert open_oem_scan_source({}, None)[0] is None
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    print("OK — OEM host -> SCAN loaded in one query")
+
+
+if __name__ == "__main__":
+    test_inventory_formats()
+    test_inventory_before_ssh()
+    test_oem_cluster_scans_once_per_run()
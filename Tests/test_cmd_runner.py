@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from Lib.cmd_runner import run_cmd, run_cmd_u, run_many, LatencyStats, RC_TIMEOUT, RC_SPAWN_ERROR
+
+
+def test_large_output_and_stdin():
+    # plus que la taille d'un pipe (64k) dans les deux sens
+    payload = "x" * 300000
+    rc, out, err = run_cmd(["cat"], 10, stdin_data=payload, kind="cat")
+    assert rc == 0
+    assert len(out) == 300000
+
+    rc, out, err = run_cmd_u(["sh", "-c", "echo ok; echo ko >&2; exit 3"], 10)
+    assert rc == 3 and out.strip() == u"ok" and err.strip() == u"ko"
+    print("OK — stdout / stderr drained, stdin streamed")
+
+
+def test_timeout_and_spawn_error():
+    t0 = time.time()
+    rc, out, err = run_cmd(["sleep", "5"], 0.3)
+    assert rc == RC_TIMEOUT
+    assert time.time() - t0 < 2
+
+    rc, out, err = run_cmd(["/no/such/binary"], 5)
+    assert rc == RC_SPAWN_ERROR and err
+    print("OK — timeout rc=124 / spawn error rc=127")
+
+
+def test_run_many_parallel():
+    specs = [{"cmd": ["sh", "-c", "sleep 0.3; echo %d" % i]} for i in range(5)]
+    t0 = time.time()
+    res = run_many(specs, 10)
+    assert time.time() - t0 < 1.2
+    assert [r[1].strip() for r in res] == ["0", "1", "2", "3", "4"]
+    print("OK — children supervised by a single loop")
+
+
+def test_latency_merge():
+    a = LatencyStats()
+    b = LatencyStats()
+    a.record("ssh", "n1", 0.5, 0)
+    b.record("ssh", "n2", 1.5, RC_TIMEOUT)
+    a.merge(b.snapshot())
+    k = a.kinds["ssh"]
+    assert k["count"] == 2 and k["max"] == 1.5 and k["timeouts"] == 1
+    assert a.summary_lines()[0].strip().startswith("cmd ssh")
+
+
+if __name__ == "__main__":
+    test_large_output_and_stdin()
+    test_timeout_and_spawn_error()
+    test_run_many_parallel()
+    test_latency_merge()
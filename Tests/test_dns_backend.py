@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+import Lib.dns_backend as db
+from Lib.dns_backend import cname_socket, cname_nslookup, set_dns_backend, get_dns_backend
+
+# ------------------------------------------------------------
+# MOCK nslookup (sortie localisee FR)
+# ------------------------------------------------------------
+
+NSLOOKUP_FR = u"""Serveur :   dns1.groupe.generali.fr
+Address:  10.0.0.1
+
+Nom :    node1.groupe.generali.fr
+Address:  10.1.1.1
+Aliases:  appp0db.groupe.generali.fr
+"""
+
+def fake_run_cmd(cmd, timeout_sec, kind=None, target=None):
+    if cmd[-1].startswith("dead"):
+        return 0, u"*** dns1 ne parvient pas a trouver dead : Non-existent domain", u""
+    return 0, NSLOOKUP_FR, u""
+
+
+def test_backends_share_contract():
+    orig = db.run_cmd_u
+    db.run_cmd_u = fake_run_cmd
+    try:
+        assert cname_nslookup("appp0db") == (u"node1.groupe.generali.fr", None, None)
+        v, e, d = cname_nslookup("deadhost")
+        assert v is None and e == "CNAME_NOT_FOUND"
+    finally:
+        db.run_cmd_u = orig
+
+    v, e, d = cname_socket("localhost")
+    assert e is None and v
+
+    v, e, d = cname_socket("no-such-host.invalid", 3)
+    assert v is None and e in ("CNAME_NOT_FOUND", "NSLOOKUP_TIMEOUT")
+
+    print("OK — socket / nslookup backends return (value, err_type, err_detail)")
+
+
+def test_backend_selection():
+    ok, e, d = set_dns_backend("bogus")
+    assert ok is False and e == "DNS_BACKEND_UNKNOWN"
+
+    assert set_dns_backend("nslookup")[0] is True
+    assert get_dns_backend() == "nslookup"
+    assert set_dns_backend(None)[0] is True
+    assert get_dns_backend() == "socket"
+
+    print("OK — DNS_BACKEND selection")
+
+
+def test_temporary_failure_not_negative():
+    from Lib.identity_cache import IdentityCache, KIND_CNAME
+    from Lib.resolver_run import RunResolver
+
+    def fake_gethostbyname_ex(host, timeout_sec):
+        if host.startswith("again"):
+            return None, socket.gaierror(socket.EAI_AGAIN, "Temporary failure"), False
+        if host.startswith("fail"):
+            return None, socket.herror(2, "Host name lookup failure"), False
+        return None, socket.gaierror(socket.EAI_NONAME, "Name or service not known"), False
+
+    orig = db.gethostbyname_ex_timeout
+    db.gethostbyname_ex_timeout = fake_gethostbyname_ex
+    try:
+        assert cname_socket("again.test")[1] == "DNS_TEMP_FAILURE"
+        assert cname_socket("fail.test")[1] == "DNS_TEMP_FAILURE"
+        assert cname_socket("nope.test")[1] == "CNAME_NOT_FOUND"
+
+        # ni cache negatif...
+        ic = IdentityCache(None)
+        ic.put_error(KIND_CNAME, "again.test", "DNS_TEMP_FAILURE", "x")
+        ic.put_error(KIND_CNAME, "nope.test", "CNAME_NOT_FOUND", "x")
+        assert ic.get(KIND_CNAME, "again.test") is None
+        assert ic.get(KIND_CNAME, "nope.test") is not None
+
+        # ... ni memo du run : redemande a l'appel suivant
+        calls = []
+
+        def cname(host):
+            calls.append(host)
+            return cname_socket(host)
+
+        r = RunResolver(cname_func=cname, bulk_cname_func=lambda hs: {})
+        r.resolve_cname("again.test")
+        r.resolve_cname("again.test")
+        r.resolve_cname("nope.test")
+        r.resolve_cname("nope.test")
+        assert calls == ["again.test", "again.test", "nope.test"]
+    finally:
+        db.gethostbyname_ex_timeout = orig
+    print("OK — EAI_AGAIN / TRY_AGAIN: transient, not negative-cached")
+
+
+def test_wire_backends_use_timeout():
+    from Lib.adaptive_timeout import AdaptiveTimeouts
+    from Lib.cmd_runner import set_adaptive_timeouts
+
+    seen = []
+
+    def fake_bulk(hosts, **kw):
+        seen.append(kw["timeout_sec"])
+        return dict((h, (h, None, None)) for h in hosts)
+
+    orig = db.dns_wire.resolve_cname_bulk
+    db.dns_wire.resolve_cname_bulk = fake_bulk
+    at = AdaptiveTimeouts(k=3, floor=0.01, min_samples=1)
+    at.observe("dns", "dns:system", 0.1)
+    try:
+        # budget par host reparti sur les tentatives (retries=2)
+        db.cname_wire("a.test", 0.9)
+        db.cname_hedged("a.test", 0.9)
+        # DNS_TIMEOUT reste le plafond par tentative
+        db.cname_wire("a.test", 30)
+        assert [round(t, 3) for t in seen] == [0.3, 0.3, 2.0]
+
+        # timeout appris p99 x k = 0.3 s -> 0.1 s par tentative
+        del seen[:]
+        set_adaptive_timeouts(at)
+        for name in ("wire", "hedged"):
+            set_dns_backend(name)
+            db.backend_resolve_cname("a.test")
+            db.backend_resolve_cname_bulk(["a.test", "b.test"])
+        assert [round(t, 3) for t in seen] == [0.1] * 4
+    finally:
+        set_adaptive_timeouts(None)
+        set_dns_backend(None)
+        db.dns_wire.resolve_cname_bulk = orig
+    print("OK — wire / hedged honour timeout_sec (adaptive)")
+
+
+if __name__ == "__main__":
+    test_backends_share_contract()
+    test_backend_selection()
+    test_temporary_failure_not_negative()
+    test_wire_backends_use_timeout()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Client DNS wire contre un petit serveur DNS local (stub UDP)
+
+import socket
+import struct
+import threading
+import time
+
+from Lib import dns_wire
+from Lib.dns_wire import resolve_cname_bulk, read_name
+
+# ------------------------------------------------------------
+# STUB DNS SERVER
+#   appN.test   CNAME nodeN.test ; nodeN.test A 10.0.0.N
+#   nodeN.test  A 10.0.0.N
+#   dead.test   NXDOMAIN
+#   slow.test   1ere requete ignoree (retry), puis CNAME node1.test
+# ------------------------------------------------------------
+
+def _encode(name):
+    out = ""
+    for l in name.split("."):
+        out += chr(len(l)) + l
+    return out + "\0"
+
+def _answer(qid, qname, rcode, records):
+    hdr = struct.pack("!HHHHHH", qid, 0x8180 | rcode, 1, len(records), 0, 0)
+    q = _encode(qname) + struct.pack("!HH", 1, 1)
+    body = ""
+    for i, (owner, rtype, rdata) in enumerate(records):
+        # owner du 1er enregistrement compresse vers la question (offset 12)
+        o = "\xc0\x0c" if i == 0 else _encode(owner)
+        body += o + struct.pack("!HHIH", rtype, 1, 60, len(rdata)) + rdata
+    return hdr + q + body
+
+class StubDns(object):
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.seen_slow = 0
+        self.queries = 0
+        self.stop = False
+        self.t = threading.Thread(target=self.run)
+        self.t.setDaemon(True)
+        self.t.start()
+
+    def run(self):
+        self.sock.settimeout(0.2)
+        while not self.stop:
+            try:
+                data, src = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            self.queries += 1
+            qid = struct.unpack("!H", data[:2])[0]
+            qname, _ = read_name(data, 12)
+            qname = str(qname.lower())
+
+            if qname == "dead.test":
+                self.sock.sendto(_answer(qid, qname, 3, []), src)
+                continue
+            if qname == "slow.test":
+                self.seen_slow += 1
+                if self.seen_slow == 1:
+                    continue
+                target = "node1.test"
+            elif qname.startswith("app"):
+                target = "node%s.test" % qname[3:].split(".")[0]
+            else:
+                target = None
+
+            records = []
+            if target:
+                records.append((qname, 5, _encode(target)))
+                records.append((target, 1, socket.inet_aton("10.0.0.1")))
+            else:
+                records.append((qname, 1, socket.inet_aton("10.0.0.2")))
+            self.sock.sendto(_answer(qid, qname, 0, records), src)
+
+    def close(self):
+        self.stop = True
+        self.t.join(1)
+        self.sock.close()
+
+
+def test_bulk_cname_against_stub_server():
+    srv = StubDns()
+    try:
+        hosts = ["app%d.test" % i for i in range(500)]
+        hosts += ["node7.test", "dead.test", "slow.test", "short"]
+
+        t0 = time.time()
+        res = resolve_cname_bulk(hosts, nameserver="127.0.0.1", port=srv.port,
+                                 timeout_sec=0.3, retries=2, search=["test"])
+        elapsed = time.time() - t0
+
+        assert res["app42.test"] == (u"node42.test", None, None)
+        assert res["node7.test"] == (u"node7.test", None, None)
+        assert res["dead.test"][1] == "CNAME_NOT_FOUND"
+        assert res["slow.test"] == (u"node1.test", None, None)
+        # nom court complete par la liste search
+        assert res["short"] == (u"short.test", None, None)
+
+        assert len(res) == len(hosts)
+        print("OK — %d lookups in %.3fs (%.0f/s)" % (
+            len(hosts), elapsed, len(hosts) / max(elapsed, 0.001)))
+    finally:
+        srv.close()
+
+
+def test_timeout_contract():
+    # port sans serveur -> NSLOOKUP_TIMEOUT apres retries
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    try:
+        v, e, d = dns_wire.resolve_cname("app1.test", nameserver="127.0.0.1",
+                                         port=port, timeout_sec=0.05, retries=1,
+                                         search=[])
+        assert v is None
+        assert e == "NSLOOKUP_TIMEOUT"
+    finally:
+        s.close()
+    print("OK — timeout after retries")
+
+
+def test_hedged_query_to_secondary():
+    # primaire muet, secondaire = stub : la requete couverte repond
+    mute = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    mute.bind(("127.0.0.1", 0))
+    srv = StubDns()
+    dns_wire.reset_stats()
+    try:
+        t0 = time.time()
+        res = resolve_cname_bulk(
+            ["app1.test", "app2.test"],
+            nameservers=["127.0.0.1:%d" % mute.getsockname()[1],
+                         "127.0.0.1:%d" % srv.port],
+            timeout_sec=2.0, retries=0, search=[], hedge_delay=0.05)
+        elapsed = time.time() - t0
+
+        assert res["app1.test"] == (u"node1.test", None, None)
+        assert res["app2.test"] == (u"node2.test", None, None)
+        # pas d'attente du timeout du primaire (2 s)
+        assert elapsed < 1.0
+        assert dns_wire.STATS["hedges"] == 2
+        assert dns_wire.STATS["hedge_wins"] == 2
+    finally:
+        srv.close()
+        mute.close()
+    print("OK — hedged query answered by secondary in %.3fs" % elapsed)
+
+
+def test_answer_from_unknown_source_dropped():
+    # le serveur repond d'abord depuis une autre socket (source non
+    # configuree, meme id) avec une fausse chaine, puis normalement
+    srv = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    srv.bind(("127.0.0.1", 0))
+    other = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    other.bind(("127.0.0.1", 0))
+
+    def run():
+        data, src = srv.recvfrom(2048)
+        qid = struct.unpack("!H", data[:2])[0]
+        qname = str(read_name(data, 12)[0].lower())
+        other.sendto(_answer(qid, qname, 0, [
+            (qname, 5, _encode("evil.test")),
+            ("evil.test", 1, socket.inet_aton("10.6.6.6"))]), src)
+        time.sleep(0.05)
+        srv.sendto(_answer(qid, qname, 0, [
+            (qname, 5, _encode("node1.test")),
+            ("node1.test", 1, socket.inet_aton("10.0.0.1"))]), src)
+
+    t = threading.Thread(target=run)
+    t.setDaemon(True)
+    t.start()
+    dns_wire.reset_stats()
+    try:
+        res = resolve_cname_bulk(["app1.test"], nameserver="127.0.0.1",
+                                 port=srv.getsockname()[1], timeout_sec=1.0,
+                                 retries=0, search=[])
+        assert res["app1.test"] == (u"node1.test", None, None)
+        assert dns_wire.STATS["dropped"] == 1
+    finally:
+        t.join(1)
+        srv.close()
+        other.close()
+    print("OK — answer from unknown source dropped")
+
+
+if __name__ == "__main__":
+    test_bulk_cname_against_stub_server()
+    test_timeout_contract()
+    test_hedged_query_to_secondary()
+    test_answer_from_unknown_source_dropped()
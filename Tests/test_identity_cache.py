@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from Lib.identity_cache import IdentityCache, KIND_CNAME, KIND_SCAN
+
+
+def test_identity_cache_ttl_and_persistence():
+    path = os.path.join(tempfile.mkdtemp(), "identity_cache.json")
+
+    c = IdentityCache(path, {KIND_CNAME: 100, KIND_SCAN: 1000})
+    c.put(KIND_CNAME, "AppP0DB.groupe.generali.fr.", "node1.groupe.generali.fr", now=1000)
+    c.put(KIND_SCAN, "node1.groupe.generali.fr", "scan-db1", now=1000)
+    c.save()
+
+    c2 = IdentityCache(path, {KIND_CNAME: 100, KIND_SCAN: 1000})
+    ok, e, d = c2.load()
+    assert ok is True
+
+    # entree valide (cle normalisee)
+    hit = c2.get(KIND_CNAME, "appp0db.groupe.generali.fr", now=1050)
+    assert hit == ("node1.groupe.generali.fr", None, None)
+
+    # CNAME expire, SCAN toujours valide (TTL par type)
+    assert c2.get(KIND_CNAME, "appp0db.groupe.generali.fr", now=1200) is None
+    assert c2.get(KIND_SCAN, "node1.groupe.generali.fr", now=1200)[0] == "scan-db1"
+
+    assert c2.stats["hits"] == 2
+    assert c2.stats["expired"] == 1
+
+    print("OK — identity cache TTL per kind")
+
+
+def test_negative_cache_backoff():
+    c = IdentityCache(None, neg_ttl=100, neg_ttl_max=300)
+
+    c.put_error(KIND_SCAN, "node9", "SRVCTL_TIMEOUT", "srvctl timeout for node9", now=1000)
+    v, e, d = c.get(KIND_SCAN, "node9", now=1050)
+    assert v is None and e == "SRVCTL_TIMEOUT"
+    assert d.startswith("srvctl timeout for node9") and "[CACHED fails=1" in d
+    assert c.get(KIND_SCAN, "node9", now=1101) is None
+
+    # echecs consecutifs : 100 -> 200 -> 300 (plafond)
+    c.put_error(KIND_SCAN, "node9", "SRVCTL_TIMEOUT", "t", now=2000)
+    assert c.get(KIND_SCAN, "node9", now=2190)[1] == "SRVCTL_TIMEOUT"
+    c.put_error(KIND_SCAN, "node9", "SRVCTL_TIMEOUT", "t", now=3000)
+    c.put_error(KIND_SCAN, "node9", "SRVCTL_TIMEOUT", "t", now=4000)
+    assert c.entries[KIND_SCAN]["node9"]["ttl"] == 300
+
+    # un succes efface l'echec ; erreurs non transitoires jamais cachees
+    c.put(KIND_SCAN, "node9", "scan-db9", now=5000)
+    assert c.get(KIND_SCAN, "node9", now=5001) == ("scan-db9", None, None)
+    c.put_error(KIND_CNAME, "h1", "HOST_EMPTY", "x", now=5000)
+    assert c.get(KIND_CNAME, "h1", now=5001) is None
+
+    print("OK — negative cache with exponential backoff")
+
+
+def test_child_entries_merged_in_parent():
+    parent = IdentityCache(None)
+    parent.put(KIND_CNAME, "h1", "old.cname", now=1000)
+
+    # fils (-processes) : nouvelles entrees seulement
+    child = IdentityCache(None)
+    child.put(KIND_CNAME, "h1", "old.cname", now=1000)
+    child.clear_new()
+    child.put(KIND_CNAME, "H1", "new.cname", now=2000)
+    child.put_error(KIND_SCAN, "node9", "SRVCTL_TIMEOUT", "t", now=2000)
+    delta = child.new_entries()
+    assert len(delta["entries"]) == 2
+    assert delta["stats"]["writes"] == 1
+
+    parent.merge(delta)
+    assert parent.dirty
+    assert parent.get(KIND_CNAME, "h1", now=2001) == ("new.cname", None, None)
+    assert parent.get(KIND_SCAN, "node9", now=2001)[1] == "SRVCTL_TIMEOUT"
+    assert parent.stats["writes"] == 2
+
+    # entree plus ancienne que celle du parent : ignoree
+    parent.merge({"entries": [[KIND_CNAME, "h1", {"value": "stale", "ts": 10}]]})
+    assert parent.get(KIND_CNAME, "h1", now=2001)[0] == "new.cname"
+
+    print("OK — identity cache entries from child processes merged")
+
+
+if __name__ == "__main__":
+    test_identity_cache_ttl_and_persistence()
+    test_negative_cache_backoff()
+    test_child_entries_merged_in_parent()
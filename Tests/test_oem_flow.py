@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from Lib import oem_flow
+from Lib.oem_flow import oem_get_target_profile, oem_get_target_profiles, reset_profile_cache
+from fake_bin import with_fake_bin
+
+# MOCK sqlplus : profils (target|type|host|port|version|cluster|rac),
+# sauvegarde le script recu, compte les sessions
+FAKE_SQLPLUS = """#!/bin/sh
+cat > "%(dir)s/payload"
+echo x >> "%(dir)s/calls"
+echo "DB1|rac_database|host1.example.com|1521|19.0.0.0|CLU1|DB1_RAC"
+echo "DB2|oracle_database|host2.example.com|1522|12.2.0.1||"
+"""
+
+# MOCK sqlplus : une requete en erreur, rc=0 (pas de whenever sqlerror)
+FAKE_SQLPLUS_ORA = """#!/bin/sh
+cat > /dev/null
+echo "DB1|rac_database|host1.example.com|1521|19.0.0.0|CLU1|DB1_RAC"
+echo "ORA-03113: end-of-file on communication channel"
+"""
+
+
+def test_profiles_one_session_for_all_targets():
+    def run(bindir):
+        reset_profile_cache()
+        try:
+            m, e, d = oem_get_target_profiles(
+                "user/pwd@oem", ["DB1", "DB2", "DB1", "O'HARA", None], chunk_size=2)
+            assert e is None
+            assert m["DB1"]["host"] == "host1.example.com"
+            # absente du referentiel : meme reponse que la requete unitaire
+            assert m["O'HARA"]["host"] == "UNKNOWN_HOST"
+            assert len(m) == 3
+
+            assert len(open(os.path.join(bindir, "calls")).read().splitlines()) == 1
+            payload = open(os.path.join(bindir, "payload")).read()
+            # 3 cibles uniques, paquets de 2 -> 2 requetes dans la meme session
+            assert payload.count("group by") == 2
+            assert "in ('DB1', 'DB2')" in payload
+            assert "in ('O''HARA')" in payload
+            assert "like '%port%'" in payload
+        finally:
+            reset_profile_cache()
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    assert oem_get_target_profiles(None, ["DB1"])[1] == "OEM_CONN_EMPTY"
+    assert oem_get_target_profiles("user/pwd@oem", []) == ({}, None, None)
+    print("OK — one sqlplus session for every database of the run")
+
+
+def test_profiles_sqlplus_error_caches_nothing():
+    def run(bindir):
+        reset_profile_cache()
+        try:
+            m, e, d = oem_get_target_profiles("user/pwd@oem", ["DB1", "DB2"])
+            assert m is None
+            assert e == "OEM_SQLPLUS_ERROR"
+            assert d.startswith("ORA-03113")
+            # rien en cache : DB2 n'est pas memorisee UNKNOWN_HOST
+            assert oem_flow.PROFILE_CACHE == {}
+        finally:
+            reset_profile_cache()
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS_ORA, run)
+    print("OK — ORA- line in OEM output is an error, nothing cached")
+
+
+def test_target_profile_one_query_and_run_cache():
+    def run(bindir):
+        reset_profile_cache()
+        try:
+            p, e, d = oem_get_target_profile("user/pwd@oem", "DB1")
+            assert e is None
+            assert p == {
+                "target": "DB1", "type": "rac_database",
+                "host": "host1.example.com", "port": "1521",
+                "oracle_version": "19.0.0.0",
+                "cluster": "CLU1", "rac_database": "DB1_RAC",
+            }
+            payload = open(os.path.join(bindir, "payload")).read()
+            assert payload.count("group by") == 1
+            assert "in ('DB1')" in payload
+
+            # DB1 deja en cache : seules DB2 et NOPE sont demandees
+            m, e, d = oem_get_target_profiles("user/pwd@oem", ["DB1", "DB2", "NOPE"])
+            assert e is None
+            assert "in ('DB2', 'NOPE')" in open(os.path.join(bindir, "payload")).read()
+            assert m["DB2"]["port"] == "1522"
+            assert m["DB2"]["cluster"] is None
+            assert m["NOPE"]["host"] == "UNKNOWN_HOST"
+            assert m["NOPE"]["oracle_version"] == "UNKNOWN_VERSION"
+
+            # tout vient du cache : plus de sqlplus
+            m["DB1"]["host"] = "changed"
+            for t in ("DB1", "DB2", "NOPE"):
+                assert oem_get_target_profile("user/pwd@oem", t)[1] is None
+            assert oem_get_target_profile("user/pwd@oem", "DB1")[0]["host"] == \
+                "host1.example.com"
+            assert len(open(os.path.join(bindir, "calls")).read().splitlines()) == 2
+        finally:
+            reset_profile_cache()
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    assert oem_get_target_profile(None, "DB1")[1] == "OEM_CONN_EMPTY"
+    assert oem_get_target_profile("user/pwd@oem", None)[1] == "OEM_TARGET_EMPTY"
+    print("OK — OEM target profile in one query, cached for the run")
+
+
+if __name__ == "__main__":
+    test_profiles_one_session_for_all_targets()
+    test_profiles_sqlplus_error_caches_nothing()
+    test_target_profile_one_query_and_run_cache()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from Lib.oem_session import OemSession, open_oem_session
+from Lib.oem_flow import oem_get_host_and_port, oem_get_oracle_version
+from Lib.oem_flow import oem_get_target_profiles, reset_profile_cache
+from fake_bin import with_fake_bin
+
+# MOCK sqlplus interactif : une ligne de log par login, "prompt X" -> X
+FAKE_SQLPLUS = """#!/bin/sh
+echo login >> "%(dir)s/logins"
+while IFS= read -r line; do
+    case "$line" in
+        "prompt "*) echo "${line#prompt }";;
+        *"'&&TNAME'"*) echo "host1.example.com|19.0.0.0";;
+        *"target_name in ("*) echo "$line" | tr ',' '\\n' |
+            sed "s/[^']*'\\([^']*\\)'.*/\\1|oracle_database|host.example.com|1521|19.0.0.0||/";;
+        *SLOW*) sleep 5;;
+        *CRASH*) if [ -e "%(dir)s/crash" ]; then rm -f "%(dir)s/crash"; exit 1; fi
+                 echo "recovered";;
+    esac
+done
+"""
+
+
+def _logins(d):
+    return len(open(os.path.join(d, "logins")).read().splitlines())
+
+
+def test_one_login_for_many_queries():
+    def run(d):
+        s, e, dd = open_oem_session({}, "user/pwd@oem")
+        try:
+            for i in range(3):
+                h, v, e, dd = oem_get_host_and_port("user/pwd@oem", "DB%d" % i, s)
+                assert (h, v, e) == ("host1.example.com", "19.0.0.0", None)
+            assert oem_get_oracle_version("user/pwd@oem", "DB1", s)[0] == \
+                "host1.example.com|19.0.0.0"
+            assert _logins(d) == 1
+            assert s.stats["queries"] == 4
+        finally:
+            s.close()
+        assert s.proc is None
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    assert open_oem_session({"OEM_SESSION": "0"}, "user/pwd@oem")[0] is None
+    print("OK — one sqlplus login, results split on sentinel")
+
+
+def test_timeout_and_reconnect():
+    def run(d):
+        s = OemSession("user/pwd@oem", timeout_sec=0.5)
+        try:
+            rc, out, err = s.run("select SLOW from dual;")
+            assert rc == 124
+            assert s.proc is None
+
+            # session reouverte a la requete suivante
+            assert s.run("select 1 from dual;")[0] == 0
+            assert _logins(d) == 2
+
+            # sqlplus meurt pendant la requete : reconnexion + nouvel essai
+            open(os.path.join(d, "crash"), "w").close()
+            rc, out, err = s.run("select CRASH from dual;")
+            assert rc == 0
+            assert out.strip() == "recovered"
+            assert _logins(d) == 3
+            assert s.stats == {"logins": 3, "queries": 3, "timeouts": 1, "reconnects": 2}
+        finally:
+            s.close()
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    print("OK — per-query timeout, automatic reconnect")
+
+
+def test_large_in_list_no_deadlock():
+    # requete (stdin) et resultat (stdout) bien plus gros que les pipes :
+    # sqlplus ecrit pendant qu'on envoie encore la requete
+    def run(d):
+        s = OemSession("user/pwd@oem", timeout_sec=30)
+        reset_profile_cache()
+        try:
+            names = ["DATABASE_%06d" % i for i in range(10000)]
+            m, e, dd = oem_get_target_profiles("user/pwd@oem", names, session=s)
+            assert e is None, (e, dd)
+            assert len(m) == 10000
+            assert m["DATABASE_009999"]["host"] == "host.example.com"
+            assert s.stats["timeouts"] == 0 and _logins(d) == 1
+        finally:
+            reset_profile_cache()
+            s.close()
+
+    with_fake_bin("sqlplus", FAKE_SQLPLUS, run)
+    print("OK — large IN-list through the session, no pipe deadlock")
+
+
+if __name__ == "__main__":
+    test_one_login_for_many_queries()
+    test_timeout_and_reconnect()
+    test_large_in_list_no_deadlock()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+
+from Lib.oem_snapshot import export_oem_snapshot, sync_oem_snapshot, save_snapshot, \
+    open_oem_snapshot, read_snapshot, full_every_option, DEFAULT_FULL_EVERY
+from Lib import oem_flow
+from fake_bin import with_fake_bin
+
+# MOCK sqlplus : export en une passe (lignes D| et C|), appels comptes
+FAKE_SQLPLUS = """#!/bin/sh
+cat > /dev/null
+echo x >> "%(dir)s/calls"
+echo "W|2026-01-01 00:00:00"
+echo "D|DB1|host1.example.com|1521|19.0.0.0"
+echo "D|DB2|UNKNOWN_HOST|UNKNOWN_PORT|UNKNOWN_VERSION"
+echo "C|host1.example.com|CLU1|clu1-scan.example.com"
+echo "C|host9.example.com|CLU9|"
+"""
+
+# MOCK sqlplus : synchro incrementale (DB1 modifiee, DB2 et CLU9 supprimees,
+# CLU1 relu avec un nouveau membre, DB3 nouvelle)
+FAKE_SQLPLUS_SYNC = """#!/bin/sh
+cat > "%(dir)s/sync.sql"
+echo "W|2026-01-02 00:00:00"
+echo "D|DB1|host2.example.com|1522|19.0.0.0"
+echo "D|DB3|host3.example.com|1521|23.0.0.0"
+echo "C|host1.example.com|CLU1|clu1-scan.example.com"
+echo "C|host2.example.com|CLU1|clu1-scan.example.com"
+echo "N|DB1"
+echo "N|DB3"
+echo "K|CLU1"
+"""
+
+# MOCK sqlplus : synchro dont une requete echoue (rc=0, sortie partielle)
+FAKE_SQLPLUS_SYNC_ORA = """#!/bin/sh
+cat > /dev/null
+echo "W|2026-01-02 00:00:00"
+echo "D|DB1|host2.example.com|1522|19.0.0.0"
+echo "ORA-00904: \"C\".\"LAST_LOAD_TIME_UTC\": invalid identifier"
+echo "N|DB1"
+"""
+
+# MOCK sqlplus : export complet dont la requete clusters echoue (rc=0)
+FAKE_SQLPLUS_ORA = """#!/bin/sh
+cat > "%(dir)s/export.sql"
+echo "W|2026-01-01 00:00:00"
+echo "D|DB1|host1.example.com|1521|19.0.0.0"
+echo "SP2-0734: unknown command beginning \"sele\" - rest of line ignored."
+"""
+
+
+def _export(d, script=FAKE_SQLPLUS, snap=None, full_every=DEFAULT_FULL_EVERY):
+    def run(bindir):
+        if snap is not None:
+            return sync_oem_snapshot("user/pwd@oem", snap, full_every=full_every)
+        return export_oem_snapshot("user/pwd@oem")
+    return with_fake_bin("sqlplus", script, run, d)
+
+
+def test_export_and_offline_answers():
+    d = tempfile.mkdtemp()
+    try:
+        snap, e, dd = _export(d)
+        assert e is None
+        assert len(open(os.path.join(d, "calls")).read().splitlines()) == 1
+        assert snap["databases"]["DB1"] == {
+            "host": "host1.example.com", "port": "1521", "version": "19.0.0.0"}
+        assert snap["clusters"] == [["host1.example.com", "CLU1", "clu1-scan.example.com"]]
+        assert snap["CapturedAt"]
+        assert snap["Watermark"] == "2026-01-01 00:00:00"
+        assert snap["LastSync"]["Mode"] == "full"
+
+        path = os.path.join(d, "oem_snapshot.json")
+        save_snapshot(path, snap)
+        s, e, dd = open_oem_snapshot({"OEM_SNAPSHOT_FILE": path})
+        assert e is None
+
+        oem_flow.set_oem_snapshot(s)
+        try:
+            # aucun sqlplus : reponses depuis l'index, meme sans OEM_CONN
+            assert oem_flow.oem_get_host_and_port(None, "DB1") == \
+                ("host1.example.com", "1521", None, None)
+            assert oem_flow.oem_get_oracle_version(None, "DB1") == ("19.0.0.0", None, None)
+            assert oem_flow.oem_get_host_and_port(None, "NOPE") == \
+                ("UNKNOWN_HOST", "UNKNOWN_PORT", None, None)
+            oem_flow.reset_profile_cache()
+            m, e, dd = oem_flow.oem_get_target_profiles(None, ["DB1", "DB2"])
+            assert m["DB2"]["host"] == "UNKNOWN_HOST"
+            assert oem_flow.oem_get_cluster_scans(None)[0] == \
+                [("host1.example.com", "CLU1", "clu1-scan.example.com")]
+            oem_flow.reset_profile_cache()
+            p = oem_flow.oem_get_target_profile(None, "DB1")[0]
+            assert (p["host"], p["port"], p["oracle_version"], p["cluster"]) == \
+                ("host1.example.com", "1521", "19.0.0.0", "CLU1")
+        finally:
+            oem_flow.set_oem_snapshot(None)
+            oem_flow.reset_profile_cache()
+        assert len(open(os.path.join(d, "calls")).read().splitlines()) == 1
+        assert s.stats == {"hits": 5, "misses": 1}
+    finally:
+        shutil.rmtree(d, True)
+    print("OK — OEM answers served from the local snapshot")
+
+
+def test_stale_snapshot_detected():
+    d = tempfile.mkdtemp()
+    try:
+        path = os.path.join(d, "old.json")
+        save_snapshot(path, {"CapturedAt": "2020-01-01 00:00:00",
+                             "CapturedTs": int(time.time()) - 7200,
+                             "databases": {}, "clusters": []})
+        s, e, dd = open_oem_snapshot({"OEM_SNAPSHOT_MAX_AGE": "3600"}, path)
+        assert s is not None
+        assert e == "OEM_SNAPSHOT_STALE"
+        assert open_oem_snapshot({"OEM_SNAPSHOT_MAX_AGE": "0"}, path)[1] is None
+        assert open_oem_snapshot({}, os.path.join(d, "none.json"))[1] == "OEM_SNAPSHOT_MISSING"
+        assert open_oem_snapshot({})[0] is None
+    finally:
+        shutil.rmtree(d, True)
+
+
+def test_incremental_sync():
+    d = tempfile.mkdtemp()
+    try:
+        old = {"Watermark": "2026-01-01 00:00:00", "CapturedTs": 1,
+               "FullTs": int(time.time()) - 3600,
+               "databases": {
+                   "DB1": {"host": "host1.example.com", "port": "1521", "version": "19.0.0.0"},
+                   "DB2": {"host": "h", "port": "1521", "version": "12.2"},
+                   "DB4": {"host": "host4.example.com", "port": "1521", "version": "19.0.0.0"},
+               },
+               "clusters": [["host1.example.com", "CLU1", "old-scan.example.com"],
+                            ["host9.example.com", "CLU9", "clu9-scan.example.com"]]}
+        snap, e, dd = _export(d, FAKE_SQLPLUS_SYNC, old)
+        assert e is None
+
+        # requete bornee par le watermark (moins le recouvrement)
+        sql = open(os.path.join(d, "sync.sql")).read()
+        assert "last_load_time_utc >= to_date('2026-01-01 00:00:00'" in sql
+        # bases RAC comprises (meme filtre que les profils en direct),
+        # aussi dans la liste des noms : pas supprimees a tort
+        assert "d.target_type in ('oracle_database', 'rac_database')" in sql
+        assert "target_type in ('oracle_database', 'rac_database', 'cluster')" in sql
+
+        assert snap["Watermark"] == "2026-01-02 00:00:00"
+        assert snap["databases"]["DB1"]["host"] == "host2.example.com"
+        assert "DB3" in snap["databases"]
+        assert "DB2" not in snap["databases"]
+        # DB4 absente de la liste des noms (non relue) : supprimee aussi
+        assert "DB4" not in snap["databases"]
+        assert sorted(snap["clusters"]) == [
+            ["host1.example.com", "CLU1", "clu1-scan.example.com"],
+            ["host2.example.com", "CLU1", "clu1-scan.example.com"]]
+
+        ls = snap["LastSync"]
+        assert ls["Mode"] == "incremental"
+        assert ls["Rows"] == 8
+        assert ls["Changed"] == 3
+        assert ls["Deleted"] == 3
+        assert ls["DurationSec"] >= 0
+        assert snap["FullTs"] == old["FullTs"]
+
+        # snapshot sans watermark -> export complet
+        snap, e, dd = _export(d, FAKE_SQLPLUS, {"CapturedTs": 1, "databases": {}})
+        assert e is None and snap["LastSync"]["Mode"] == "full"
+        assert snap["FullTs"] >= old["FullTs"]
+
+        # dernier export complet trop ancien (proprietes / membres non
+        # suivis par LAST_LOAD_TIME_UTC) -> export complet
+        old["FullTs"] = int(time.time()) - 8 * 86400
+        snap, e, dd = _export(d, FAKE_SQLPLUS, old)
+        assert e is None and snap["LastSync"]["Mode"] == "full"
+        assert full_every_option({}) == 604800
+        assert full_every_option({"OEM_SNAPSHOT_FULL_EVERY": "0"}) == 0
+        # full_every=0 : incremental seulement
+        old["FullTs"] = None
+        snap, e, dd = _export(d, FAKE_SQLPLUS_SYNC, old, full_every=0)
+        assert e is None and snap["LastSync"]["Mode"] == "incremental"
+    finally:
+        shutil.rmtree(d, True)
+    print("OK — incremental OEM snapshot sync merges changes and deletions")
+
+
+def test_export_sqlplus_error_not_saved():
+    d = tempfile.mkdtemp()
+    try:
+        snap, e, dd = _export(d, FAKE_SQLPLUS_ORA)
+        assert snap is None
+        assert e == "OEM_SQLPLUS_ERROR"
+        assert dd.startswith("SP2-0734")
+        sql = open(os.path.join(d, "export.sql")).read()
+        assert "d.target_type in ('oracle_database', 'rac_database')" in sql
+    finally:
+        shutil.rmtree(d, True)
+    print("OK — ORA-/SP2- line in full export output: no snapshot")
+
+
+def test_sync_sqlplus_error_keeps_watermark():
+    d = tempfile.mkdtemp()
+    try:
+        old = {"Watermark": "2026-01-01 00:00:00", "CapturedTs": 1,
+               "FullTs": int(time.time()),
+               "databases": {"DB1": {"host": "host1.example.com", "port": "1521",
+                                     "version": "19.0.0.0"}},
+               "clusters": []}
+        path = os.path.join(d, "oem_snapshot.json")
+        save_snapshot(path, old)
+
+        snap, e, dd = _export(d, FAKE_SQLPLUS_SYNC_ORA, old)
+        assert snap is None
+        assert e == "OEM_SQLPLUS_ERROR"
+        assert dd.startswith("ORA-00904")
+        # rien d'ecrit : le prochain -sync repart du meme watermark
+        assert old["Watermark"] == "2026-01-01 00:00:00"
+        assert read_snapshot(path)[0]["Watermark"] == "2026-01-01 00:00:00"
+    finally:
+        shutil.rmtree(d, True)
+    print("OK — ORA- line in sync output: no snapshot, watermark unchanged")
+
+
+if __name__ == "__main__":
+    test_export_and_offline_answers()
+    test_stale_snapshot_detected()
+    test_incremental_sync()
+    test_export_sqlplus_error_not_saved()
+    test_sync_sqlplus_error_keeps_watermark()
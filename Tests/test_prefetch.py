@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from Lib.prefetch import Prefetcher, prefetch_options
+from Lib.resolver_run import RunResolver
+
+CALLS = {"cname": [], "scan": []}
+
+
+def fake_cname(host):
+    CALLS["cname"].append(host)
+    if host.startswith("node"):
+        return host, None, None
+    return "node-%s" % host, None, None
+
+
+def fake_scan(cname):
+    CALLS["scan"].append(cname)
+    return "scan-%s" % cname, None, None
+
+
+def _wait_ready(r, hosts):
+    for i in range(200):
+        if all([r.ready(h) for h in hosts]):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_window_warms_upcoming_rows():
+    CALLS["cname"] = []
+    CALLS["scan"] = []
+    r = RunResolver(cname_func=fake_cname, scan_func=fake_scan)
+    by_id = {1: ["h1"], 2: ["h2", "h1"], 3: ["h3"], 4: ["h4"]}
+    p = Prefetcher(r, by_id, [1, 2, 3, 4], window=2, workers=2)
+    p.start()
+    try:
+        # fenetre initiale : lignes 1 et 2
+        assert _wait_ready(r, ["h1", "h2"])
+        assert not r.ready("h3")
+
+        p.row_started(1)
+        assert _wait_ready(r, ["h3"])
+        assert not r.ready("h4")
+        p.row_started(2)
+        p.row_started(3)
+        p.row_started(4)
+    finally:
+        p.stop()
+
+    # chaque host une seule fois, memo partage avec la construction
+    assert sorted(CALLS["scan"]) == ["node-h1", "node-h2", "node-h3", "node-h4"]
+    assert r.resolve_scan("node-h3") == ("scan-node-h3", None, None)
+    assert len(CALLS["scan"]) == 4
+
+    assert p.stats["refs"] == 5
+    assert p.stats["ready"] >= 4
+    assert p.hit_rate() >= 0.8
+    assert p.stats["errors"] == 0
+    print("OK — look-ahead prefetch, hit rate %d%%" % int(p.hit_rate() * 100))
+
+
+def test_worker_errors_counted():
+    def boom(host):
+        raise IOError("dns down")
+    r = RunResolver(cname_func=boom, scan_func=fake_scan)
+    p = Prefetcher(r, {1: ["h1"], 2: ["h2"]}, [1, 2], window=2, workers=1)
+    p.start()
+    p.stop()
+    assert p.stats["queued"] == 2
+    assert p.stats["errors"] == 2
+    assert "errors=2" in p.summary_lines()[0]
+    print("OK — prefetch worker exceptions counted")
+
+
+def test_prefetch_options():
+    assert prefetch_options({})["window"] == 0
+    o = prefetch_options({"PREFETCH_WINDOW": "5", "PREFETCH_WORKERS": "0"})
+    assert o == {"window": 5, "workers": 1}
+    assert prefetch_options({"PREFETCH_WINDOW": "5"}, ["-prefetch=20"])["window"] == 20
+
+
+if __name__ == "__main__":
+    test_window_warms_upcoming_rows()
+    test_worker_errors_counted()
+    test_prefetch_options()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from Lib.resolver_run import RunResolver
+
+# ------------------------------------------------------------
+# MOCK DNS / SRVCTL (compte les appels reels)
+# ------------------------------------------------------------
+
+CALLS = {"cname": 0, "scan": 0}
+
+def fake_cname(host):
+    CALLS["cname"] += 1
+    if host.lower().startswith("dead"):
+        return None, "CNAME_NOT_FOUND", "No cname for %s" % host
+    return "node1.groupe.generali.fr", None, None
+
+def fake_scan(cname):
+    CALLS["scan"] += 1
+    return "scan-db1", None, None
+
+
+def test_resolver_memoizes_per_normalized_host():
+    CALLS["cname"] = 0
+    CALLS["scan"] = 0
+    r = RunResolver(cname_func=fake_cname, scan_func=fake_scan)
+
+    for h in ("APPP0DB.groupe.generali.fr", "appp0db.groupe.generali.fr.",
+              " appp0db.GROUPE.generali.fr "):
+        scan, e, d = r.resolve_scan(h)
+        assert scan == "scan-db1"
+        assert e is None
+
+    assert CALLS["cname"] == 1
+    assert CALLS["scan"] == 1
+    assert r.stats["cname_misses"] == 1
+    assert r.stats["cname_hits"] == 2
+    assert r.stats["scan_hits"] == 2
+
+    print("OK — one resolution per distinct host")
+
+
+def test_resolver_memoizes_errors():
+    CALLS["cname"] = 0
+    r = RunResolver(cname_func=fake_cname, scan_func=fake_scan)
+
+    for i in range(3):
+        cname, e, d = r.resolve_cname("deadhost")
+        assert cname is None
+        assert e == "CNAME_NOT_FOUND"
+
+    assert CALLS["cname"] == 1
+    print("OK — errors memoized for the run")
+
+
+def test_prime_resolves_unique_hosts_in_bulk():
+    CALLS["cname"] = 0
+    CALLS["scan"] = 0
+    bulk_calls = []
+
+    def fake_bulk(hosts):
+        bulk_calls.append(list(hosts))
+        out = {}
+        for h in hosts:
+            out[h] = fake_cname(h)
+        return out
+
+    r = RunResolver(cname_func=fake_cname, scan_func=fake_scan,
+                    bulk_cname_func=fake_bulk)
+    r.prime(["app1.test", "APP1.test", "app2.test", "deadhost"])
+
+    # 1 appel masse pour les hosts, 1 pour les CNAME, 1 srvctl par noeud
+    assert len(bulk_calls) == 2
+    assert len(bulk_calls[0]) == 3
+    assert CALLS["scan"] == 1
+
+    # phase objets : tout est deja en memoire
+    CALLS["cname"] = 0
+    scan, e, d = r.resolve_scan("app2.test")
+    cname, e2, d2 = r.resolve_cname("deadhost")
+    assert scan == "scan-db1"
+    assert e2 == "CNAME_NOT_FOUND"
+    assert CALLS["cname"] == 0      # aucun appel DNS hors prime
+    assert CALLS["scan"] == 1
+
+    print("OK — prime resolves unique hosts once")
+
+
+if __name__ == "__main__":
+    test_resolver_memoizes_per_normalized_host()
+    test_resolver_memoizes_errors()
+    test_prime_resolves_unique_hosts_in_bulk()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from Lib.retry_queue import is_transient, run_retry_queue
+from Lib.resolver_run import RunResolver
+
+
+def _obj(oid, cause, detail="scan resolution failed"):
+    return {"id": oid, "Status": {
+        "ErrorType": cause and "SCAN_ERROR" or None,
+        "ErrorCause": cause,
+        "ErrorDetail": cause and detail or None,
+    }}
+
+
+def test_is_transient():
+    assert is_transient(_obj(1, "SRVCTL_TIMEOUT"))
+    assert is_transient(_obj(1, "CIRCUIT_OPEN"))
+    assert not is_transient(_obj(1, "SCAN_NOT_FOUND"))
+    assert not is_transient(_obj(1, None))
+    # servi par le cache negatif : backoff du cache respecte
+    assert not is_transient(_obj(1, "NSLOOKUP_TIMEOUT", "x [CACHED fails=2 retry_after=...]"))
+
+
+def test_retry_recovers_and_replaces():
+    attempts = {}
+
+    def build(oid):
+        attempts[oid] = attempts.get(oid, 0) + 1
+        # id 3 recupere a la 2eme tentative, id 5 jamais
+        if oid == 3 and attempts[oid] >= 2:
+            return _obj(oid, None)
+        return _obj(oid, "SRVCTL_TIMEOUT")
+
+    store = {}
+    sleeps = []
+    forgotten = []
+    st = run_retry_queue([3, 5], build, lambda i, o: store.__setitem__(i, o),
+                         workers=2, max_attempts=3, backoff_sec=10,
+                         before_attempt=forgotten.append,
+                         sleep=sleeps.append)
+
+    assert st == {"queued": 2, "attempts": 3, "recovered": 1, "failed": 1}
+    assert sleeps == [10, 20, 40]
+    assert forgotten == [1, 2, 3]
+    assert store[3]["Status"]["ErrorCause"] is None
+    assert store[5]["Status"]["ErrorCause"] == "SRVCTL_TIMEOUT"
+    assert attempts == {3: 2, 5: 3}
+    print("OK — retry queue with backoff, recovered objects replaced")
+
+
+def test_resolver_forgets_transient_errors():
+    calls = []
+
+    def scan(cname):
+        calls.append(cname)
+        return None, "SRVCTL_TIMEOUT", "srvctl timeout for %s" % cname
+
+    r = RunResolver(cname_func=lambda h: (h, None, None), scan_func=scan)
+    r.resolve_scan("node1")
+    r.resolve_scan("node1")
+    assert len(calls) == 1
+    assert r.forget_errors(("SRVCTL_TIMEOUT",)) == 1
+    r.resolve_scan("node1")
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_is_transient()
+    test_retry_recovers_and_replaces()
+    test_resolver_forgets_transient_errors()
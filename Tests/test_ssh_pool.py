@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+from Lib.ssh_pool import SshPool, set_ssh_pool, ssh_argv
+from Lib.analyse_runner import run_processes
+from fake_bin import with_fake_bin
+
+# ------------------------------------------------------------
+# MOCK ssh : -M cree le socket, -O check/exit/stop le teste/supprime
+#            (operations -O tracees dans ops)
+# ------------------------------------------------------------
+
+FAKE_SSH = """#!/bin/sh
+path=""
+op=""
+master=""
+prev=""
+for a in "$@"; do
+    case "$prev" in
+        -o) case "$a" in ControlPath=*) path="${a#ControlPath=}";; esac;;
+        -O) op="$a";;
+    esac
+    [ "$a" = "-M" ] && master=1
+    case "$a" in *@down.example) exit 255;; esac
+    case "$a" in *@hang.example) sleep 30; exit 0;; esac
+    prev="$a"
+done
+if [ -n "$master" ]; then touch "$path"; exit 0; fi
+[ -n "$op" ] && echo "$op $path" >> %(dir)s/ops
+if [ "$op" = "check" ]; then [ -e "$path" ]; exit $?; fi
+if [ "$op" = "exit" ] || [ "$op" = "stop" ]; then rm -f "$path"; exit 0; fi
+exit 0
+"""
+
+
+def test_one_master_per_host():
+    def run(bindir):
+        pool = SshPool(persist_sec=60, max_age_sec=600)
+        for i in range(3):
+            argv = pool.argv("oracle", "node1.example", "srvctl config scan",
+                             opts=["StrictHostKeyChecking=no"])
+        assert argv[-2:] == ["oracle@node1.example", "srvctl config scan"]
+        assert "ControlMaster=no" in argv
+
+        path = pool.master_path("oracle", "node1.example")
+        assert os.path.exists(path)
+
+        # host injoignable : ssh direct, pas de nouvel essai de maitre
+        argv = pool.argv("oracle", "down.example", "true")
+        pool.argv("oracle", "down.example", "true")
+        assert not [a for a in argv if a.startswith("ControlPath=")]
+
+        st = pool.stats
+        assert st["opened"] == 1 and st["failed"] == 1
+        assert st["commands"] == 5
+
+        pool.close_all()
+        assert not os.path.exists(pool.control_dir)
+        print("OK — one master per host, commands reuse it")
+
+    with_fake_bin("ssh", FAKE_SSH, run)
+
+
+def test_master_open_bounded():
+    def run(bindir):
+        # banniere / auth bloquee : ssh tue apres open_timeout, ssh direct
+        pool = SshPool(open_timeout=1)
+        t0 = time.time()
+        assert pool.master_path("oracle", "hang.example") is None
+        assert time.time() - t0 < 5
+        assert pool.stats["failed"] == 1
+        pool.close_all()
+        print("OK — hung master open killed after open_timeout")
+
+    with_fake_bin("ssh", FAKE_SSH, run)
+
+
+def test_max_age_reopens():
+    def run(bindir):
+        pool = SshPool(max_age_sec=10)
+        pool.master_path("oracle", "node1.example", now=1000.0)
+        pool.master_path("oracle", "node1.example", now=1005.0)
+        pool.master_path("oracle", "node1.example", now=1020.0)
+        assert pool.stats["opened"] == 2
+        assert pool.stats["expired"] == 1
+        pool.close_all()
+        print("OK — master closed and reopened after max age")
+
+    with_fake_bin("ssh", FAKE_SSH, run)
+
+
+def _ops(bindir):
+    try:
+        return [l.split() for l in open(os.path.join(bindir, "ops"))]
+    except IOError:
+        return []
+
+
+def test_children_close_own_masters():
+    def run(bindir):
+        pool = SshPool()
+        parent = pool.master_path("oracle", "node1.example")
+
+        # fils -processes : leurs maitres sont arretes avant la sortie
+        seen = []
+        run_processes([1, 2], lambda i: pool.master_path(
+                          "oracle", "child%d.example" % i),
+                      2, lambda i, r: seen.append(r),
+                      chunk_size=1, fini=pool.close_all)
+        assert len(seen) == 2 and None not in seen
+        for path in seen:
+            assert not os.path.exists(path)
+        assert sorted(op for op, p in _ops(bindir)) == ["stop", "stop"]
+        # le maitre du parent n'est pas touche par les fils
+        assert os.path.exists(parent)
+
+        # socket laisse par un fils (tue) : ferme par le parent
+        left = os.path.join(pool.control_dir, "leftover")
+        open(left, "w").close()
+        pool.close_all()
+        exits = [p for op, p in _ops(bindir) if op == "exit"]
+        assert sorted(exits) == sorted([parent, left])
+        assert not os.path.exists(pool.control_dir)
+        print("OK — -processes children stop their masters before exit")
+
+    with_fake_bin("ssh", FAKE_SSH, run)
+
+
+def test_plain_ssh_without_pool():
+    set_ssh_pool(None)
+    argv = ssh_argv("oracle", "h1", "uptime", opts=["BatchMode=yes"])
+    assert argv == ["ssh", "-o", "BatchMode=yes", "oracle@h1", "uptime"]
+
+
+if __name__ == "__main__":
+    test_one_master_per_host()
+    test_master_open_bounded()
+    test_max_age_reopens()
+    test_children_close_own_masters()
+    test_plain_ssh_without_pool()
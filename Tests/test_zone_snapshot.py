@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from Lib.zone_snapshot import ZoneIndex, open_zone_snapshot
+from Lib import jdbc_flow_v2
+
+ZONE = """$ORIGIN example.com.
+$TTL 3600
+; alias applicatifs
+app1        IN CNAME  db-vip.example.com.
+app2   300  IN CNAME  app1
+db-vip      IN A      10.0.0.10
+            IN A      10.0.0.11
+node1.example.com.  IN  A  10.0.0.21
+"""
+
+
+def _zone_file():
+    path = os.path.join(tempfile.mkdtemp(), "zone.txt")
+    open(path, "wb").write(ZONE.encode("utf-8"))
+    return path
+
+
+def test_chain_from_index():
+    z = ZoneIndex(search=["example.com"])
+    ok, e, n = z.load(_zone_file())
+    assert ok and n == 5
+    assert z.addrs["db-vip.example.com"] == ["10.0.0.10", "10.0.0.11"]
+
+    # chaine app2 -> app1 -> db-vip
+    assert z.resolve("APP2.example.com") == ("db-vip.example.com", None, None)
+    # nom court complete par le domaine de recherche
+    assert z.resolve("app1") == ("db-vip.example.com", None, None)
+    # enregistrement A seul : nom canonique = le host
+    assert z.resolve("node1.example.com") == ("node1.example.com", None, None)
+    assert z.resolve("unknown.example.com") is None
+    assert z.stats == {"hits": 3, "misses": 1}
+    print("OK — host -> CNAME chain from zone export")
+
+
+def test_miss_falls_back_to_live_dns():
+    z, e, d = open_zone_snapshot([_zone_file()])
+    assert e is None
+    z.search = []
+
+    live = []
+
+    def backend(hosts, timeout_sec=8):
+        live.extend(hosts)
+        return dict((h, (h, None, None)) for h in hosts)
+
+    saved = jdbc_flow_v2.backend_resolve_cname_bulk
+    jdbc_flow_v2.backend_resolve_cname_bulk = backend
+    jdbc_flow_v2.set_zone_snapshot(z)
+    try:
+        out = jdbc_flow_v2.resolve_cname_bulk(["app2.example.com", "other.example.com"])
+    finally:
+        jdbc_flow_v2.set_zone_snapshot(None)
+        jdbc_flow_v2.backend_resolve_cname_bulk = saved
+
+    assert out["app2.example.com"] == ("db-vip.example.com", None, None)
+    assert out["other.example.com"] == ("other.example.com", None, None)
+    assert live == ["other.example.com"]
+
+    assert open_zone_snapshot(["/nonexistent/zone"])[1] == "ZONE_SNAPSHOT_ERROR"
+    print("OK — live DNS only on snapshot miss")
+
+
+def test_out_of_zone_target_is_miss():
+    path = os.path.join(tempfile.mkdtemp(), "zone_a.txt")
+    open(path, "wb").write(b"$ORIGIN a.test.\napp IN CNAME node.b.test.\n")
+    z, e, d = open_zone_snapshot([path])
+    assert e is None
+    z.search = []
+
+    # node.b.test n'est pas dans l'index : ce peut etre un CNAME
+    assert z.resolve("app.a.test") is None
+    assert z.stats == {"hits": 0, "misses": 1}
+
+    live = []
+
+    def backend(hosts, timeout_sec=8):
+        live.extend(hosts)
+        return dict((h, (u"db-vip.b.test", None, None)) for h in hosts)
+
+    saved = jdbc_flow_v2.backend_resolve_cname_bulk
+    jdbc_flow_v2.backend_resolve_cname_bulk = backend
+    jdbc_flow_v2.set_zone_snapshot(z)
+    try:
+        out = jdbc_flow_v2.resolve_cname_bulk(["app.a.test"])
+    finally:
+        jdbc_flow_v2.set_zone_snapshot(None)
+        jdbc_flow_v2.backend_resolve_cname_bulk = saved
+
+    # chaine complete par le DNS reel, pas la cible hors zone
+    assert out["app.a.test"] == (u"db-vip.b.test", None, None)
+    assert live == ["app.a.test"]
+    print("OK — out-of-zone CNAME target resolved over live DNS")
+
+
+if __name__ == "__main__":
+    test_chain_from_index()
+    test_miss_falls_back_to_live_dns()
+    test_out_of_zone_target_is_miss()